@@ -0,0 +1,107 @@
+from __future__ import annotations
+import base64
+import binascii
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+import orjson
+from .config import settings
+from .models import HomeResponse, Section, TitleItem
+
+# The featured carousel travels as the first row
+FEATURED_ID = "featured"
+FEATURED_TITLE = "Destaques"
+
+# (row id, row title, titles)
+Row = Tuple[str, str, Sequence[TitleItem]]
+
+
+class InvalidCursor(ValueError):
+    """The cursor was not produced by encode_cursor."""
+
+
+def encode_cursor(row_id: Optional[str], offset: int) -> str:
+    """Opaque cursor: the rows after `offset`, or the titles of row_id after `offset`."""
+    return base64.urlsafe_b64encode(orjson.dumps([row_id, offset])).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[str], int]:
+    try:
+        row_id, offset = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError, TypeError) as exc:
+        raise InvalidCursor(cursor) from exc
+    if not (row_id is None or isinstance(row_id, str)) or not isinstance(offset, int) or offset < 0:
+        raise InvalidCursor(cursor)
+    return row_id, offset
+
+
+def cursor_key(rows: Sequence[Row], cursor: Optional[str]) -> str:
+    """Canonical form of cursor for cache keys: cursors giving the same page give the same key.
+
+    Offsets past the end are clamped and every unknown row id maps to one
+    key, so clients cannot mint new keys beyond the pages that exist.
+    """
+    if not cursor:
+        return ""
+    row_id, offset = decode_cursor(cursor)
+    if row_id is None:
+        return f":{min(offset, len(rows))}"
+    for rid, _, items in rows:
+        if rid == row_id:
+            return f"{rid}:{min(offset, len(items))}"
+    return "gone"
+
+
+def poster_path(item: TitleItem) -> str:
+    """Image proxy path (relative to the backend) of the item's poster, "" without one."""
+    if item.poster is None:
+        return ""
+    return f"/api/image?url={quote(str(item.poster.url), safe='')}&v={settings.COMPACT_POSTER_VARIANT}"
+
+
+def compact_row(row_id: str, title: str, items: Sequence[TitleItem], start: int = 0, count: Optional[int] = None) -> Dict[str, Any]:
+    """Titles start..start+count of a row as parallel slug/name/poster arrays."""
+    end = len(items) if count is None else min(len(items), start + count)
+    chunk = items[start:end]
+    row: Dict[str, Any] = {
+        "id": row_id,
+        "t": title,
+        "s": [it.slug for it in chunk],
+        "n": [it.title for it in chunk],
+        "p": [poster_path(it) for it in chunk],
+    }
+    if end < len(items):
+        row["more"] = encode_cursor(row_id, end)
+    return row
+
+
+def home_rows(home: HomeResponse) -> List[Row]:
+    rows: List[Row] = [(FEATURED_ID, FEATURED_TITLE, home.featured)] if home.featured else []
+    return rows + section_rows(home.sections)
+
+
+def section_rows(sections: Sequence[Section]) -> List[Row]:
+    return [(s.id, s.title, s.items) for s in sections]
+
+
+def compact_page(rows: Sequence[Row], cursor: Optional[str], max_rows: int, max_items: int) -> Dict[str, Any]:
+    """One page of a compact listing.
+
+    {"rows": [{"id", "t", "s": [slugs], "n": [titles], "p": [poster paths], "more"?}], "next"?}
+
+    Without a cursor the page holds the first max_rows rows, each cut to
+    max_items titles; "next" continues with the following rows and a row's
+    "more" with the rest of that row (max_items at a time, alone in its
+    page). A row that no longer exists upstream comes back as no rows.
+    """
+    row_id, offset = decode_cursor(cursor) if cursor else (None, 0)
+    if row_id is not None:
+        for rid, title, items in rows:
+            if rid == row_id:
+                return {"rows": [compact_row(rid, title, items, offset, max_items)]}
+        return {"rows": []}
+    page: Dict[str, Any] = {
+        "rows": [compact_row(rid, title, items, 0, max_items) for rid, title, items in rows[offset:offset + max_rows]]
+    }
+    if offset + max_rows < len(rows):
+        page["next"] = encode_cursor(None, offset + max_rows)
+    return page
@@ -1,6 +1,6 @@
 from pydantic_settings import BaseSettings
 from pydantic import AnyHttpUrl
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 
 class Settings(BaseSettings):
@@ -11,25 +11,146 @@ class Settings(BaseSettings):
         "(KHTML, like Gecko) Chrome/125.0 Safari/537.36"
     )
     REQUEST_TIMEOUT_SECONDS: float = 15.0
-    MAX_CONCURRENCY: int = 6
+    # Upstream requests in flight at once, page fetches and image downloads together
+    MAX_CONCURRENCY: int = 10
+    # Per priority class (interactive, listing, prefetch, image): concurrency cap,
+    # weight in the fair queue, and seconds queued work may wait before it is
+    # dropped (0 waits as long as it takes)
+    SCHEDULER_LIMITS: Dict[str, int] = {"interactive": 10, "listing": 6, "prefetch": 2, "image": 6}
+    SCHEDULER_WEIGHTS: Dict[str, int] = {"interactive": 8, "listing": 4, "prefetch": 1, "image": 2}
+    SCHEDULER_DEADLINES: Dict[str, float] = {"interactive": 0, "listing": 0, "prefetch": 10, "image": 15}
+    # Connection pool shared by page fetches, robots.txt and image downloads.
+    # Per-host caps apply to requests in flight (HTTP/2 multiplexes them on one
+    # connection); DNS answers are reused for DNS_CACHE_TTL_SECONDS (0 disables)
+    HTTP2: bool = True
+    HTTP_MAX_CONNECTIONS: int = 64
+    HTTP_MAX_KEEPALIVE: int = 32
+    HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    HTTP_MAX_PER_HOST: int = 16
+    DNS_CACHE_TTL_SECONDS: int = 300
+    # Optional proxy for every upstream request (http://, https:// or socks5://)
+    UPSTREAM_PROXY: Optional[str] = None
+    # Upstream bodies larger than this are dropped mid-read (0 disables the cap)
+    MAX_RESPONSE_MB: int = 8
 
     # Optional cookie for authenticated access (set from .env)
     AUTH_COOKIE: Optional[str] = None
 
     # Respect robots.txt (set to false only if you have explicit authorization)
     RESPECT_ROBOTS: bool = True
+    # Compiled rules are refetched after this long (stale ones keep answering meanwhile);
+    # a failed fetch is retried sooner
+    ROBOTS_TTL_SECONDS: int = 86400
+    ROBOTS_RETRY_SECONDS: int = 300
 
     # Caching
     CACHE_TTL_SECONDS: int = 600
     CACHE_MAXSIZE: int = 2048
+    # Expired entries are still served for this long while a background fetch refreshes them
+    CACHE_STALE_GRACE_SECONDS: int = 300
+    # Background re-warming of the base URL and the most requested pages (0 disables)
+    REFRESH_INTERVAL_SECONDS: int = 60
+    REFRESH_AHEAD_SECONDS: int = 90
+    REFRESH_HOT_PAGES: int = 20
+    REFRESH_MAX_PER_CYCLE: int = 10
+    # Optional SQLite tier shared by all workers on the host (unset disables it)
+    DISK_CACHE_PATH: Optional[str] = None
+    DISK_CACHE_MAX_MB: int = 512
+    # HTML parsing executor: "thread", "process" or "inline"
+    PARSE_EXECUTOR: str = "thread"
+    PARSE_WORKERS: int = 2
+    # Extractor engine: "lxml" (compiled XPath) or "bs4" (BeautifulSoup reference)
+    EXTRACT_ENGINE: str = "lxml"
+    # Parsed pages (models built from cached HTML), keyed by URL + body hash
+    PARSED_CACHE_MAXSIZE: int = 512
+    # Resolved stream URLs, kept briefly since they may carry expiring tokens
+    STREAM_CACHE_TTL_SECONDS: int = 120
+    # Stream candidates are probed concurrently (playlist or first byte) and ranked
+    # live-first by bitrate; resolution waits at most the budget for the probes,
+    # whose results are kept for STREAM_PROBE_TTL_SECONDS
+    STREAM_PROBE_ENABLED: bool = True
+    STREAM_PROBE_BUDGET_MS: int = 1000
+    STREAM_PROBE_TIMEOUT_SECONDS: float = 3.0
+    STREAM_PROBE_TTL_SECONDS: int = 60
+    STREAM_PROBE_MAX_CANDIDATES: int = 8
+    # Streams of the first episodes of every title served are resolved in the
+    # background ahead of playback (0 disables), in the scheduler's prefetch class
+    PREFETCH_EPISODES: int = 3
+    # Search results by normalized query
+    SEARCH_CACHE_TTL_SECONDS: int = 300
+    SEARCH_CACHE_MAXSIZE: int = 256
+    # Local title index fed from every parsed page; /api/search answers from it
+    # when it has matches and refreshes from upstream in the background
+    SEARCH_LOCAL_FIRST: bool = True
+    SEARCH_LOCAL_LIMIT: int = 50
+    TITLE_INDEX_MAXSIZE: int = 200_000
+    # Optional snapshot file so the index survives restarts (unset disables it)
+    TITLE_INDEX_PATH: Optional[str] = None
+    TITLE_INDEX_SAVE_SECONDS: int = 300
+    # /api/batch: entries per request and how many of them resolve at once
+    BATCH_MAX_ITEMS: int = 40
+    BATCH_CONCURRENCY: int = 4
 
     # API
     CORS_ALLOW_ORIGINS: List[str] = ["*"]
-    RATE_LIMIT: str = "60/minute"
+    # Token buckets per device (X-Device-Id header, else client address), refilled at
+    # RATE_LIMIT_PER_SECOND up to RATE_LIMIT_BURST. A request costs RATE_LIMIT_REQUEST_COST
+    # plus, for the upstream work it triggers, RATE_LIMIT_PAGE_COST per page fetch,
+    # RATE_LIMIT_IMAGE_COST per image download and RATE_LIMIT_PROBE_COST per stream
+    # probe. All devices of one address share RATE_LIMIT_HOUSEHOLD times that allowance
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_PER_SECOND: float = 1.0
+    RATE_LIMIT_BURST: float = 120.0
+    RATE_LIMIT_REQUEST_COST: float = 0.1
+    RATE_LIMIT_PAGE_COST: float = 2.0
+    RATE_LIMIT_IMAGE_COST: float = 0.5
+    RATE_LIMIT_PROBE_COST: float = 0.2
+    RATE_LIMIT_HOUSEHOLD: float = 4.0
+    RATE_LIMIT_MAX_CLIENTS: int = 100_000
+    # Serialized, compressed bodies of /api/home, /api/sections and /api/title,
+    # reused while the parsed page behind them is unchanged
+    RESPONSE_CACHE_MAXSIZE: int = 256
+    RESPONSE_GZIP_LEVEL: int = 9
+    RESPONSE_BROTLI_QUALITY: int = 5
+    # format=compact listings: rows and titles per row in a page, and the image
+    # proxy variant poster URLs are rewritten to
+    COMPACT_ROWS: int = 4
+    COMPACT_ROW_ITEMS: int = 12
+    COMPACT_POSTER_VARIANT: str = "poster_hd"
+    # Sampling profiler for slow requests (toggled at runtime via /debug/profiler,
+    # which stays hidden unless PROFILER_TOKEN is set); folded stacks go to PROFILER_DIR
+    PROFILER_ENABLED: bool = False
+    PROFILER_TOKEN: Optional[str] = None
+    PROFILER_INTERVAL_MS: int = 10
+    PROFILER_SLOW_MS: int = 500
+    PROFILER_DIR: str = "profiles"
+    PROFILER_KEEP: int = 50
+
+    # Catalog snapshot crawled by app.scraper.crawler (unset disables it). Home and title
+    # pages are served from it while it is younger than CATALOG_MAX_AGE_SECONDS; a
+    # positive CATALOG_CRAWL_INTERVAL_SECONDS recrawls in the background
+    CATALOG_DIR: Optional[str] = None
+    CATALOG_MAX_AGE_SECONDS: int = 86400
+    CATALOG_CRAWL_INTERVAL_SECONDS: int = 0
+    CATALOG_CRAWL_CONCURRENCY: int = 2
+    CATALOG_CRAWL_DELAY_MS: int = 250
+    # First retry after a failed background crawl, doubling up to the interval
+    CATALOG_CRAWL_RETRY_SECONDS: int = 60
+    CATALOG_MAX_TITLES: int = 2000
+    CATALOG_KEEP: int = 3
 
     # Images
     IMAGE_MAX_WIDTH: int = 720
     IMAGE_DEFAULT_QUALITY: int = 78
+    IMAGE_CACHE_TTL_SECONDS: int = 86400
+    IMAGE_CACHE_MAX_MB: int = 64
+    # Threads for Pillow decode/resize/encode (Pillow releases the GIL for most of it)
+    IMAGE_WORKERS: int = 4
+    # Variants rendered in the background for posters found while parsing pages
+    # (the Roku manifest only declares ui_resolutions=hd)
+    IMAGE_PRERENDER_VARIANTS: List[str] = ["poster_hd"]
+    IMAGE_PRERENDER_CONCURRENCY: int = 2
+    IMAGE_PRERENDER_QUEUE: int = 512
 
     class Config:
         env_file = ".env"
@@ -1,39 +1,263 @@
 from __future__ import annotations
+import asyncio
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
-from typing import Optional
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
 from PIL import Image as PILImage
 import httpx
+import orjson
 from fastapi import HTTPException
 from cachetools import LRUCache
+from loguru import logger
+from .config import settings
+from .utils.disk_cache import disk_cache
+from .utils.http_pool import HttpPool, http_pool, read_capped
+from .utils.metrics import IMAGE_REQUESTS, IMAGE_STAGE_SECONDS, UPSTREAM_SECONDS
+from .utils.rate_limit import charge
+from .utils.scheduler import IMAGE, PREFETCH, QueueDeadlineExceeded, UpstreamScheduler, upstream_scheduler
+from .utils.security import is_public_http_url
 
-_image_cache = LRUCache(maxsize=256)
-
-
-async def fetch_and_resize_image(url: str, width: Optional[int], quality: int) -> bytes:
-    cache_key = f"{url}|{width}|{quality}"
-    if cache_key in _image_cache:
-        return _image_cache[cache_key]
-
-async def fetch_and_resize_image(url: str, width: Optional[int], quality: int) -> bytes:
-    async with httpx.AsyncClient(timeout=10.0, follow_redirects=True) as client:
-        resp = await client.get(url)
-        if resp.status_code != 200:
-            raise HTTPException(status_code=404, detail="Image not found")
-        data = resp.content
-    try:
-        img = PILImage.open(BytesIO(data)).convert("RGB")
-        if width and width > 0 and img.width > width:
-            ratio = width / img.width
-            height = int(img.height * ratio)
-            img = img.resize((width, height))
-        out = BytesIO()
-        img.save(out, format="JPEG", quality=max(10, min(quality, 95)))
-        result = out.getvalue()
-        _image_cache[cache_key] = result
+# Named widths matching the Roku PosterItem tile (300x450 at HD) for each UI resolution.
+# Requested widths snap to these so every client size maps onto a few cache entries.
+IMAGE_VARIANTS: Dict[str, int] = {
+    "poster_sd": 200,
+    "poster_hd": 300,
+    "poster_fhd": 450,
+    "backdrop_sd": 480,
+    "backdrop_hd": 720,
+    "backdrop_fhd": 1080,
+}
+
+
+def variant_width(name: str) -> int:
+    return min(IMAGE_VARIANTS[name], settings.IMAGE_MAX_WIDTH)
+
+
+def snap_width(width: int) -> int:
+    """Smallest variant width that is at least width (never upscale past the request)."""
+    widths: List[int] = sorted({variant_width(name) for name in IMAGE_VARIANTS})
+    for w in widths:
+        if w >= width:
+            return w
+    return widths[-1]
+
+
+class ImageResult(NamedTuple):
+    body: bytes
+    media_type: str
+    etag: str
+
+
+def _quality(quality: int) -> int:
+    """Encoder quality actually used for quality, so equivalent requests share a cache entry."""
+    return max(10, min(quality, 95))
+
+
+def _render(data: bytes, width: Optional[int], quality: int, fmt: str, queued: Optional[float] = None) -> bytes:
+    """Decode, downscale and re-encode one image. Runs on the worker pool.
+
+    queued is the perf_counter() reading when the work was handed over,
+    for the "wait" stage.
+    """
+    start = time.perf_counter()
+    if queued is not None:
+        IMAGE_STAGE_SECONDS.observe(start - queued, stage="wait")
+    img = PILImage.open(BytesIO(data))
+    resize_to = None
+    if width and width > 0 and img.width > width:
+        resize_to = (width, max(1, round(img.height * width / img.width)))
+        # JPEG can decode straight at 1/2, 1/4 or 1/8 scale, which skips most of the IDCT work
+        if img.format == "JPEG":
+            img.draft("RGB", resize_to)
+    img = img.convert("RGB")
+    decoded = time.perf_counter()
+    IMAGE_STAGE_SECONDS.observe(decoded - start, stage="decode")
+    if resize_to is not None and img.width > width:
+        img = img.resize(resize_to, PILImage.BILINEAR, reducing_gap=2.0)
+    resized = time.perf_counter()
+    IMAGE_STAGE_SECONDS.observe(resized - decoded, stage="resize")
+    out = BytesIO()
+    if fmt == "WEBP":
+        # method=1 is several times faster than the default 4 for a small size cost
+        img.save(out, format=fmt, quality=_quality(quality), method=1)
+    else:
+        img.save(out, format=fmt, quality=_quality(quality))
+    IMAGE_STAGE_SECONDS.observe(time.perf_counter() - resized, stage="encode")
+    return out.getvalue()
+
+
+class ImageProxy:
+    def __init__(self, scheduler: UpstreamScheduler = upstream_scheduler, pool: HttpPool = http_pool) -> None:
+        self._client: Optional[httpx.AsyncClient] = None
+        self._http_pool = pool
+        # Downloads take upstream slots in the image class (prerender in the prefetch class)
+        self._scheduler = scheduler
+        # Bounded by total bytes, not entry count: one backdrop weighs as much as dozens of posters
+        self._cache: LRUCache[str, ImageResult] = LRUCache(
+            maxsize=settings.IMAGE_CACHE_MAX_MB * 1024 * 1024, getsizeof=lambda r: len(r.body)
+        )
+        self._pool = ThreadPoolExecutor(max_workers=settings.IMAGE_WORKERS, thread_name_prefix="image")
+        # Keeps the executor queue short so a burst of misses cannot pile up unbounded work
+        self._slots = asyncio.Semaphore(settings.IMAGE_WORKERS * 2)
+        self._prerender_queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=settings.IMAGE_PRERENDER_QUEUE)
+        self._queued: Set[str] = set()
+        self._prerenderers: List["asyncio.Task[None]"] = []
+        # Single-flight: one download and render per cache key, shared by concurrent misses
+        self._rendering: Dict[str, "asyncio.Task[ImageResult]"] = {}
+        self.stats: Dict[str, int] = {"prerendered": 0, "prerender_dropped": 0, "coalesced": 0, "too_large": 0}
+
+    async def startup(self) -> None:
+        self._client = self._http_pool.client(
+            timeout=10.0,
+            follow_redirects=True,
+            headers={"User-Agent": settings.USER_AGENT},
+        )
+        self._prerenderers = [
+            asyncio.create_task(self._prerender_worker()) for _ in range(settings.IMAGE_PRERENDER_CONCURRENCY)
+        ]
+        logger.info("ImageProxy started")
+
+    async def shutdown(self) -> None:
+        for task in self._prerenderers:
+            task.cancel()
+        self._prerenderers = []
+        for task in list(self._rendering.values()):
+            task.cancel()
+        self._rendering.clear()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        logger.info("ImageProxy closed")
+
+    async def fetch_and_resize_image(
+        self, url: str, width: Optional[int], quality: int, webp: bool = False
+    ) -> ImageResult:
+        assert self._client is not None, "ImageProxy not started"
+        fmt = "WEBP" if webp else "JPEG"
+        quality = _quality(quality)
+        cache_key = f"{url}|{width}|{quality}|{fmt}"
+        result = self._cache.get(cache_key)
+        if result is not None:
+            IMAGE_REQUESTS.inc(result="memory")
+            return result
+        result = await self._cached(cache_key)
+        if result is not None:
+            IMAGE_REQUESTS.inc(result="disk")
+            return result
+        task = self._rendering.get(cache_key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            IMAGE_REQUESTS.inc(result="miss")
+            task = asyncio.ensure_future(self._miss(cache_key, url, width, quality, fmt))
+            self._rendering[cache_key] = task
+            task.add_done_callback(lambda t, key=cache_key: self._miss_done(key, t))
+        # Shield so one client going away does not fail the render for the others
+        return await asyncio.shield(task)
+
+    async def _miss(self, cache_key: str, url: str, width: Optional[int], quality: int, fmt: str) -> ImageResult:
+        data, content_type = await self._download(url, IMAGE)
+        return await self._render_and_store(cache_key, data, content_type, width, quality, fmt)
+
+    def _miss_done(self, cache_key: str, task: "asyncio.Task[ImageResult]") -> None:
+        if self._rendering.get(cache_key) is task:
+            del self._rendering[cache_key]
+        # Mark the exception as retrieved even if every waiter has gone away
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"Image render failed for {cache_key}: {task.exception()!r}")
+
+    def prerender(self, urls: Iterable[str]) -> None:
+        """Queue posters for background rendering at IMAGE_PRERENDER_VARIANTS."""
+        for url in urls:
+            if url in self._queued or not is_public_http_url(url):
+                continue
+            try:
+                self._prerender_queue.put_nowait(url)
+            except asyncio.QueueFull:
+                self.stats["prerender_dropped"] += 1
+                return
+            self._queued.add(url)
+
+    async def _prerender_worker(self) -> None:
+        quality = _quality(settings.IMAGE_DEFAULT_QUALITY)
+        widths = sorted({variant_width(name) for name in settings.IMAGE_PRERENDER_VARIANTS if name in IMAGE_VARIANTS})
+        while True:
+            url = await self._prerender_queue.get()
+            try:
+                missing = []
+                for width in widths:
+                    cache_key = f"{url}|{width}|{quality}|JPEG"
+                    if await self._cached(cache_key) is None:
+                        missing.append((cache_key, width))
+                if missing:
+                    # One download feeds every missing variant
+                    data, content_type = await self._download(url, PREFETCH)
+                    for cache_key, width in missing:
+                        await self._render_and_store(cache_key, data, content_type, width, quality, "JPEG")
+                    self.stats["prerendered"] += len(missing)
+            except Exception as exc:
+                logger.debug(f"Prerender failed for {url}: {exc!r}")
+            finally:
+                self._queued.discard(url)
+                self._prerender_queue.task_done()
+
+    async def _cached(self, cache_key: str) -> Optional[ImageResult]:
+        hit = self._cache.get(cache_key)
+        if hit is not None:
+            return hit
+        if disk_cache is not None:
+            stored = await disk_cache.aget(f"img:{cache_key}")
+            if stored is not None and stored.expires_at > time.time():
+                meta = orjson.loads(stored.meta)
+                result = ImageResult(stored.value, meta["media_type"], meta["etag"])
+                self._cache[cache_key] = result
+                return result
+        return None
+
+    async def _download(self, url: str, priority: str) -> Tuple[bytes, str]:
+        assert self._client is not None, "ImageProxy not started"
+        try:
+            async with self._scheduler.slot(priority):
+                charge(settings.RATE_LIMIT_IMAGE_COST)
+                with UPSTREAM_SECONDS.time(source="image"):
+                    async with self._client.stream("GET", url) as resp:
+                        if resp.status_code != 200:
+                            raise HTTPException(status_code=404, detail="Image not found")
+                        # Same cap as pages: nothing larger is buffered or handed to Pillow
+                        data = await read_capped(resp)
+        except QueueDeadlineExceeded:
+            raise HTTPException(status_code=503, detail="Image fetch queue full")
+        except httpx.HTTPError as exc:
+            logger.warning(f"Image fetch failed for {url}: {exc}")
+            raise HTTPException(status_code=502, detail="Image fetch failed")
+        if data is None:
+            self.stats["too_large"] += 1
+            logger.warning(f"Image {url} exceeds {settings.MAX_RESPONSE_MB} MB, dropped")
+            raise HTTPException(status_code=502, detail="Image too large")
+        return data, resp.headers.get("content-type", "image/jpeg")
+
+    async def _render_and_store(
+        self, cache_key: str, data: bytes, content_type: str, width: Optional[int], quality: int, fmt: str
+    ) -> ImageResult:
+        try:
+            queued = time.perf_counter()
+            async with self._slots:
+                body = await asyncio.get_running_loop().run_in_executor(
+                    self._pool, _render, data, width, quality, fmt, queued
+                )
+            media_type = f"image/{fmt.lower()}"
+        except Exception:
+            # Fallback: return original data
+            body = data
+            media_type = content_type
+        result = ImageResult(body, media_type, f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"')
+
+        if len(body) <= self._cache.maxsize:
+            self._cache[cache_key] = result
+        if disk_cache is not None:
+            meta = orjson.dumps({"media_type": result.media_type, "etag": result.etag}).decode()
+            await disk_cache.aset(f"img:{cache_key}", body, settings.IMAGE_CACHE_TTL_SECONDS, meta)
         return result
-    except Exception:
-        _image_cache[cache_key] = data
-        return out.getvalue()
-    except Exception:
-        # Fallback: return original data
-        return data
\ No newline at end of file
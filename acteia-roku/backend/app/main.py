@@ -2,46 +2,59 @@ from __future__ import annotations
 from fastapi import FastAPI, Depends, Query, HTTPException, Response, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
-from slowapi import Limiter
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-from fastapi.responses import ORJSONResponse
-from typing import List, Optional
+from fastapi.responses import FileResponse, ORJSONResponse, PlainTextResponse, StreamingResponse
+from typing import Any, AsyncIterator, Callable, List, Optional, Sequence
+import orjson
 from loguru import logger
-from slowapi.middleware import SlowAPIMiddleware
+from pydantic import ValidationError
 
 from .config import settings
-from .models import HomeResponse, Section, SearchResponse, TitleDetails, StreamResponse
+from .models import HomeResponse, Section, SearchResponse, TitleDetails, StreamResponse, BatchRequest, BatchResponse
 from .scraper.http_client import AsyncHttpClient
 from .scraper.site_acteia import ActeiaScraper
-from .image_proxy import fetch_and_resize_image
+from .scraper.crawler import CatalogCrawler
+from .image_proxy import ImageProxy, IMAGE_VARIANTS, snap_width, variant_width
 from .utils.security import is_public_http_url
-
-limiter = Limiter(key_func=get_remote_address, default_limits=[settings.RATE_LIMIT])
+from .utils.scheduler import upstream_scheduler
+from .utils.http_pool import http_pool
+from .utils.response_cache import ResponseCache
+from .utils.metrics import MetricsMiddleware, Sample, flat_stats, registry
+from .utils.profiler import profiler
+from .utils.rate_limit import RateLimiter, RateLimitMiddleware
+from .compact import InvalidCursor, Row, compact_page, cursor_key, compact_row, home_rows, section_rows
 
 app = FastAPI(title="Acteia JSON API", default_response_class=ORJSONResponse)
 app.state.http_client = AsyncHttpClient()
-app.state.scraper = ActeiaScraper(app.state.http_client)
-app.state.limiter = limiter
+app.state.image_proxy = ImageProxy()
+app.state.scraper = ActeiaScraper(app.state.http_client, prerender=app.state.image_proxy.prerender)
+app.state.limiter = RateLimiter()
+app.state.responses = ResponseCache()
+app.state.crawler = CatalogCrawler(app.state.scraper.catalog)
 
 
 @app.on_event("startup")
 async def on_startup() -> None:
     await app.state.http_client.startup()
+    await app.state.image_proxy.startup()
+    await app.state.scraper.startup()
+    if settings.CATALOG_DIR and settings.CATALOG_CRAWL_INTERVAL_SECONDS > 0:
+        app.state.crawler.start(app.state.scraper.reload_catalog)
+    if settings.PROFILER_ENABLED:
+        profiler.enable()
     logger.info("App startup completed")
 
 
 @app.on_event("shutdown")
 async def on_shutdown() -> None:
+    await app.state.crawler.shutdown()
+    await app.state.scraper.shutdown()
     await app.state.http_client.shutdown()
+    await app.state.image_proxy.shutdown()
+    await http_pool.aclose()
+    profiler.disable()
     logger.info("App shutdown completed")
 
 
-@app.exception_handler(RateLimitExceeded)
-async def ratelimit_handler(request, exc):
-    return ORJSONResponse({"detail": "Rate limit exceeded"}, status_code=429)
-
-
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.CORS_ALLOW_ORIGINS,
@@ -49,8 +62,32 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-app.add_middleware(SlowAPIMiddleware)
+app.add_middleware(RateLimitMiddleware, limiter=app.state.limiter, exempt=("/healthz", "/metrics"))
 app.add_middleware(GZipMiddleware, minimum_size=512)
+# Outermost, so request latency includes compression and rate limiting
+app.add_middleware(MetricsMiddleware)
+
+
+def _scheduler_samples() -> List[Sample]:
+    samples: List[Sample] = [("capacity", {}, upstream_scheduler.capacity)]
+    for priority, counters in upstream_scheduler.stats["classes"].items():
+        samples.extend(flat_stats(counters, {"priority": priority}))
+    return samples
+
+
+# Component stats dicts, exported as they are at scrape time
+registry.collector("http", "AsyncHttpClient counters", lambda: flat_stats(app.state.http_client.stats))
+registry.collector("robots", "robots.txt cache counters", lambda: flat_stats(app.state.http_client.robots.stats))
+registry.collector("scheduler", "Upstream scheduler state per priority class", _scheduler_samples)
+registry.collector("pool", "Shared HTTP pool counters", lambda: flat_stats(http_pool.stats))
+registry.collector("index", "Title index counters", lambda: flat_stats(app.state.scraper.index.stats))
+registry.collector("responses", "Response cache counters", lambda: flat_stats(app.state.responses.stats))
+registry.collector("image", "Image proxy background counters", lambda: flat_stats(app.state.image_proxy.stats))
+registry.collector("stream_probe", "Stream candidate probes", lambda: flat_stats(app.state.scraper.prober.stats))
+registry.collector("catalog", "Catalog snapshot lookups", lambda: flat_stats(app.state.scraper.catalog.stats))
+registry.collector("crawler", "Catalog crawler counters", lambda: flat_stats(app.state.crawler.stats))
+registry.collector("rate_limit", "Rate limiter counters and tracked clients", lambda: flat_stats(app.state.limiter.stats))
+registry.collector("profiler", "Sampling profiler counters", lambda: flat_stats(profiler.stats))
 
 
 @app.get("/healthz")
@@ -58,46 +95,225 @@ async def healthz():
     return {"ok": True}
 
 
+@app.get("/stats")
+async def stats():
+    return {
+        "http": app.state.http_client.stats,
+        "robots": app.state.http_client.robots.stats,
+        "scheduler": upstream_scheduler.stats,
+        "pool": http_pool.stats,
+        "index": app.state.scraper.index.stats,
+        "responses": app.state.responses.stats,
+        "stream_probe": app.state.scraper.prober.stats,
+        "rate_limit": app.state.limiter.stats,
+        "catalog": {**app.state.scraper.catalog.stats, "crawler": app.state.crawler.stats},
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+def _check_debug_token(request: Request) -> None:
+    # Hidden entirely unless a token is configured
+    if not settings.PROFILER_TOKEN or request.headers.get("x-debug-token") != settings.PROFILER_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+
+@app.get("/debug/profiler", include_in_schema=False)
+async def debug_profiler(request: Request):
+    _check_debug_token(request)
+    return {
+        "enabled": profiler.enabled,
+        "interval_ms": profiler.interval_ms,
+        "slow_ms": profiler.slow_ms,
+        "dumps": profiler.dumps(),
+        "stats": profiler.stats,
+    }
+
+
+@app.post("/debug/profiler", include_in_schema=False)
+async def debug_profiler_set(
+    request: Request,
+    enabled: Optional[bool] = None,
+    slow_ms: Optional[int] = Query(None, ge=0),
+    interval_ms: Optional[int] = Query(None, ge=1, le=1000),
+):
+    """Turn sampling on or off and change its thresholds, e.g. POST /debug/profiler?enabled=true&slow_ms=300"""
+    _check_debug_token(request)
+    if slow_ms is not None:
+        profiler.slow_ms = slow_ms
+    if interval_ms is not None and interval_ms != profiler.interval_ms:
+        profiler.interval_ms = interval_ms
+        if profiler.enabled:
+            # The sampling thread reads its interval once
+            profiler.disable()
+            profiler.enable()
+    if enabled is True:
+        profiler.enable()
+    elif enabled is False:
+        profiler.disable()
+    return await debug_profiler(request)
+
+
+@app.get("/debug/profiler/{name}", include_in_schema=False)
+async def debug_profile_dump(request: Request, name: str):
+    """One folded-stack dump, ready for flamegraph.pl or speedscope."""
+    _check_debug_token(request)
+    path = profiler.path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="No such profile")
+    return FileResponse(path, media_type="text/plain")
+
+
+def _compact(
+    request: Request, key: str, source: Any, rows_of: Callable[[Any], Sequence[Row]], cursor: Optional[str], rows: int, items: int
+) -> Response:
+    """format=compact: columnar rows with proxied posters, paged by cursor (see compact_page).
+
+    Only pages at the default sizes (what the Roku app asks for) are kept in
+    the response cache, under their canonical cursor, so client input cannot
+    push the hot bodies out.
+    """
+    try:
+        return app.state.responses.respond(
+            request, f"{key}:compact:{cursor_key(rows_of(source), cursor)}:{rows}:{items}", source,
+            lambda src: compact_page(rows_of(src), cursor, rows, items),
+            store=rows == settings.COMPACT_ROWS and items == settings.COMPACT_ROW_ITEMS,
+        )
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+
 @app.get("/api/home", response_model=HomeResponse)
-@limiter.limit("20/minute")
-async def api_home(request: Request):
-    return await app.state.scraper.fetch_home()
+async def api_home(
+    request: Request,
+    fmt: str = Query("json", alias="format", pattern="^(json|compact)$"),
+    cursor: Optional[str] = None,
+    rows: int = Query(settings.COMPACT_ROWS, ge=1, le=50),
+    items: int = Query(settings.COMPACT_ROW_ITEMS, ge=1, le=100),
+):
+    home = await app.state.scraper.fetch_home()
+    if fmt == "compact":
+        return _compact(request, "home", home, home_rows, cursor, rows, items)
+    return app.state.responses.respond(request, "home", home, lambda h: h.model_dump(mode="json"))
 
 
 @app.get("/api/sections", response_model=List[Section])
-@limiter.limit("30/minute")
-async def api_sections(request: Request):
-    return await app.state.scraper.fetch_sections()
+async def api_sections(
+    request: Request,
+    fmt: str = Query("json", alias="format", pattern="^(json|compact)$"),
+    cursor: Optional[str] = None,
+    rows: int = Query(settings.COMPACT_ROWS, ge=1, le=50),
+    items: int = Query(settings.COMPACT_ROW_ITEMS, ge=1, le=100),
+):
+    sections = await app.state.scraper.fetch_sections()
+    if fmt == "compact":
+        return _compact(request, "sections", sections, section_rows, cursor, rows, items)
+    return app.state.responses.respond(
+        request, "sections", sections, lambda secs: [s.model_dump(mode="json") for s in secs]
+    )
 
 
 @app.get("/api/search", response_model=SearchResponse)
-@limiter.limit("30/minute")
-async def api_search(request: Request, q: str = Query(..., min_length=1, max_length=100)):
+async def api_search(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=100),
+    fmt: str = Query("json", alias="format", pattern="^(json|compact)$"),
+):
     items = await app.state.scraper.search(q)
+    if fmt == "compact":
+        return ORJSONResponse({"query": q, "rows": [compact_row("search", q, items)]})
     return SearchResponse(query=q, items=items)
 
 
+@app.get("/api/typeahead", response_model=SearchResponse)
+async def api_typeahead(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+):
+    # Local title index only, cheap enough to call on every keystroke
+    return SearchResponse(query=q, items=app.state.scraper.typeahead(q, limit))
+
+
 @app.get("/api/title/{slug:path}", response_model=TitleDetails)
-@limiter.limit("30/minute")
 async def api_title(request: Request, slug: str):
     if not slug:
         raise HTTPException(status_code=400, detail="slug required")
-    return await app.state.scraper.fetch_title(slug)
+    details = await app.state.scraper.fetch_title(slug)
+    return app.state.responses.respond(request, f"title:{slug}", details, lambda d: d.model_dump(mode="json"))
 
 
 @app.get("/api/stream/{slug:path}", response_model=StreamResponse)
-@limiter.limit("30/minute")
 async def api_stream(request: Request, slug: str, episode: Optional[str] = None):
     if not slug:
         raise HTTPException(status_code=400, detail="slug required")
     return await app.state.scraper.resolve_stream(slug, episode)
 
 
+@app.post("/api/batch", response_model=BatchResponse)
+async def api_batch(request: Request, fmt: str = Query("json", alias="format", pattern="^(json|ndjson)$")):
+    """Title details and streams for many slugs in one round trip.
+
+    Returns {"results": [...]} in request order, or with format=ndjson (or
+    Accept: application/x-ndjson) one result per line as each one finishes.
+    Failed entries carry their own status and error instead of failing the batch.
+    """
+    # Parsed by hand so validation errors leave the submitted input out of the 422
+    try:
+        body = BatchRequest.model_validate_json(await request.body())
+    except ValidationError as exc:
+        raise HTTPException(status_code=422, detail=exc.errors(include_url=False, include_context=False, include_input=False))
+    count = len(body.titles) + len(body.streams)
+    if count == 0:
+        raise HTTPException(status_code=400, detail="nothing to resolve")
+    if count > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"at most {settings.BATCH_MAX_ITEMS} entries per batch")
+    if not all(body.titles) or not all(s.slug for s in body.streams):
+        raise HTTPException(status_code=400, detail="slug required")
+    results = app.state.scraper.resolve_batch(body.titles, [(s.slug, s.episode) for s in body.streams])
+
+    if fmt == "ndjson" or "application/x-ndjson" in request.headers.get("accept", ""):
+        async def lines() -> AsyncIterator[bytes]:
+            async for result in results:
+                yield orjson.dumps(result.model_dump(mode="json", exclude_none=True)) + b"\n"
+
+        # GZipMiddleware holds streamed bytes until its buffer fills; identity
+        # encoding makes it pass each line through as soon as it is ready
+        return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"Content-Encoding": "identity"})
+
+    order = {("title", slug, None): i for i, slug in reversed(list(enumerate(body.titles)))}
+    order.update({("stream", s.slug, s.episode or None): len(body.titles) + i for i, s in reversed(list(enumerate(body.streams)))})
+    collected = [result async for result in results]
+    collected.sort(key=lambda r: order[(r.kind, r.slug, r.episode)])
+    return ORJSONResponse({"results": [r.model_dump(mode="json", exclude_none=True) for r in collected]})
+
+
 @app.get("/api/image")
-@limiter.limit("60/minute")
-async def api_image(request: Request, url: str, w: Optional[int] = None, q: int = settings.IMAGE_DEFAULT_QUALITY):
+async def api_image(
+    request: Request,
+    url: str,
+    w: Optional[int] = None,
+    v: Optional[str] = None,
+    q: int = Query(settings.IMAGE_DEFAULT_QUALITY, ge=1, le=95),
+):
     if not is_public_http_url(url):
         raise HTTPException(status_code=400, detail="invalid url")
-    width = min(w or settings.IMAGE_MAX_WIDTH, settings.IMAGE_MAX_WIDTH)
-    data = await fetch_and_resize_image(url, width=width, quality=q)
-    return Response(content=data, media_type="image/jpeg")
\ No newline at end of file
+    if v is not None:
+        if v not in IMAGE_VARIANTS:
+            raise HTTPException(status_code=400, detail="unknown variant")
+        width = variant_width(v)
+    else:
+        width = snap_width(min(w or settings.IMAGE_MAX_WIDTH, settings.IMAGE_MAX_WIDTH))
+    webp = "image/webp" in request.headers.get("accept", "")
+    result = await app.state.image_proxy.fetch_and_resize_image(url, width=width, quality=q, webp=webp)
+    headers = {
+        "ETag": result.etag,
+        "Cache-Control": f"public, max-age={settings.IMAGE_CACHE_TTL_SECONDS}",
+        "Vary": "Accept",
+    }
+    if request.headers.get("if-none-match") == result.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=result.body, media_type=result.media_type, headers=headers)
\ No newline at end of file
@@ -1,7 +1,6 @@
 from __future__ import annotations
 from pydantic import BaseModel, HttpUrl, Field
-from pydantic import BaseModel, HttpUrl
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
 
 
 class Image(BaseModel):
@@ -45,14 +44,11 @@ class Section(BaseModel):
 class HomeResponse(BaseModel):
     featured: List[TitleItem] = Field(default_factory=list)
     sections: List[Section] = Field(default_factory=list)
-    featured: List[TitleItem]
-    sections: List[Section]
 
 
 class SearchResponse(BaseModel):
     query: str
     items: List[TitleItem] = Field(default_factory=list)
-    items: List[TitleItem]
 
 
 class TitleDetails(BaseModel):
@@ -61,12 +57,31 @@ class TitleDetails(BaseModel):
     genres: List[str] = Field(default_factory=list)
     episodes: List[Episode] = Field(default_factory=list)
     extra: Dict[str, Any] = Field(default_factory=dict)
-    genres: List[str] = []
-    episodes: List[Episode] = []
-    extra: Dict[str, Any] = {}
 
 
 class StreamResponse(BaseModel):
     item_id: str
     streams: List[VideoStream] = Field(default_factory=list)
-    streams: List[VideoStream]
+
+
+class BatchStream(BaseModel):
+    slug: str
+    episode: Optional[str] = None
+
+
+class BatchRequest(BaseModel):
+    titles: List[str] = Field(default_factory=list)
+    streams: List[BatchStream] = Field(default_factory=list)
+
+
+class BatchResult(BaseModel):
+    kind: str  # title | stream
+    slug: str
+    episode: Optional[str] = None
+    status: int = 200
+    data: Optional[Union[TitleDetails, StreamResponse]] = None
+    error: Optional[str] = None
+
+
+class BatchResponse(BaseModel):
+    results: List[BatchResult] = Field(default_factory=list)
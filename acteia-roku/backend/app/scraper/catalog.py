@@ -0,0 +1,208 @@
+from __future__ import annotations
+import asyncio
+import mmap
+import os
+import shutil
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+import orjson
+from cachetools import LRUCache
+from loguru import logger
+from pydantic import TypeAdapter
+from ..config import settings
+from ..models import HomeResponse, TitleDetails, TitleItem
+
+FORMAT = 1
+HOME_KEY = "home"
+ITEMS_KEY = "items"
+_CURRENT = "CURRENT"
+_RECORDS = "records.bin"
+_INDEX = "index.json"
+_TITLE_ITEMS = TypeAdapter(List[TitleItem])
+
+
+def title_key(slug: str) -> str:
+    return f"title:{slug}"
+
+
+class CatalogWriter:
+    """Builds one snapshot version: records appended to records.bin, offsets and page validators in index.json.
+
+    Nothing is visible to readers until commit() renames the finished
+    directory into place and points CURRENT at it.
+    """
+
+    def __init__(self, directory: str, base_url: str) -> None:
+        self.directory = directory
+        # The suffix keeps two crawls finishing in the same second (or two
+        # writers on one directory) from sharing a version or a tmp directory
+        self.version = f"{time.strftime('v%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self._tmp = os.path.join(directory, f".{self.version}.tmp")
+        os.makedirs(self._tmp, exist_ok=True)
+        self._records = open(os.path.join(self._tmp, _RECORDS), "wb")
+        self._offset = 0
+        self._index: Dict[str, Any] = {"format": FORMAT, "version": self.version, "base_url": base_url, "records": {}, "pages": {}}
+
+    def add(self, key: str, record: bytes) -> None:
+        """Store an orjson-encoded record under key (last write wins)."""
+        self._records.write(record)
+        self._index["records"][key] = [self._offset, len(record)]
+        self._offset += len(record)
+
+    def page(self, url: str, validators: Dict[str, str]) -> None:
+        """Remember a crawled page's ETag / Last-Modified / digest for the next crawl."""
+        self._index["pages"][url] = validators
+
+    def commit(self, keep: int = settings.CATALOG_KEEP) -> str:
+        self._records.close()
+        self._index["created"] = time.time()
+        with open(os.path.join(self._tmp, _INDEX), "wb") as fh:
+            fh.write(orjson.dumps(self._index))
+        # Versions are never replaced: CURRENT may point at this name and readers have it mapped
+        os.rename(self._tmp, os.path.join(self.directory, self.version))
+        current = os.path.join(self.directory, _CURRENT)
+        with open(f"{current}.tmp", "w", encoding="utf-8") as fh:
+            fh.write(self.version)
+        os.replace(f"{current}.tmp", current)
+        self._prune(keep)
+        return self.version
+
+    def abort(self) -> None:
+        self._records.close()
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+    def _prune(self, keep: int) -> None:
+        versions = sorted(n for n in os.listdir(self.directory) if n.startswith("v") and n != self.version)
+        for name in versions[: max(0, len(versions) - (keep - 1))]:
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+
+class _Version:
+    """One loaded snapshot: its index and the memory-mapped records."""
+
+    def __init__(self, path: str) -> None:
+        with open(os.path.join(path, _INDEX), "rb") as fh:
+            self.index: Dict[str, Any] = orjson.loads(fh.read())
+        if self.index.get("format") != FORMAT:
+            raise ValueError(f"unknown catalog format {self.index.get('format')!r}")
+        self.records: Dict[str, List[int]] = self.index["records"]
+        self._file = open(os.path.join(path, _RECORDS), "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+
+    def raw(self, key: str) -> Optional[bytes]:
+        span = self.records.get(key)
+        if span is None or self._map is None:
+            return None
+        offset, length = span
+        return self._map[offset:offset + length]
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+
+class Catalog:
+    """Read side of the crawled catalog snapshot (see app.scraper.crawler).
+
+    Home and title details are answered from the current snapshot while it
+    is younger than CATALOG_MAX_AGE_SECONDS and was crawled from this
+    BASE_URL; anything else is a miss and the scraper goes live. Records
+    are decoded on first use and the models kept, so repeated lookups
+    return the same object (which ResponseCache relies on). reload()
+    switches to a newer version in place.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = settings.CATALOG_DIR,
+        max_age: float = settings.CATALOG_MAX_AGE_SECONDS,
+        maxsize: int = settings.PARSED_CACHE_MAXSIZE,
+    ) -> None:
+        self.directory = directory
+        self.max_age = max_age
+        self._version: Optional[_Version] = None
+        self._models: LRUCache[str, Any] = LRUCache(maxsize=maxsize)
+        self.stats: Dict[str, Any] = {"version": None, "records": 0, "hits": 0, "misses": 0}
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._version.index["version"] if self._version is not None else None
+
+    @property
+    def created(self) -> Optional[float]:
+        return self._version.index["created"] if self._version is not None else None
+
+    def pages(self) -> Dict[str, Dict[str, str]]:
+        """Validators of the pages behind the current version, by URL."""
+        return self._version.index["pages"] if self._version is not None else {}
+
+    def raw(self, key: str) -> Optional[bytes]:
+        return self._version.raw(key) if self._version is not None else None
+
+    async def reload(self) -> List[TitleItem]:
+        """Switch to the version CURRENT names; returns its titles (for the search index), [] if unchanged."""
+        if not self.directory:
+            return []
+        try:
+            loaded = await asyncio.to_thread(self._open)
+        except (OSError, ValueError) as exc:
+            logger.warning(f"Catalog snapshot unreadable, serving live: {exc}")
+            return []
+        if loaded is None:
+            return []
+        version, items = loaded
+        old, self._version = self._version, version
+        self._models.clear()
+        self.stats["version"] = self.version
+        self.stats["records"] = len(version.records)
+        if old is not None:
+            old.close()
+        logger.info(f"Catalog {self.version}: {len(version.records)} records, {len(items)} titles")
+        return items
+
+    def _open(self) -> Optional[Tuple[_Version, List[TitleItem]]]:
+        try:
+            with open(os.path.join(self.directory, _CURRENT), encoding="utf-8") as fh:
+                name = fh.read().strip()
+        except FileNotFoundError:
+            return None
+        if self._version is not None and name == self.version:
+            return None
+        version = _Version(os.path.join(self.directory, name))
+        if version.index.get("base_url") != str(settings.BASE_URL):
+            version.close()
+            raise ValueError(f"snapshot {name} was crawled from {version.index.get('base_url')}")
+        raw_items = version.raw(ITEMS_KEY)
+        items = _TITLE_ITEMS.validate_json(raw_items) if raw_items else []
+        return version, items
+
+    def _fresh(self) -> bool:
+        return self._version is not None and time.time() - self._version.index["created"] < self.max_age
+
+    def _lookup(self, key: str, build: Any) -> Any:
+        if not self._fresh():
+            return None
+        model = self._models.get(key)
+        if model is None:
+            raw = self.raw(key)
+            if raw is None:
+                self.stats["misses"] += 1
+                return None
+            model = build(raw)
+            self._models[key] = model
+        self.stats["hits"] += 1
+        return model
+
+    def home(self) -> Optional[HomeResponse]:
+        return self._lookup(HOME_KEY, HomeResponse.model_validate_json)
+
+    def title(self, slug: str) -> Optional[TitleDetails]:
+        return self._lookup(title_key(slug), TitleDetails.model_validate_json)
+
+    def close(self) -> None:
+        if self._version is not None:
+            self._version.close()
+            self._version = None
@@ -0,0 +1,246 @@
+"""Crawl the home page and every title on it into a catalog snapshot.
+
+    cd backend && python -m app.scraper.crawler --dir catalog
+
+The API serves from the snapshot when CATALOG_DIR points at the same
+directory; with CATALOG_CRAWL_INTERVAL_SECONDS set it also recrawls in
+the background.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import hashlib
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type
+from urllib.parse import urljoin
+import httpx
+import orjson
+from loguru import logger
+from pydantic import BaseModel
+from ..config import settings
+from ..models import HomeResponse, TitleDetails
+from ..utils.http_pool import HttpPool, http_pool, read_capped
+from ..utils.scheduler import PREFETCH, QueueDeadlineExceeded, UpstreamScheduler, upstream_scheduler
+from .catalog import HOME_KEY, ITEMS_KEY, Catalog, CatalogWriter, title_key
+from .parse_pool import ParsePool
+from .robots import RobotsCache
+from .site_acteia import EXTRACT_ENGINES
+
+
+class CatalogCrawler:
+    """Walks home -> titles politely and writes a new catalog version.
+
+    Every fetch obeys robots.txt (whatever RESPECT_ROBOTS says), holds one
+    of `concurrency` crawl slots plus a prefetch-class scheduler slot, so
+    it never delays API requests, and pauses `delay` seconds before
+    letting the next page through. Pages are requested with the ETag /
+    Last-Modified remembered from the previous version; a 304, or a body
+    with the same digest, reuses the previous record without parsing. A
+    page that fails to fetch keeps its previous record; one that is gone
+    (4xx) or disallowed is dropped.
+    """
+
+    def __init__(
+        self,
+        catalog: Catalog,
+        directory: Optional[str] = settings.CATALOG_DIR,
+        pool: HttpPool = http_pool,
+        scheduler: UpstreamScheduler = upstream_scheduler,
+        concurrency: int = settings.CATALOG_CRAWL_CONCURRENCY,
+        delay: float = settings.CATALOG_CRAWL_DELAY_MS / 1000,
+        max_titles: int = settings.CATALOG_MAX_TITLES,
+        retry: float = settings.CATALOG_CRAWL_RETRY_SECONDS,
+    ) -> None:
+        self.catalog = catalog
+        self.directory = directory
+        self.base_url = str(settings.BASE_URL)
+        self._pool = pool
+        self._scheduler = scheduler
+        self._gate = asyncio.Semaphore(max(1, concurrency))
+        self._delay = delay
+        self.max_titles = max_titles
+        self.retry = retry
+        self._extract = EXTRACT_ENGINES[settings.EXTRACT_ENGINE]
+        self._loop: Optional["asyncio.Task[None]"] = None
+        self.stats: Dict[str, Any] = {
+            "crawls": 0, "fetched": 0, "unchanged": 0, "parsed": 0, "errors": 0, "blocked": 0, "titles": 0, "last_seconds": 0.0,
+            "failures": 0,
+        }
+
+    def start(self, on_snapshot: Callable[[], Awaitable[Any]], interval: float = settings.CATALOG_CRAWL_INTERVAL_SECONDS) -> None:
+        """Recrawl every `interval` seconds in the background, calling on_snapshot after each new version."""
+        self._loop = asyncio.create_task(self._run(on_snapshot, interval))
+
+    async def shutdown(self) -> None:
+        if self._loop is not None:
+            self._loop.cancel()
+            self._loop = None
+
+    async def _run(self, on_snapshot: Callable[[], Awaitable[Any]], interval: float) -> None:
+        # First crawl once the loaded version is `interval` old (now, without one)
+        created = self.catalog.created
+        due = created + interval if created else time.time()
+        failures = 0
+        while True:
+            await asyncio.sleep(max(0.0, due - time.time()))
+            attempted = time.time()
+            try:
+                ok = await self.crawl() is not None
+                if ok:
+                    await on_snapshot()
+            except Exception:
+                logger.exception("Catalog crawl failed")
+                ok = False
+            # The next one is timed from this attempt; failed ones back off
+            # exponentially from `retry` up to `interval`
+            failures = 0 if ok else failures + 1
+            self.stats["failures"] = failures
+            due = attempted + (interval if ok else min(interval, self.retry * 2 ** (failures - 1)))
+
+    async def crawl(self) -> Optional[str]:
+        """Crawl into a new version under directory; its name, or None when the home page could not be read."""
+        assert self.directory, "CATALOG_DIR not set"
+        started = time.perf_counter()
+        self.stats["crawls"] += 1
+        headers = {"User-Agent": settings.USER_AGENT}
+        if settings.AUTH_COOKIE:
+            headers["Cookie"] = settings.AUTH_COOKIE
+        client = self._pool.client(headers=headers, timeout=settings.REQUEST_TIMEOUT_SECONDS, follow_redirects=True)
+        robots = RobotsCache(self._pool)
+        parser = ParsePool(workers=1)
+        parser.startup()
+        writer = CatalogWriter(self.directory, self.base_url)
+        try:
+            job = _Crawl(self, client, robots, parser, writer)
+            home = await job.page(HOME_KEY, self.base_url, self._extract.parse_home, (), HomeResponse)
+            if home is None:
+                writer.abort()
+                logger.warning("Catalog crawl stopped: home page unavailable")
+                return None
+            writer.add(HOME_KEY, home)
+            items = _home_items(home)[: self.max_titles]
+            writer.add(ITEMS_KEY, orjson.dumps(items))
+            await asyncio.gather(*(job.title(item["slug"]) for item in items))
+            version = writer.commit()
+        except BaseException:
+            writer.abort()
+            raise
+        finally:
+            await client.aclose()
+            await robots.shutdown()
+            parser.shutdown()
+        self.stats["titles"] = job.titles
+        self.stats["last_seconds"] = round(time.perf_counter() - started, 2)
+        logger.info(f"Catalog {version}: {job.titles} titles in {self.stats['last_seconds']}s ({self.stats})")
+        return version
+
+
+class _Crawl:
+    """State of one crawl run."""
+
+    def __init__(
+        self, crawler: CatalogCrawler, client: httpx.AsyncClient, robots: RobotsCache, parser: ParsePool, writer: CatalogWriter
+    ) -> None:
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.client = client
+        self.robots = robots
+        self.parser = parser
+        self.writer = writer
+        self.titles = 0
+
+    async def title(self, slug: str) -> None:
+        url = urljoin(self.crawler.base_url, slug)
+        record = await self.page(title_key(slug), url, self.crawler._extract.parse_title, (slug,), TitleDetails)
+        if record is not None:
+            self.writer.add(title_key(slug), record)
+            self.titles += 1
+
+    async def page(
+        self, key: str, url: str, fn: Callable[..., Any], args: Tuple[Any, ...], model: Type[BaseModel]
+    ) -> Optional[bytes]:
+        """Record for the page at url, reused from the previous version when unchanged upstream."""
+        catalog = self.crawler.catalog
+        previous = catalog.raw(key)
+        validators = catalog.pages().get(url, {}) if previous is not None else {}
+        if not await self.robots.allowed(url):
+            self.stats["blocked"] += 1
+            return None
+        headers: Dict[str, str] = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        async with self.crawler._gate:
+            try:
+                async with self.crawler._scheduler.slot(PREFETCH):
+                    async with self.client.stream("GET", url, headers=headers) as resp:
+                        body = await read_capped(resp)
+            except (httpx.HTTPError, QueueDeadlineExceeded) as exc:
+                self.stats["errors"] += 1
+                logger.warning(f"Catalog fetch failed for {url}: {exc!r}")
+                return self._keep(url, previous, validators)
+            finally:
+                await asyncio.sleep(self.crawler._delay)
+        self.stats["fetched"] += 1
+        if body is None:
+            self.stats["errors"] += 1
+            logger.warning(f"Catalog page {url} exceeds {settings.MAX_RESPONSE_MB} MB, skipped")
+            return self._keep(url, previous, validators)
+        if resp.status_code == 304 and previous is not None:
+            self.stats["unchanged"] += 1
+            return self._keep(url, previous, validators)
+        if resp.status_code != 200:
+            self.stats["errors"] += 1
+            logger.debug(f"Catalog fetch of {url} returned {resp.status_code}")
+            return self._keep(url, previous, validators) if resp.status_code >= 500 else None
+        digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        fresh = {"etag": resp.headers.get("etag", ""), "last_modified": resp.headers.get("last-modified", ""), "digest": digest}
+        if previous is not None and validators.get("digest") == digest:
+            self.stats["unchanged"] += 1
+            return self._keep(url, previous, fresh)
+        try:
+            text = body.decode(resp.encoding or "utf-8", errors="replace")
+            raw = await self.parser.run(fn, text, self.crawler.base_url, *args)
+            record = orjson.dumps(model.model_validate(raw).model_dump(mode="json"))
+        except Exception as exc:
+            self.stats["errors"] += 1
+            logger.warning(f"Catalog parse failed for {url}: {exc!r}")
+            return self._keep(url, previous, validators)
+        self.stats["parsed"] += 1
+        self.writer.page(url, fresh)
+        return record
+
+    def _keep(self, url: str, previous: Optional[bytes], validators: Dict[str, str]) -> Optional[bytes]:
+        if previous is not None:
+            self.writer.page(url, validators)
+        return previous
+
+
+def _home_items(home: bytes) -> List[Dict[str, Any]]:
+    """Featured and section titles of a home record, first occurrence of each slug."""
+    data = orjson.loads(home)
+    seen: Dict[str, Dict[str, Any]] = {}
+    for item in [*data["featured"], *(it for section in data["sections"] for it in section["items"])]:
+        seen.setdefault(item["slug"], item)
+    return list(seen.values())
+
+
+async def _main(args: argparse.Namespace) -> None:
+    catalog = Catalog(args.dir)
+    await catalog.reload()
+    crawler = CatalogCrawler(catalog, args.dir, concurrency=args.concurrency, max_titles=args.max_titles)
+    try:
+        version = await crawler.crawl()
+    finally:
+        catalog.close()
+        await http_pool.aclose()
+    print(orjson.dumps({"version": version, **crawler.stats}).decode())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl the catalog into a snapshot the API can serve")
+    parser.add_argument("--dir", default=settings.CATALOG_DIR or "catalog", help="snapshot directory (CATALOG_DIR)")
+    parser.add_argument("--concurrency", type=int, default=settings.CATALOG_CRAWL_CONCURRENCY)
+    parser.add_argument("--max-titles", type=int, default=settings.CATALOG_MAX_TITLES)
+    asyncio.run(_main(parser.parse_args()))
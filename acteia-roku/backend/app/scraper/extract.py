@@ -0,0 +1,267 @@
+"""Page extractors.
+
+Everything here is a plain module-level function taking HTML text and
+returning plain dicts shaped like the models in app.models. This lets them
+run in a thread or process pool (see ParsePool) without dragging the
+scraper, its HTTP client or pydantic across the boundary.
+"""
+from __future__ import annotations
+import html as htmllib
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup
+from ..utils.parse import text_or_none, parse_year, parse_float
+
+STREAM_URL_RE = re.compile(r"https?://[^'\"]+\.(?:m3u8|mp4)")
+_EPISODE_NUM_RE = re.compile(r"(?:Epis[oó]dio|Ep)\s*(\d+)", flags=re.I)
+_QUOTE_RE = re.compile("['\"]")
+# Stream candidates in page text and scripts: one URL per match (no whitespace), query string kept
+_CANDIDATE_RE = re.compile(r"https?://[^'\"\s<>?#]+\.(?:m3u8|mp4)(?:\?[^'\"\s<>#]*)?")
+# <script> types whose text is code or config, as opposed to templates
+_SCRIPT_TYPES = frozenset({"", "text/javascript", "application/javascript", "module", "application/json"})
+
+
+def parse_home(html: str, base_url: str) -> Dict[str, Any]:
+    soup = BeautifulSoup(html, "lxml")
+    return {
+        "featured": _extract_featured(soup, base_url),
+        "sections": _extract_sections(soup, base_url),
+    }
+
+
+def parse_search(html: str, base_url: str) -> List[Dict[str, Any]]:
+    return _extract_grid_items(BeautifulSoup(html, "lxml"), base_url)
+
+
+def parse_title(html: str, base_url: str, slug: str) -> Dict[str, Any]:
+    soup = BeautifulSoup(html, "lxml")
+    title_el = soup.select_one("h1, h2.entry-title, .title, .post-title")
+    title = text_or_none(title_el) or slug
+    synopsis = text_or_none(soup.select_one(".synopsis, .description, .entry-content p"))
+    poster_url = _first_url([
+        img.get("src") for img in soup.select(".poster img, .thumb img, .entry-content img, img")
+    ])
+    poster_abs = _abs(poster_url, base_url) if poster_url else None
+    page_text = soup.get_text(" ")
+    item = {
+        "id": slug,
+        "slug": slug,
+        "title": title,
+        "year": parse_year(page_text),
+        "poster": {"url": poster_abs} if poster_abs else None,
+        "rating": parse_float(page_text),
+    }
+    genres = [a.get_text(strip=True) for a in soup.select(".genres a, .tags a, a[rel='tag']") if a.get_text(strip=True)]
+    return {
+        "item": item,
+        "synopsis": synopsis,
+        "genres": genres,
+        "episodes": _extract_episodes(soup),
+    }
+
+
+def parse_stream_page(html: str, base_url: str, episode_id: Optional[str]) -> Dict[str, Any]:
+    soup = BeautifulSoup(html, "lxml")
+    # Every candidate, <source> tags first, then URLs in the text and in inline scripts
+    streams = _stream_candidates(
+        [(source.get("src"), source.get("type")) for source in soup.select("video source[src], source[src]")],
+        soup.get_text(" "),
+        [script.string or "" for script in soup.find_all("script") if (script.get("type") or "").lower() in _SCRIPT_TYPES],
+        base_url,
+    )
+
+    ep_url: Optional[str] = None
+    if episode_id:
+        ep_link = soup.select_one(f"a[href*='{episode_id}']")
+        if ep_link and ep_link.get("href"):
+            ep_url = _abs(ep_link.get("href"), base_url)
+
+    return {"streams": streams, "ep_url": ep_url}
+
+
+def parse_episode_page(html: str, base_url: str) -> List[Dict[str, Any]]:
+    """First stream URL in the page text.
+
+    Not used by the app, which scans the raw markup with StreamUrlScanner;
+    kept only as the baseline for benchmarks/bench_extract.py and
+    benchmarks/bench_stream_scan.py.
+    """
+    m = STREAM_URL_RE.search(BeautifulSoup(html, "lxml").get_text(" "))
+    return [{"url": _abs(m.group(0), base_url)}] if m else []
+
+
+class StreamUrlScanner:
+    """Finds the first STREAM_URL_RE match in raw HTML fed in chunks.
+
+    Unlike parse_episode_page this looks at the markup itself, so URLs inside
+    inline scripts are found too. A match is reported once it can no longer
+    grow, i.e. once a quote follows it (the pattern cannot cross one).
+    """
+
+    def __init__(self) -> None:
+        self._buf = ""
+
+    def feed(self, text: str, final: bool = False) -> Optional[str]:
+        buf = self._buf + text
+        m = STREAM_URL_RE.search(buf)
+        if m is not None:
+            if final or _QUOTE_RE.search(buf, m.end()):
+                return htmllib.unescape(m.group(0))
+            # The start is settled, only the end may still move
+            self._buf = buf[m.start():]
+            return None
+        # Nothing before the last quote can be part of a later match
+        self._buf = buf[max(buf.rfind("'"), buf.rfind('"')) + 1:]
+        return None
+
+
+# ----------------------------
+# Internal helpers
+# ----------------------------
+
+def _extract_featured(soup: BeautifulSoup, base_url: str) -> List[Dict[str, Any]]:
+    featured: List[Dict[str, Any]] = []
+    seen: Set[str] = set()
+    for a in soup.select(".featured a[href], .slider a[href], .carousel a[href], a.featured")[:60]:
+        href = a.get("href")
+        if not href:
+            continue
+        slug = _slug(href)
+        if slug in seen:
+            continue
+        seen.add(slug)
+        title = (a.get("title") or text_or_none(a)).strip() if (a.get("title") or text_or_none(a)) else href
+        img = a.select_one("img")
+        poster_url = _first_url([img.get("data-src") if img else None, img.get("src") if img else None])
+        item: Dict[str, Any] = {"id": slug, "slug": slug, "title": title}
+        if poster_url:
+            item["poster"] = {"url": _abs(poster_url, base_url)}
+        featured.append(item)
+        if len(featured) == 20:
+            break
+    return featured
+
+
+def _extract_sections(soup: BeautifulSoup, base_url: str) -> List[Dict[str, Any]]:
+    sections: List[Dict[str, Any]] = []
+    # Try containers with headings and grids
+    containers = soup.select("section, .section, .block, .home-section, .module")[:20]
+    for cont in containers:
+        heading = text_or_none(cont.select_one("h2, h3, .section-title, .widget-title"))
+        if not heading:
+            continue
+        items = _extract_grid_items(cont, base_url, 30)
+        if items:
+            sections.append({"id": _slug(heading), "title": heading, "items": items})
+    # Fallback: top-level grids
+    if not sections:
+        items = _extract_grid_items(soup, base_url, 60)
+        if items:
+            sections.append({"id": "all", "title": "Conteúdo", "items": items})
+    return sections
+
+
+def _extract_grid_items(root: BeautifulSoup, base_url: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Up to limit items, one per slug (first occurrence wins)."""
+    items: List[Dict[str, Any]] = []
+    seen: Set[str] = set()
+    for a in root.select("a[href][title], .item a[href], .poster a[href], .thumb a[href], a.poster, a.item")[:300]:
+        href = a.get("href")
+        if not href:
+            continue
+        # Cards link the same title from poster and caption: skip repeats
+        # before reading anything else off the anchor
+        slug = _slug(href)
+        if slug in seen:
+            continue
+        seen.add(slug)
+        title = a.get("title") or text_or_none(a) or href
+        img = a.select_one("img")
+        poster_url = _first_url([
+            img.get("data-src") if img else None,
+            img.get("srcset") if img else None,
+            img.get("src") if img else None,
+        ])
+        item: Dict[str, Any] = {"id": slug, "slug": slug, "title": title}
+        if poster_url:
+            item["poster"] = {"url": _abs(_pick_from_srcset(poster_url), base_url)}
+        items.append(item)
+        if len(items) == limit:
+            break
+    return items
+
+
+def _extract_episodes(soup: BeautifulSoup) -> List[Dict[str, Any]]:
+    episodes: List[Dict[str, Any]] = []
+    # Try common lists
+    for li in soup.select(".episodes li, .episode-list li, ul.episodes li, .ep_list li, a.episode"):
+        a = li.select_one("a") if li.name == "li" else li
+        if not a:
+            continue
+        title = text_or_none(a) or a.get("title") or "Episódio"
+        href = a.get("href") or ""
+        num = None
+        m = _EPISODE_NUM_RE.search(title)
+        if m:
+            try:
+                num = int(m.group(1))
+            except Exception:
+                pass
+        episodes.append({"id": _slug(href) or title, "title": title, "number": num})
+    return episodes
+
+
+def _slug(href: str) -> str:
+    try:
+        slug = re.sub(r"https?://[^/]+", "", href)
+        slug = slug.strip("/")
+        return slug or "root"
+    except Exception:
+        return href
+
+
+def _stream_candidates(
+    sources: List[Tuple[Optional[str], Optional[str]]], text: str, scripts: Iterable[str], base_url: str
+) -> List[Dict[str, Any]]:
+    streams: List[Dict[str, Any]] = []
+    seen: Set[str] = set()
+
+    def add(url: str, mime_type: Optional[str] = None) -> None:
+        url = _abs(url, base_url)
+        if url not in seen:
+            seen.add(url)
+            streams.append({"url": url, "mime_type": mime_type})
+
+    for src, mime_type in sources:
+        if src and (".m3u8" in src or ".mp4" in src):
+            add(src, mime_type)
+    for m in _CANDIDATE_RE.finditer(text):
+        add(m.group(0))
+    for script in scripts:
+        # JSON-encoded config escapes its slashes
+        for m in _CANDIDATE_RE.finditer(script.replace("\\/", "/")):
+            add(m.group(0))
+    return streams
+
+
+def _abs(url: Optional[str], base_url: str) -> str:
+    if not url:
+        return ""
+    if url.startswith("http"):
+        return url
+    return urljoin(base_url, url)
+
+
+def _first_url(urls: List[Optional[str]]) -> Optional[str]:
+    for u in urls:
+        if u and isinstance(u, str):
+            return u
+    return None
+
+
+def _pick_from_srcset(src: str) -> str:
+    # Pick first URL from srcset or return src itself
+    if "," in src:
+        return src.split(",")[0].split()[0]
+    return src
@@ -0,0 +1,282 @@
+"""lxml fast-path extractors.
+
+Same functions and the same output as app.scraper.extract, but each page is
+parsed once into an lxml tree and every CSS selector union used there is a
+single precompiled XPath. The text helpers reproduce BeautifulSoup's
+get_text rules (strings inside script/style/template/rt/rp and comments are
+skipped, whitespace-only strings outside pre/textarea collapse to one
+character) so the regexes run over exactly the same text.
+"""
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Set
+from lxml import etree
+from .extract import (
+    STREAM_URL_RE,
+    _EPISODE_NUM_RE,
+    _SCRIPT_TYPES,
+    _abs,
+    _first_url,
+    _pick_from_srcset,
+    _slug,
+    _stream_candidates,
+)
+from ..utils.parse import parse_year, parse_float
+
+
+def _cls(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# bs4 gives strings inside these tags their own types, which get_text() skips
+_HIDDEN_TAGS = frozenset({"script", "style", "template", "rt", "rp"})
+_HIDDEN = "ancestor::script or ancestor::style or ancestor::template or ancestor::rt or ancestor::rp"
+_TEXT = etree.XPath(f".//text()[not({_HIDDEN})]", smart_strings=False)
+# get_text() on one of those tags keeps the strings typed after it, i.e. the
+# ones whose nearest hidden ancestor has the same name
+_TEXT_OWN = etree.XPath(
+    ".//text()[ancestor::*[self::script or self::style or self::template or self::rt or self::rp][1][name() = $tag]]",
+    smart_strings=False,
+)
+_TEXT_SMART = etree.XPath(f".//text()[not({_HIDDEN})]")
+_HAS_PRE = etree.XPath("boolean(//pre | //textarea)")
+
+# ".featured a[href], .slider a[href], .carousel a[href], a.featured"
+_FEATURED = etree.XPath(
+    f"//a[(@href and ancestor::*[{_cls('featured')} or {_cls('slider')} or {_cls('carousel')}]) or {_cls('featured')}]"
+)
+# "section, .section, .block, .home-section, .module"
+_SECTIONS = etree.XPath(
+    f"//*[self::section or {_cls('section')} or {_cls('block')} or {_cls('home-section')} or {_cls('module')}]"
+)
+# "h2, h3, .section-title, .widget-title" (first match)
+_HEADING = etree.XPath(f"(.//*[self::h2 or self::h3 or {_cls('section-title')} or {_cls('widget-title')}])[1]")
+# "a[href][title], .item a[href], .poster a[href], .thumb a[href], a.poster, a.item"
+_GRID = etree.XPath(
+    ".//a[(@href and @title)"
+    f" or (@href and ancestor::*[{_cls('item')} or {_cls('poster')} or {_cls('thumb')}])"
+    f" or {_cls('poster')} or {_cls('item')}]"
+)
+# ".episodes li, .episode-list li, ul.episodes li, .ep_list li, a.episode"
+_EPISODES = etree.XPath(
+    f"//*[(self::li and ancestor::*[{_cls('episodes')} or {_cls('episode-list')} or {_cls('ep_list')}])"
+    f" or (self::a and {_cls('episode')})]"
+)
+# "h1, h2.entry-title, .title, .post-title" (first match)
+_TITLE = etree.XPath(f"(//*[self::h1 or (self::h2 and {_cls('entry-title')}) or {_cls('title')} or {_cls('post-title')}])[1]")
+# ".synopsis, .description, .entry-content p" (first match)
+_SYNOPSIS = etree.XPath(
+    f"(//*[{_cls('synopsis')} or {_cls('description')} or (self::p and ancestor::*[{_cls('entry-content')}])])[1]"
+)
+# ".poster img, .thumb img, .entry-content img, img" is every img
+_IMAGES = etree.XPath("//img")
+# ".genres a, .tags a, a[rel='tag']"
+_GENRES = etree.XPath(f"//a[ancestor::*[{_cls('genres')} or {_cls('tags')}] or @rel='tag']")
+# "video source[src], source[src]"
+_SOURCES = etree.XPath("//source[@src]")
+_SCRIPTS = etree.XPath("//script")
+# "a[href*='{episode_id}']" (first match); a variable instead of string formatting
+_EPISODE_LINK = etree.XPath("(//a[contains(@href, $ep)])[1]")
+
+_ASCII_SPACES = str.maketrans("", "", "\x20\x0a\x09\x0c\x0d")
+
+
+def _parse(html: str) -> etree._Element:
+    # Same feed-based parse bs4's lxml tree builder does
+    if html and html[0] == "\ufeff":
+        html = html[1:]
+    parser = etree.HTMLParser(recover=True)
+    parser.feed(html)
+    try:
+        root = parser.close()
+    except etree.XMLSyntaxError:
+        root = None
+    return root if root is not None else etree.Element("html")
+
+
+def _page_text(root: etree._Element) -> str:
+    """soup.get_text(" ")"""
+    if not _HAS_PRE(root):
+        return " ".join(_collapse(s) for s in _TEXT(root))
+    strings = []
+    for s in _TEXT_SMART(root):
+        if s.translate(_ASCII_SPACES) == "":
+            owner = s.getparent()
+            if s.is_tail:
+                owner = owner.getparent()
+            in_pre = owner is not None and (
+                owner.tag in ("pre", "textarea") or any(a.tag in ("pre", "textarea") for a in owner.iterancestors())
+            )
+            if not in_pre:
+                s = "\n" if "\n" in s else " "
+        strings.append(str(s))
+    return " ".join(strings)
+
+
+def _collapse(s: str) -> str:
+    if s.translate(_ASCII_SPACES) == "":
+        return "\n" if "\n" in s else " "
+    return s
+
+
+def _text_or_none(el: Optional[etree._Element]) -> Optional[str]:
+    """utils.parse.text_or_none, i.e. el.get_text(strip=True) or None"""
+    if el is None:
+        return None
+    strings = _TEXT_OWN(el, tag=el.tag) if el.tag in _HIDDEN_TAGS else _TEXT(el)
+    return "".join(s.strip() for s in strings) or None
+
+
+def parse_home(html: str, base_url: str) -> Dict[str, Any]:
+    root = _parse(html)
+    return {
+        "featured": _extract_featured(root, base_url),
+        "sections": _extract_sections(root, base_url),
+    }
+
+
+def parse_search(html: str, base_url: str) -> List[Dict[str, Any]]:
+    return _extract_grid_items(_parse(html), base_url)
+
+
+def parse_title(html: str, base_url: str, slug: str) -> Dict[str, Any]:
+    root = _parse(html)
+    title_el = _TITLE(root)
+    title = _text_or_none(title_el[0] if title_el else None) or slug
+    synopsis_el = _SYNOPSIS(root)
+    synopsis = _text_or_none(synopsis_el[0] if synopsis_el else None)
+    poster_url = _first_url([img.get("src") for img in _IMAGES(root)])
+    poster_abs = _abs(poster_url, base_url) if poster_url else None
+    page_text = _page_text(root)
+    item = {
+        "id": slug,
+        "slug": slug,
+        "title": title,
+        "year": parse_year(page_text),
+        "poster": {"url": poster_abs} if poster_abs else None,
+        "rating": parse_float(page_text),
+    }
+    genres = [t for t in (_text_or_none(a) for a in _GENRES(root)) if t]
+    return {
+        "item": item,
+        "synopsis": synopsis,
+        "genres": genres,
+        "episodes": _extract_episodes(root),
+    }
+
+
+def parse_stream_page(html: str, base_url: str, episode_id: Optional[str]) -> Dict[str, Any]:
+    root = _parse(html)
+    streams = _stream_candidates(
+        [(source.get("src"), source.get("type")) for source in _SOURCES(root)],
+        _page_text(root),
+        [script.text or "" for script in _SCRIPTS(root) if (script.get("type") or "").lower() in _SCRIPT_TYPES],
+        base_url,
+    )
+
+    ep_url: Optional[str] = None
+    if episode_id:
+        ep_link = _EPISODE_LINK(root, ep=episode_id)
+        if ep_link and ep_link[0].get("href"):
+            ep_url = _abs(ep_link[0].get("href"), base_url)
+
+    return {"streams": streams, "ep_url": ep_url}
+
+
+def parse_episode_page(html: str, base_url: str) -> List[Dict[str, Any]]:
+    """First stream URL in the page text.
+
+    Not used by the app, which scans the raw markup with StreamUrlScanner;
+    kept only as the baseline for benchmarks/bench_extract.py and
+    benchmarks/bench_stream_scan.py.
+    """
+    m = STREAM_URL_RE.search(_page_text(_parse(html)))
+    return [{"url": _abs(m.group(0), base_url)}] if m else []
+
+
+# ----------------------------
+# Internal helpers
+# ----------------------------
+
+def _extract_featured(root: etree._Element, base_url: str) -> List[Dict[str, Any]]:
+    featured: List[Dict[str, Any]] = []
+    seen: Set[str] = set()
+    for a in _FEATURED(root)[:60]:
+        href = a.get("href")
+        if not href:
+            continue
+        slug = _slug(href)
+        if slug in seen:
+            continue
+        seen.add(slug)
+        label = a.get("title") or _text_or_none(a)
+        title = label.strip() if label else href
+        img = a.find(".//img")
+        poster_url = _first_url([img.get("data-src") if img is not None else None, img.get("src") if img is not None else None])
+        item: Dict[str, Any] = {"id": slug, "slug": slug, "title": title}
+        if poster_url:
+            item["poster"] = {"url": _abs(poster_url, base_url)}
+        featured.append(item)
+        if len(featured) == 20:
+            break
+    return featured
+
+
+def _extract_sections(root: etree._Element, base_url: str) -> List[Dict[str, Any]]:
+    sections: List[Dict[str, Any]] = []
+    for cont in _SECTIONS(root)[:20]:
+        heading_el = _HEADING(cont)
+        heading = _text_or_none(heading_el[0] if heading_el else None)
+        if not heading:
+            continue
+        items = _extract_grid_items(cont, base_url, 30)
+        if items:
+            sections.append({"id": _slug(heading), "title": heading, "items": items})
+    if not sections:
+        items = _extract_grid_items(root, base_url, 60)
+        if items:
+            sections.append({"id": "all", "title": "Conteúdo", "items": items})
+    return sections
+
+
+def _extract_grid_items(root: etree._Element, base_url: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    items: List[Dict[str, Any]] = []
+    seen: Set[str] = set()
+    for a in _GRID(root)[:300]:
+        href = a.get("href")
+        if not href:
+            continue
+        slug = _slug(href)
+        if slug in seen:
+            continue
+        seen.add(slug)
+        title = a.get("title") or _text_or_none(a) or href
+        img = a.find(".//img")
+        poster_url = None
+        if img is not None:
+            poster_url = _first_url([img.get("data-src"), img.get("srcset"), img.get("src")])
+        item: Dict[str, Any] = {"id": slug, "slug": slug, "title": title}
+        if poster_url:
+            item["poster"] = {"url": _abs(_pick_from_srcset(poster_url), base_url)}
+        items.append(item)
+        if len(items) == limit:
+            break
+    return items
+
+
+def _extract_episodes(root: etree._Element) -> List[Dict[str, Any]]:
+    episodes: List[Dict[str, Any]] = []
+    for li in _EPISODES(root):
+        a = li.find(".//a") if li.tag == "li" else li
+        if a is None:
+            continue
+        title = _text_or_none(a) or a.get("title") or "Episódio"
+        href = a.get("href") or ""
+        num = None
+        m = _EPISODE_NUM_RE.search(title)
+        if m:
+            try:
+                num = int(m.group(1))
+            except Exception:
+                pass
+        episodes.append({"id": _slug(href) or title, "title": title, "number": num})
+    return episodes
@@ -1,64 +1,443 @@
 import asyncio
-from typing import Optional, Dict, Tuple
+import codecs
+import time
+from collections import Counter
+from typing import Callable, Optional, Dict, List, Set, Tuple
 import httpx
+import orjson
 from loguru import logger
 from cachetools import TTLCache
 from urllib.parse import urljoin
 from .robots import RobotsCache
 from ..config import settings
+from ..utils.disk_cache import DiskCache, disk_cache
+from ..utils.http_pool import HttpPool, http_pool, read_capped
+from ..utils.metrics import HTTP_GET_SECONDS, UPSTREAM_SECONDS
+from ..utils.rate_limit import charge
+from ..utils.scheduler import INTERACTIVE, PREFETCH, QueueDeadlineExceeded, Ticket, UpstreamScheduler, upstream_scheduler
+
+# (status, headers, body) as stored in the cache and shared between coalesced callers
+CacheEntry = Tuple[int, Dict[str, str], bytes]
+# What the TTL cache actually holds: (fetched_at, entry)
+StoredEntry = Tuple[float, CacheEntry]
+
+# The body we keep is already decoded, so these no longer describe it
+_DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+# Returned (never cached) when the upstream body exceeds MAX_RESPONSE_MB
+_TOO_LARGE: CacheEntry = (502, {}, b"upstream response too large")
+# Returned (never cached) when the request waited past its class deadline in the scheduler
+_DROPPED: CacheEntry = (503, {}, b"upstream busy, request dropped")
+# Returned (never cached) when a background refresh finds the URL disallowed by robots.txt
+_BLOCKED: CacheEntry = (451, {}, b"blocked by robots.txt")
 
 
 class AsyncHttpClient:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        disk: Optional[DiskCache] = disk_cache,
+        scheduler: UpstreamScheduler = upstream_scheduler,
+        pool: HttpPool = http_pool,
+    ) -> None:
         self._client: Optional[httpx.AsyncClient] = None
-        self._cache: TTLCache[str, Tuple[int, Dict[str, str], bytes]] = TTLCache(
-            maxsize=settings.CACHE_MAXSIZE, ttl=settings.CACHE_TTL_SECONDS
+        self._pool = pool
+        # Entries outlive CACHE_TTL_SECONDS by the stale grace period; freshness is
+        # decided from fetched_at so expired entries can still be served while refreshing
+        self._cache: TTLCache[str, StoredEntry] = TTLCache(
+            maxsize=settings.CACHE_MAXSIZE,
+            ttl=settings.CACHE_TTL_SECONDS + max(0, settings.CACHE_STALE_GRACE_SECONDS),
         )
-        self._robots = RobotsCache()
-        self._sem = asyncio.Semaphore(settings.MAX_CONCURRENCY)
+        # Optional tier shared with the other workers on this host
+        self._disk = disk
+        self.robots = RobotsCache(pool)
+        # Upstream slots by priority class, shared with the image proxy
+        self._scheduler = scheduler
+        # Scheduler ticket of each in-flight fetch, so a more urgent caller joining
+        # it can raise its priority while it is still queued
+        self._tickets: Dict[str, Ticket] = {}
+        # Same for scans, kept apart so a scan and a fetch of one URL never touch each other's ticket
+        self._scan_tickets: Dict[str, Ticket] = {}
+        # Single-flight: one upstream fetch per cache key, shared by concurrent callers
+        self._inflight: Dict[str, "asyncio.Task[CacheEntry]"] = {}
+        # Callers awaiting each fetch; when the last one is cancelled (say, the losing
+        # search attempt) the fetch is cancelled too, unless it is a background refresh
+        self._waiters: Dict["asyncio.Task[CacheEntry]", int] = {}
+        self._background: Set["asyncio.Task[CacheEntry]"] = set()
+        self.stats: Dict[str, int] = {
+            "hits": 0, "misses": 0, "coalesced": 0, "upstream": 0, "stale": 0, "refreshed": 0,
+            "revalidated": 0, "bytes_saved": 0, "disk_hits": 0, "too_large": 0, "scans": 0, "scans_cut_short": 0, "dropped": 0,
+        }
+        # Request counts per URL, used to pick which pages the refresher keeps warm
+        self._demand: Counter = Counter()
+        self._refresher: Optional["asyncio.Task[None]"] = None
 
     async def startup(self) -> None:
         headers = {"User-Agent": settings.USER_AGENT}
         if settings.AUTH_COOKIE:
             headers["Cookie"] = settings.AUTH_COOKIE
-        self._client = httpx.AsyncClient(
+        self._client = self._pool.client(
             headers=headers,
             timeout=settings.REQUEST_TIMEOUT_SECONDS,
             follow_redirects=True,
         )
+        if settings.REFRESH_INTERVAL_SECONDS > 0:
+            self._refresher = asyncio.create_task(self._refresh_loop())
         logger.info("AsyncHttpClient started")
 
     async def shutdown(self) -> None:
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
+        for task in list(self._inflight.values()):
+            task.cancel()
+        self._inflight.clear()
+        await self.robots.shutdown()
         if self._client is not None:
             await self._client.aclose()
             self._client = None
             logger.info("AsyncHttpClient closed")
 
-    async def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+    async def get(
+        self, url: str, headers: Optional[Dict[str, str]] = None, priority: str = INTERACTIVE
+    ) -> httpx.Response:
         assert self._client is not None, "Client not started"
+        started = time.perf_counter()
 
         # Robots.txt check (best-effort)
         if settings.RESPECT_ROBOTS:
-            if not await self._robots.allowed(url):
+            if not await self.robots.allowed(url):
                 logger.warning(f"Blocked by robots.txt: {url}")
+                HTTP_GET_SECONDS.observe(time.perf_counter() - started, outcome="blocked")
                 return httpx.Response(status_code=451, content=b"blocked by robots.txt", request=httpx.Request("GET", url))
-        if not await self._robots.allowed(url):
-            logger.warning(f"Blocked by robots.txt: {url}")
-            return httpx.Response(status_code=451, content=b"blocked by robots.txt", request=httpx.Request("GET", url))
 
         cache_key = url
-        if cache_key in self._cache:
-            status, resp_headers, body = self._cache[cache_key]
-            logger.debug(f"Cache hit for {url}")
-            return httpx.Response(status_code=status, headers=resp_headers, content=body, request=httpx.Request("GET", url))
-
-        async with self._sem:
-            logger.debug(f"GET {url}")
-            resp = await self._client.get(url, headers=headers)
-            if resp.status_code == 200 and resp.headers.get("content-type", "").startswith("text"):
-                # Cache only text-like responses
-                self._cache[cache_key] = (resp.status_code, dict(resp.headers), resp.content)
-            return resp
+        if self._refresher is not None:
+            self._demand[cache_key] += 1
+        stored = self._cache.get(cache_key)
+        if stored is not None:
+            fetched_at, entry = stored
+            if time.monotonic() - fetched_at < settings.CACHE_TTL_SECONDS:
+                self.stats["hits"] += 1
+                outcome = "hit"
+                logger.debug(f"Cache hit for {url}")
+            else:
+                # Stale-while-revalidate: answer now, refresh in the background
+                self.stats["stale"] += 1
+                outcome = "stale"
+                logger.debug(f"Serving stale {url}")
+                self.refresh(url, headers)
+            response = self._to_response(url, entry)
+            HTTP_GET_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
+            return response
+
+        task = self._inflight.get(cache_key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+            outcome = "coalesced"
+            logger.debug(f"Coalesced GET {url}")
+            self.promote(url, priority)
+        else:
+            self.stats["misses"] += 1
+            outcome = "miss"
+            task = self._start_fetch(url, headers, priority)
+        # Shield so one caller going away does not cancel the fetch for everyone else
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            entry = await asyncio.shield(task)
+        finally:
+            self._release(cache_key, task)
+        HTTP_GET_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
+        return self._to_response(url, entry)
+
+    def _release(self, cache_key: str, task: "asyncio.Task[CacheEntry]") -> None:
+        left = self._waiters[task] - 1
+        if left:
+            self._waiters[task] = left
+            return
+        del self._waiters[task]
+        if not task.done() and task not in self._background:
+            logger.debug("Cancelling fetch nobody waits for")
+            # Forget it first: a get() arriving before the cancellation lands
+            # must start its own fetch, not join one that is about to fail
+            if self._inflight.get(cache_key) is task:
+                del self._inflight[cache_key]
+                self._tickets.pop(cache_key, None)
+            task.cancel()
+
+    def promote(self, url: str, priority: str) -> None:
+        """Raise the priority of a fetch or scan of url still queued in the scheduler."""
+        for tickets in (self._tickets, self._scan_tickets):
+            ticket = tickets.get(url)
+            if ticket is not None:
+                ticket.promote(priority)
+
+    def refresh(self, url: str, headers: Optional[Dict[str, str]] = None) -> None:
+        """Re-fetch url in the background unless a fetch for it is already running.
+
+        robots.txt is checked by the fetch itself, so a disallowed url is never refetched.
+        """
+        if url in self._inflight or self._client is None:
+            return
+        self.stats["refreshed"] += 1
+        self._background.add(self._start_fetch(url, headers, PREFETCH, check_robots=True))
+
+    def _start_fetch(
+        self, url: str, headers: Optional[Dict[str, str]], priority: str, check_robots: bool = False
+    ) -> "asyncio.Task[CacheEntry]":
+        task = asyncio.ensure_future(self._fetch(url, headers, priority, check_robots))
+        self._inflight[url] = task
+        task.add_done_callback(lambda t, key=url: self._fetch_done(key, t))
+        return task
+
+    async def _fetch(
+        self, url: str, headers: Optional[Dict[str, str]], priority: str, check_robots: bool = False
+    ) -> CacheEntry:
+        assert self._client is not None, "Client not started"
+        if check_robots and settings.RESPECT_ROBOTS and not await self.robots.allowed(url):
+            logger.debug(f"Not refreshing {url}: blocked by robots.txt")
+            return _BLOCKED
+        # Revalidate a cached (usually stale) copy instead of downloading it again
+        stored = self._cache.get(url)
+        if stored is None and self._disk is not None:
+            stored = await self._disk_get(url)
+            if stored is not None and time.monotonic() - stored[0] < settings.CACHE_TTL_SECONDS:
+                self.stats["disk_hits"] += 1
+                self._cache[url] = stored
+                return stored[1]
+        if stored is not None:
+            headers = {**(headers or {}), **self._validators(stored[1][1])}
+        ticket = self._scheduler.slot(priority)
+        self._tickets[url] = ticket
+        try:
+            async with ticket:
+                logger.debug(f"GET {url}")
+                self.stats["upstream"] += 1
+                charge(settings.RATE_LIMIT_PAGE_COST)
+                with UPSTREAM_SECONDS.time(source="page"):
+                    async with self._client.stream("GET", url, headers=headers) as resp:
+                        body = await self._read_capped(url, resp)
+        except QueueDeadlineExceeded:
+            return self._dropped(url)
+        finally:
+            if self._tickets.get(url) is ticket:
+                del self._tickets[url]
+        if body is None:
+            return _TOO_LARGE
+        if resp.status_code == 304 and stored is not None:
+            status, old_headers, body = stored[1]
+            merged = httpx.Headers(old_headers)
+            merged.update(self._storable_headers(resp.headers))
+            # Same body, so the parsed-page cache (keyed by body hash) stays valid too
+            entry: CacheEntry = (status, dict(merged.items()), body)
+            self._cache[url] = (time.monotonic(), entry)
+            await self._disk_set(url, entry)
+            self.stats["revalidated"] += 1
+            self.stats["bytes_saved"] += len(body)
+            logger.debug(f"Revalidated {url} (304)")
+            return entry
+        entry = (resp.status_code, self._storable_headers(resp.headers), body)
+        await self._store(url, entry)
+        return entry
+
+    async def _store(self, url: str, entry: CacheEntry) -> None:
+        status, resp_headers, _ = entry
+        if status == 200 and httpx.Headers(resp_headers).get("content-type", "").startswith("text"):
+            # Cache only text-like responses
+            self._cache[url] = (time.monotonic(), entry)
+            await self._disk_set(url, entry)
+
+    async def _read_capped(self, url: str, resp: httpx.Response) -> Optional[bytes]:
+        """Read the body of a streamed response, or None once it exceeds MAX_RESPONSE_MB."""
+        body = await read_capped(resp)
+        return self._too_large(url) if body is None else body
+
+    def _too_large(self, url: str) -> None:
+        self.stats["too_large"] += 1
+        logger.warning(f"Response from {url} exceeds {settings.MAX_RESPONSE_MB} MB, dropped")
+        return None
+
+    def _dropped(self, url: str) -> CacheEntry:
+        self.stats["dropped"] += 1
+        logger.debug(f"Dropped queued request for {url}")
+        return _DROPPED
+
+    async def scan(
+        self,
+        url: str,
+        feed: Callable[[str, bool], Optional[str]],
+        headers: Optional[Dict[str, str]] = None,
+        priority: str = INTERACTIVE,
+    ) -> Optional[str]:
+        """Feed the body of url to feed(text, final) and return its first non-None answer.
+
+        A body get() has or is fetching (cached in memory or on disk, or in
+        flight) is fed whole, after get() revalidated it if stale. Otherwise
+        the body is streamed and the connection closed as soon as feed
+        answers, so a match near the top of a large page costs only the
+        bytes before it. Bodies read to the end are cached exactly as get()
+        would.
+        """
+        assert self._client is not None, "Client not started"
+        if settings.RESPECT_ROBOTS and not await self.robots.allowed(url):
+            logger.warning(f"Blocked by robots.txt: {url}")
+            return None
+        if await self._has_body(url):
+            return await self._scan_whole(url, feed, headers, priority)
+
+        ticket = self._scheduler.slot(priority)
+        self._scan_tickets[url] = ticket
+        joined = False
+        found: Optional[str] = None
+        entry: Optional[CacheEntry] = None
+        try:
+            async with ticket:
+                # get() may have started on it while this scan was queued
+                joined = url in self._cache or url in self._inflight
+                if not joined:
+                    found, entry = await self._scan_stream(url, feed, headers)
+        except QueueDeadlineExceeded:
+            self._dropped(url)
+            return None
+        finally:
+            if self._scan_tickets.get(url) is ticket:
+                del self._scan_tickets[url]
+        if joined:
+            return await self._scan_whole(url, feed, headers, priority)
+        if entry is not None:
+            await self._store(url, entry)
+        return found
+
+    async def _has_body(self, url: str) -> bool:
+        """Whether get() would answer url from a body it has or is fetching rather than a new download."""
+        if url in self._cache or url in self._inflight:
+            return True
+        if self._disk is None:
+            return False
+        stored = await self._disk_get(url)
+        if stored is None:
+            return False
+        if time.monotonic() - stored[0] < settings.CACHE_TTL_SECONDS:
+            self.stats["disk_hits"] += 1
+            self._cache[url] = stored
+        return True
+
+    async def _scan_whole(
+        self, url: str, feed: Callable[[str, bool], Optional[str]], headers: Optional[Dict[str, str]], priority: str
+    ) -> Optional[str]:
+        resp = await self.get(url, headers, priority)
+        return feed(resp.text, True) if resp.status_code == 200 else None
+
+    async def _scan_stream(
+        self, url: str, feed: Callable[[str, bool], Optional[str]], headers: Optional[Dict[str, str]]
+    ) -> Tuple[Optional[str], Optional[CacheEntry]]:
+        """feed's answer, plus the entry to cache when the body was read to the end."""
+        assert self._client is not None, "Client not started"
+        logger.debug(f"GET {url} (scan)")
+        self.stats["scans"] += 1
+        self.stats["upstream"] += 1
+        charge(settings.RATE_LIMIT_PAGE_COST)
+        # Timed however the scan ends: matched early, non-200 or too large
+        with UPSTREAM_SECONDS.time(source="scan"):
+            async with self._client.stream("GET", url, headers=headers) as resp:
+                if resp.status_code != 200:
+                    return None, None
+                limit = settings.MAX_RESPONSE_MB * 1024 * 1024
+                decoder = codecs.getincrementaldecoder(resp.encoding or "utf-8")(errors="replace")
+                chunks: List[bytes] = []
+                size = 0
+                async for chunk in resp.aiter_bytes():
+                    size += len(chunk)
+                    if 0 < limit < size:
+                        return self._too_large(url), None
+                    chunks.append(chunk)
+                    found = feed(decoder.decode(chunk), False)
+                    if found is not None:
+                        self.stats["scans_cut_short"] += 1
+                        logger.debug(f"Scan of {url} matched after {size} bytes")
+                        return found, None
+                found = feed(decoder.decode(b"", final=True), True)
+                return found, (resp.status_code, self._storable_headers(resp.headers), b"".join(chunks))
+
+    async def _disk_get(self, url: str) -> Optional[StoredEntry]:
+        assert self._disk is not None
+        hit = await self._disk.aget(f"http:{url}")
+        if hit is None:
+            return None
+        meta = orjson.loads(hit.meta)
+        # Disk timestamps are wall clock; translate the age onto our monotonic clock
+        fetched_at = time.monotonic() - max(0.0, time.time() - hit.stored_at)
+        return fetched_at, (meta["status"], meta["headers"], hit.value)
+
+    async def _disk_set(self, url: str, entry: CacheEntry) -> None:
+        if self._disk is None:
+            return
+        status, resp_headers, body = entry
+        meta = orjson.dumps({"status": status, "headers": resp_headers}).decode()
+        ttl = settings.CACHE_TTL_SECONDS + max(0, settings.CACHE_STALE_GRACE_SECONDS)
+        await self._disk.aset(f"http:{url}", body, ttl, meta)
+
+    def _fetch_done(self, cache_key: str, task: "asyncio.Task[CacheEntry]") -> None:
+        if self._inflight.get(cache_key) is task:
+            del self._inflight[cache_key]
+        self._background.discard(task)
+        # Mark the exception as retrieved even if every waiter has gone away
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"Fetch failed for {cache_key}: {task.exception()!r}")
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            try:
+                for url in await self._refresh_targets():
+                    self.refresh(url)
+            except Exception as exc:
+                logger.warning(f"Cache refresher error: {exc}")
+            await asyncio.sleep(settings.REFRESH_INTERVAL_SECONDS)
+
+    async def _refresh_targets(self) -> List[str]:
+        """Most requested pages (the base URL first, if requested) that are missing or about to expire.
+
+        Pages robots.txt disallows are left out.
+        """
+        base = str(settings.BASE_URL)
+        hot = [url for url, _ in self._demand.most_common(settings.REFRESH_HOT_PAGES)]
+        if self._demand[base] > 0:
+            hot.insert(0, base)
+        # Halve the counts every cycle so popularity follows recent traffic
+        self._demand = Counter({url: n // 2 for url, n in self._demand.most_common(settings.REFRESH_HOT_PAGES * 4) if n > 1})
+
+        deadline = time.monotonic() - max(0, settings.CACHE_TTL_SECONDS - settings.REFRESH_AHEAD_SECONDS)
+        targets: List[str] = []
+        for url in hot:
+            if url in targets or url in self._inflight:
+                continue
+            stored = self._cache.get(url)
+            if stored is not None and stored[0] > deadline:
+                continue
+            if settings.RESPECT_ROBOTS and not await self.robots.allowed(url):
+                continue
+            targets.append(url)
+            if len(targets) >= settings.REFRESH_MAX_PER_CYCLE:
+                break
+        return targets
+
+    @staticmethod
+    def _validators(stored_headers: Dict[str, str]) -> Dict[str, str]:
+        h = httpx.Headers(stored_headers)
+        validators: Dict[str, str] = {}
+        if h.get("etag"):
+            validators["If-None-Match"] = h["etag"]
+        if h.get("last-modified"):
+            validators["If-Modified-Since"] = h["last-modified"]
+        return validators
+
+    @staticmethod
+    def _storable_headers(headers: httpx.Headers) -> Dict[str, str]:
+        return {k: v for k, v in headers.items() if k.lower() not in _DROP_HEADERS}
+
+    @staticmethod
+    def _to_response(url: str, entry: CacheEntry) -> httpx.Response:
+        status, resp_headers, body = entry
+        return httpx.Response(status_code=status, headers=resp_headers, content=body, request=httpx.Request("GET", url))
 
     def absolute(self, url: str, path: str) -> str:
-        return urljoin(url, path)
\ No newline at end of file
+        return urljoin(url, path)
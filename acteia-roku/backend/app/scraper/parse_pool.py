@@ -0,0 +1,60 @@
+from __future__ import annotations
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional, Tuple, TypeVar
+from loguru import logger
+from ..config import settings
+from ..utils.metrics import EXTRACT_SECONDS, PARSE_WAIT_SECONDS
+
+T = TypeVar("T")
+
+
+def _timed(fn: Callable[..., T], *args: Any) -> Tuple[T, float]:
+    # Module level so process workers can unpickle it; the clock is read in the worker
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+class ParsePool:
+    """Runs the extractors (app.scraper.extract or extract_lxml) off the event loop.
+
+    kind is "thread", "process" or "inline" (run in the caller, mainly for
+    debugging). Process workers only receive HTML text and return plain
+    dicts, so there is nothing to share with the parent beyond pickling.
+    """
+
+    def __init__(self, kind: str = settings.PARSE_EXECUTOR, workers: int = settings.PARSE_WORKERS) -> None:
+        if kind not in {"thread", "process", "inline"}:
+            raise ValueError(f"unknown parse executor: {kind}")
+        self.kind = kind
+        self.workers = max(1, workers)
+        self._executor: Optional[Executor] = None
+
+    def startup(self) -> None:
+        if self.kind == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="parse")
+        elif self.kind == "process":
+            # spawn: forking a process that already runs an event loop and threads is not safe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        logger.info(f"ParsePool started ({self.kind}, {self.workers} workers)")
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            logger.info("ParsePool closed")
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        start = time.perf_counter()
+        if self._executor is None:
+            result, work = _timed(fn, *args)
+        else:
+            result, work = await asyncio.get_running_loop().run_in_executor(self._executor, _timed, fn, *args)
+        EXTRACT_SECONDS.observe(work, extractor=fn.__name__)
+        PARSE_WAIT_SECONDS.observe(max(0.0, time.perf_counter() - start - work))
+        return result
@@ -1,45 +1,202 @@
 import asyncio
-from functools import lru_cache
-from typing import Dict
-from urllib.parse import urlparse, urljoin
-import httpx
+import re
+import time
+from typing import Dict, List, Optional, Pattern, Tuple
+from urllib.parse import quote, unquote, urljoin, urlparse
 from loguru import logger
+from ..config import settings
+from ..utils.http_pool import HttpPool, http_pool
 
+# RFC 9309 asks crawlers to parse at least 500 KiB; anything past this is ignored
+_MAX_ROBOTS_BYTES = 512 * 1024
+# Characters left as they are when paths and rules are normalized for comparison
+_SAFE = "/?=&;:@!$'()*+,~-._"
+
+
+def _normalize(path: str) -> str:
+    """Path with percent-encoding made uniform, so /caf%C3%A9 and /café compare equal."""
+    if path.isascii() and "%" not in path and " " not in path:
+        return path
+    return quote(unquote(path), safe=_SAFE)
+
+
+class _Group:
+    """Rules of one user-agent group.
+
+    Plain rules live in a character trie: walking a path down it finds the
+    longest matching rule in one pass. Rules with * or $ are few in practice
+    and go to compiled regexes. The longest rule wins; Allow wins a tie.
+    """
+
+    __slots__ = ("_trie", "_patterns")
 
-class RobotsCache:
     def __init__(self) -> None:
-        self._cache: Dict[str, str] = {}
-        self._lock = asyncio.Lock()
+        # Node: (children, [verdict]); verdict is None, True (allow) or False (disallow)
+        self._trie: Tuple[Dict[str, tuple], List[Optional[bool]]] = ({}, [None])
+        # (rule length, allow, regex)
+        self._patterns: List[Tuple[int, bool, Pattern[str]]] = []
+
+    def add(self, path: str, allow: bool) -> None:
+        if "*" in path or path.endswith("$"):
+            anchored = path.endswith("$")
+            body = _normalize(path[:-1] if anchored else path)
+            regex = ".*".join(re.escape(part) for part in body.split("*")) + ("$" if anchored else "")
+            # Measured after normalizing, like the trie depth of plain rules (the $ still counts)
+            self._patterns.append((len(body) + anchored, allow, re.compile(regex)))
+            return
+        node = self._trie
+        for char in _normalize(path):
+            children = node[0]
+            child = children.get(char)
+            if child is None:
+                child = children[char] = ({}, [None])
+            node = child
+        # Same path listed both ways: Allow wins
+        node[1][0] = allow or bool(node[1][0])
+
+    def allowed(self, path: str) -> bool:
+        best_len, best = -1, True
+        node = self._trie
+        depth = 0
+        for char in path:
+            node = node[0].get(char)
+            if node is None:
+                break
+            depth += 1
+            verdict = node[1][0]
+            if verdict is not None:
+                best_len, best = depth, verdict
+        for length, allow, regex in self._patterns:
+            if (length > best_len or (length == best_len and allow)) and regex.match(path):
+                best_len, best = length, allow
+        return best
+
+
+_ALLOW_ALL = _Group()
+
+
+class RobotsRules:
+    """robots.txt compiled once per host (RFC 9309 groups and precedence)."""
+
+    __slots__ = ("_groups",)
+
+    def __init__(self, groups: Optional[Dict[str, _Group]] = None) -> None:
+        self._groups = groups or {}
+
+    @classmethod
+    def parse(cls, text: str) -> "RobotsRules":
+        groups: Dict[str, _Group] = {}
+        agents: List[str] = []
+        in_rules = False
+        for raw in text.splitlines():
+            line = raw.split("#", 1)[0].strip()
+            if ":" not in line:
+                continue
+            key, value = (part.strip() for part in line.split(":", 1))
+            key = key.lower()
+            if key == "user-agent":
+                if in_rules:
+                    # A user-agent line after rules starts the next group
+                    agents, in_rules = [], False
+                agents.append(value.lower())
+            elif key in ("allow", "disallow"):
+                in_rules = True
+                if not value or not agents:
+                    continue
+                for agent in agents:
+                    # Groups naming the same agent are merged
+                    group = groups.get(agent)
+                    if group is None:
+                        group = groups[agent] = _Group()
+                    group.add(value if value.startswith(("/", "*")) else f"/{value}", key == "allow")
+        return cls(groups)
+
+    def allowed(self, path: str, user_agent: str = "*") -> bool:
+        if path == "/robots.txt":
+            return True
+        group = self._groups.get(user_agent.lower()) or self._groups.get("*") or _ALLOW_ALL
+        return group.allowed(path)
+
+
+# (rules, time after which they are refetched)
+_HostEntry = Tuple[RobotsRules, float]
 
-    async def _fetch(self, base: str) -> str:
-        robots_url = urljoin(base, "/robots.txt")
-        try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                resp = await client.get(robots_url)
-                if resp.status_code == 200:
-                    return resp.text
-        except Exception as exc:
-            logger.debug(f"robots fetch failed for {robots_url}: {exc}")
-        return ""
+
+class RobotsCache:
+    """Compiled robots.txt per host with a TTL.
+
+    Lookups take no lock: a fresh entry is a dict read and a trie walk. The
+    first lookup for a host waits on the fetch, shared by every concurrent
+    caller; after the TTL the stale rules keep answering while one
+    background fetch replaces them. A failed fetch keeps the rules it
+    would have replaced (allow-all for a host never fetched) and is retried
+    after ROBOTS_RETRY_SECONDS instead of being cached for good.
+    """
+
+    def __init__(self, pool: HttpPool = http_pool) -> None:
+        self._hosts: Dict[str, _HostEntry] = {}
+        self._fetches: Dict[str, "asyncio.Task[_HostEntry]"] = {}
+        self._client = pool.client(
+            timeout=5.0, follow_redirects=True, max_redirects=5, headers={"User-Agent": settings.USER_AGENT}
+        )
+        self.stats: Dict[str, int] = {"hosts": 0, "fetches": 0, "fetch_errors": 0, "blocked": 0}
 
     async def allowed(self, url: str, user_agent: str = "*") -> bool:
         parsed = urlparse(url)
         base = f"{parsed.scheme}://{parsed.netloc}"
-        async with self._lock:
-            if base not in self._cache:
-                self._cache[base] = await self._fetch(base)
-            robots_txt = self._cache[base]
-        # Very naive parser: disallow if any Disallow path is a prefix of the path
-        path = parsed.path or "/"
-        for line in robots_txt.splitlines():
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue
-            if line.lower().startswith("user-agent:"):
-                # ignore specific agent blocks for simplicity
-                continue
-            if line.lower().startswith("disallow:"):
-                dis = line.split(":", 1)[1].strip()
-                if dis and path.startswith(dis):
-                    return False
-        return True
\ No newline at end of file
+        entry = self._hosts.get(base)
+        if entry is None:
+            entry = await asyncio.shield(self._refresh(base))
+        elif entry[1] <= time.monotonic():
+            self._refresh(base)
+        path = _normalize(parsed.path or "/")
+        if parsed.query:
+            path = f"{path}?{_normalize(parsed.query)}"
+        allowed = entry[0].allowed(path, user_agent)
+        if not allowed:
+            self.stats["blocked"] += 1
+        return allowed
+
+    async def shutdown(self) -> None:
+        for task in list(self._fetches.values()):
+            task.cancel()
+        self._fetches.clear()
+
+    def _refresh(self, base: str) -> "asyncio.Task[_HostEntry]":
+        task = self._fetches.get(base)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(base))
+            self._fetches[base] = task
+            task.add_done_callback(lambda t, base=base: self._fetch_done(base, t))
+        return task
+
+    def _fetch_done(self, base: str, task: "asyncio.Task[_HostEntry]") -> None:
+        if self._fetches.get(base) is task:
+            del self._fetches[base]
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"robots refresh failed for {base}: {task.exception()!r}")
+
+    async def _fetch(self, base: str) -> _HostEntry:
+        robots_url = urljoin(base, "/robots.txt")
+        self.stats["fetches"] += 1
+        rules: Optional[RobotsRules] = None
+        try:
+            resp = await self._client.get(robots_url)
+            if resp.status_code == 200:
+                rules = RobotsRules.parse(resp.content[:_MAX_ROBOTS_BYTES].decode("utf-8", "replace"))
+            elif 400 <= resp.status_code < 500:
+                # No robots.txt (or not ours to read): everything is allowed
+                rules = RobotsRules()
+            else:
+                logger.debug(f"robots fetch for {robots_url} returned {resp.status_code}")
+        except Exception as exc:
+            logger.debug(f"robots fetch failed for {robots_url}: {exc}")
+        if rules is None:
+            self.stats["fetch_errors"] += 1
+            previous = self._hosts.get(base)
+            entry = (previous[0] if previous else RobotsRules(), time.monotonic() + settings.ROBOTS_RETRY_SECONDS)
+        else:
+            entry = (rules, time.monotonic() + settings.ROBOTS_TTL_SECONDS)
+        self._hosts[base] = entry
+        self.stats["hosts"] = len(self._hosts)
+        return entry
@@ -1,225 +1,399 @@
 from __future__ import annotations
-import re
-from typing import List, Optional
-from bs4 import BeautifulSoup
+import asyncio
+import hashlib
+import unicodedata
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+from urllib.parse import quote, quote_plus
+import httpx
+from cachetools import LRUCache, TTLCache
 from loguru import logger
+from pydantic import TypeAdapter
 from ..config import settings
-from ..models import TitleItem, HomeResponse, Section, Image, TitleDetails, Episode, StreamResponse, VideoStream
+from ..models import TitleItem, HomeResponse, Section, TitleDetails, StreamResponse, VideoStream, BatchResult, Episode
+from .catalog import Catalog
 from .http_client import AsyncHttpClient
-from ..utils.parse import text_or_none, parse_year, parse_float
+from .parse_pool import ParsePool
+from .stream_probe import StreamProber
+from .title_index import TitleIndex
+from ..utils.metrics import VALIDATE_SECONDS
+from ..utils.scheduler import INTERACTIVE, LISTING, PREFETCH
+from . import extract, extract_lxml
+
+T = TypeVar("T")
+
+# Both modules expose the same parse_* functions with identical output
+EXTRACT_ENGINES = {"bs4": extract, "lxml": extract_lxml}
+
+ParseKey = Tuple[str, str, bytes]
+_TITLE_ITEMS = TypeAdapter(List[TitleItem])
+StreamKey = Tuple[str, Optional[str]]
+# Stream candidates of one (slug, episode), most specific source first (see StreamProber.rank)
+StreamTiers = List[List[VideoStream]]
 
 
 class ActeiaScraper:
-    def __init__(self, http: AsyncHttpClient) -> None:
+    def __init__(
+        self,
+        http: AsyncHttpClient,
+        prerender: Optional[Callable[[Iterable[str]], None]] = None,
+        parser: Optional[ParsePool] = None,
+        engine: Optional[str] = None,
+        index: Optional[TitleIndex] = None,
+        catalog: Optional[Catalog] = None,
+        prober: Optional[StreamProber] = None,
+    ) -> None:
         self.http = http
+        # Called with the poster URLs of every freshly parsed page (see ImageProxy.prerender)
+        self._prerender = prerender
+        # HTML parsing runs here, off the event loop
+        self._parser = parser or ParsePool()
+        engine = engine or settings.EXTRACT_ENGINE
+        if engine not in EXTRACT_ENGINES:
+            raise ValueError(f"unknown extract engine: {engine}")
+        self._extract = EXTRACT_ENGINES[engine]
         self.base_url = str(settings.BASE_URL)
+        # Parsed results keyed by (kind, url, body digest): a hit skips HTML parsing
+        # and model validation entirely, and a changed upstream body never matches
+        self._parsed: LRUCache[ParseKey, Any] = LRUCache(maxsize=settings.PARSED_CACHE_MAXSIZE)
+        # Concurrent requests for the same page share one parse
+        self._parsing: Dict[ParseKey, "asyncio.Task[Any]"] = {}
+        # Every title seen in a parsed page, for local search and typeahead
+        self.index = index or TitleIndex()
+        # Crawled snapshot of home and title pages, answered before going upstream
+        self.catalog = catalog or Catalog()
+        # Search results keyed by normalized query, on their own TTL
+        self._searches: TTLCache[str, List[TitleItem]] = TTLCache(
+            maxsize=settings.SEARCH_CACHE_MAXSIZE, ttl=settings.SEARCH_CACHE_TTL_SECONDS
+        )
+        # Background upstream searches for queries answered from the index
+        self._search_refresh: Dict[str, "asyncio.Task[List[TitleItem]]"] = {}
+        # Stream URLs found by scanning episode pages; a scan that stops early
+        # leaves no body in the HTTP cache to parse again
+        self._episode_streams: TTLCache[str, str] = TTLCache(
+            maxsize=settings.PARSED_CACHE_MAXSIZE, ttl=settings.CACHE_TTL_SECONDS
+        )
+        # One scan per episode page, however many stream keys point at it
+        self._scans: Dict[str, "asyncio.Task[Optional[str]]"] = {}
+        # Stream candidates by (slug, episode), short-lived since stream URLs may
+        # carry expiring tokens; filled by requests and by episode prefetch
+        self._streams: TTLCache[StreamKey, StreamTiers] = TTLCache(
+            maxsize=settings.PARSED_CACHE_MAXSIZE, ttl=settings.STREAM_CACHE_TTL_SECONDS
+        )
+        self._resolving: Dict[StreamKey, "asyncio.Task[StreamTiers]"] = {}
+        # Checks candidates and orders them for the player on every resolution
+        self.prober = prober or StreamProber()
+        # Background resolution of the first episodes of every title served, in
+        # the scheduler's prefetch class so it never holds back a request
+        self._prefetch: Dict[StreamKey, "asyncio.Task[None]"] = {}
 
-    async def fetch_home(self) -> HomeResponse:
-        resp = await self.http.get(self.base_url)
-        resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, "lxml")
+    async def startup(self) -> None:
+        self._parser.startup()
+        await self.index.startup()
+        await self.reload_catalog()
 
-        featured: List[TitleItem] = self._extract_featured(soup)
-        sections: List[Section] = self._extract_sections(soup)
+    async def shutdown(self) -> None:
+        for task in [*self._search_refresh.values(), *self._prefetch.values(), *self._scans.values()]:
+            task.cancel()
+        self._parser.shutdown()
+        await self.index.shutdown()
+        await self.prober.shutdown()
+        self.catalog.close()
 
-        return HomeResponse(featured=featured, sections=sections)
+    async def reload_catalog(self) -> None:
+        """Pick up the newest catalog snapshot and index its titles."""
+        self.index.add_many(await self.catalog.reload())
 
-    async def fetch_sections(self) -> List[Section]:
-        resp = await self.http.get(self.base_url)
+    async def fetch_home(self) -> HomeResponse:
+        home = self.catalog.home()
+        if home is not None:
+            return home
+        resp = await self.http.get(self.base_url, priority=LISTING)
         resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, "lxml")
-        return self._extract_sections(soup)
+        return await self._cached_parse("home", resp, HomeResponse.model_validate, self._extract.parse_home)
+
+    async def fetch_sections(self) -> List[Section]:
+        # Same page and same parse as the home endpoint
+        return (await self.fetch_home()).sections
 
     async def search(self, query: str) -> List[TitleItem]:
-        # Try common WordPress query param ?s= or /search/
+        key = normalize_query(query)
+        if not key:
+            return []
+        if settings.SEARCH_LOCAL_FIRST:
+            local = self.index.search(key, settings.SEARCH_LOCAL_LIMIT)
+            if local:
+                # Still ask upstream now and then, so titles the index has not
+                # seen yet show up on the next search
+                if key not in self._searches:
+                    self._refresh_search(key)
+                return local
+        cached = self._searches.get(key)
+        if cached is not None:
+            logger.debug(f"Search cache hit for {key!r}")
+            return cached
+        return await self._search_upstream(key)
+
+    def typeahead(self, prefix: str, limit: int) -> List[TitleItem]:
+        """Titles from the local index only; never goes upstream."""
+        return self.index.search(prefix, limit)
+
+    def _refresh_search(self, key: str) -> None:
+        if key in self._search_refresh:
+            return
+        task = asyncio.ensure_future(self._search_upstream(key, PREFETCH))
+        self._search_refresh[key] = task
+        task.add_done_callback(lambda t, key=key: self._search_refresh_done(key, t))
+
+    def _search_refresh_done(self, key: str, task: "asyncio.Task[List[TitleItem]]") -> None:
+        if self._search_refresh.get(key) is task:
+            del self._search_refresh[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"Background search failed for {key!r}: {task.exception()!r}")
+
+    async def _search_upstream(self, key: str, priority: str = LISTING) -> List[TitleItem]:
+        # Try common WordPress query param ?s= and /search/ at the same time;
+        # the first non-empty answer wins and the other request is cancelled
         search_urls = [
-            f"{self.base_url}?s={query}",
-            f"{self.base_url.rstrip('/')}/search/{query}",
+            f"{self.base_url}?s={quote_plus(key)}",
+            f"{self.base_url.rstrip('/')}/search/{quote(key, safe='')}",
         ]
+        attempts = [asyncio.ensure_future(self._search_attempt(url, priority)) for url in search_urls]
         items: List[TitleItem] = []
-        for url in search_urls:
-            try:
-                resp = await self.http.get(url)
-                if resp.status_code != 200:
+        answered = 0
+        try:
+            for attempt in asyncio.as_completed(attempts):
+                result = await attempt
+                if result is None:
                     continue
-                soup = BeautifulSoup(resp.text, "lxml")
-                items = self._extract_grid_items(soup)
-                if items:
+                answered += 1
+                if result:
+                    items = result
                     break
-            except Exception as exc:
-                logger.warning(f"search attempt failed for {url}: {exc}")
+        finally:
+            for task in attempts:
+                task.cancel()
+        # Don't remember "no results" when an attempt failed rather than came back empty
+        if items or answered == len(attempts):
+            self._searches[key] = items
         return items
 
+    async def _search_attempt(self, url: str, priority: str) -> Optional[List[TitleItem]]:
+        try:
+            resp = await self.http.get(url, priority=priority)
+            if resp.status_code != 200:
+                return None
+            return await self._cached_parse("search", resp, _title_items, self._extract.parse_search)
+        except Exception as exc:
+            logger.warning(f"search attempt failed for {url}: {exc}")
+            return None
+
     async def fetch_title(self, slug: str) -> TitleDetails:
-        url = self.http.absolute(self.base_url, slug)
-        resp = await self.http.get(url)
-        resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, "lxml")
+        details = self.catalog.title(slug)
+        if details is None:
+            url = self.http.absolute(self.base_url, slug)
+            resp = await self.http.get(url)
+            resp.raise_for_status()
+            details = await self._cached_parse(
+                f"title:{slug}", resp, TitleDetails.model_validate, self._extract.parse_title, slug
+            )
+        self._prefetch_streams(slug, details.episodes[: settings.PREFETCH_EPISODES])
+        return details
+
+    async def resolve_stream(self, slug: str, episode_id: Optional[str] = None) -> StreamResponse:
+        """Streams of a title or episode, live ones first by bitrate (see StreamProber.rank)."""
+        key = (slug, episode_id or None)
+        tiers = self._streams.get(key)
+        if tiers is None:
+            tiers = await self._candidates(key)
+        return StreamResponse(item_id=slug, streams=await self.prober.rank(tiers))
 
-        title_el = soup.select_one("h1, h2.entry-title, .title, .post-title")
-        title = text_or_none(title_el) or slug
-        synopsis = text_or_none(soup.select_one(".synopsis, .description, .entry-content p"))
-        poster_url = self._first_url([
-            img.get("src") for img in soup.select(".poster img, .thumb img, .entry-content img, img")
-        ])
-        poster_abs = self._abs(poster_url) if poster_url else None
-        poster = Image(url=poster_abs) if poster_abs else None
-        year = parse_year(soup.get_text(" "))
-        rating = parse_float(soup.get_text(" "))
-        item = TitleItem(id=slug, slug=slug, title=title, year=year, poster=poster, rating=rating)
+    async def _candidates(self, key: StreamKey) -> StreamTiers:
+        # Not joined with a prefetch of the same episode: resolving here shares its
+        # fetches anyway (page cache, parse and scan single-flights) and raises
+        # whatever it still has queued to interactive priority
+        task = self._resolving.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._resolve_stream(*key, INTERACTIVE))
+            self._resolving[key] = task
+            task.add_done_callback(lambda t, key=key: self._resolve_done(key, t))
+        return await asyncio.shield(task)
 
-        episodes = self._extract_episodes(soup)
-        genres = [a.get_text(strip=True) for a in soup.select(".genres a, .tags a, a[rel='tag']") if a.get_text(strip=True)]
+    def _resolve_done(self, key: StreamKey, task: "asyncio.Task[StreamTiers]") -> None:
+        if self._resolving.get(key) is task:
+            del self._resolving[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"Stream resolution failed for {key}: {task.exception()!r}")
 
-        return TitleDetails(item=item, synopsis=synopsis, genres=genres, episodes=episodes)
+    def _prefetch_streams(self, slug: str, episodes: List[Episode]) -> None:
+        for ep in episodes:
+            key = (slug, ep.id)
+            if key in self._streams or key in self._resolving or key in self._prefetch:
+                continue
+            task = asyncio.ensure_future(self._prefetch_stream(key))
+            self._prefetch[key] = task
+            task.add_done_callback(lambda t, key=key: self._prefetch_done(key, t))
 
-    async def resolve_stream(self, slug: str, episode_id: Optional[str] = None) -> StreamResponse:
+    async def _prefetch_stream(self, key: StreamKey) -> None:
+        try:
+            # Probing too means playback starts on a checked stream without waiting for it
+            await self.prober.rank(await self._resolve_stream(*key, PREFETCH))
+        except Exception as exc:
+            logger.debug(f"Stream prefetch failed for {key}: {exc!r}")
+
+    def _prefetch_done(self, key: StreamKey, task: "asyncio.Task[None]") -> None:
+        if self._prefetch.get(key) is task:
+            del self._prefetch[key]
+
+    async def _resolve_stream(self, slug: str, episode_id: Optional[str], priority: str) -> StreamTiers:
         url = self.http.absolute(self.base_url, slug)
-        resp = await self.http.get(url)
+        resp = await self.http.get(url, priority=priority)
         resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, "lxml")
-
-        streams: List[VideoStream] = []
-
-        # Common patterns: <source src="...m3u8">, data attributes, or embeds
-        for source in soup.select("video source[src], source[src]"):
-            src = source.get("src")
-            if src and (".m3u8" in src or ".mp4" in src):
-                streams.append(VideoStream(url=self._abs(src), mime_type=source.get("type")))
-
-        # Look for m3u8 in scripts
-        if not streams:
-            m = re.search(r"https?://[^'\"]+\.(?:m3u8|mp4)", soup.get_text(" "))
-            if m:
-                streams.append(VideoStream(url=self._abs(m.group(0))))
-
-        # If episode-specific pages exist, attempt to follow links
-        if episode_id:
-            ep_link = soup.select_one(f"a[href*='{episode_id}']")
-            if ep_link:
-                ep_url = self._abs(ep_link.get("href"))
-                ep_resp = await self.http.get(ep_url)
-                if ep_resp.status_code == 200:
-                    ep_soup = BeautifulSoup(ep_resp.text, "lxml")
-                    m = re.search(r"https?://[^'\"]+\.(?:m3u8|mp4)", ep_soup.get_text(" "))
-                    if m:
-                        streams = [VideoStream(url=self._abs(m.group(0)))]
-
-        return StreamResponse(item_id=slug, streams=streams)
+        result, ep_url = await self._cached_parse(
+            f"stream:{slug}:{episode_id or ''}",
+            resp,
+            lambda raw: (StreamResponse(item_id=slug, streams=raw["streams"]), raw["ep_url"]),
+            self._extract.parse_stream_page,
+            episode_id,
+        )
 
-    # ----------------------------
-    # Internal helpers
-    # ----------------------------
+        tiers = [result.streams]
+        # The episode page, when there is one, names this episode's stream; the
+        # title page's candidates stay behind it as fallbacks
+        if ep_url:
+            stream_url = await self._episode_stream(ep_url, priority)
+            if stream_url:
+                tiers.insert(0, [VideoStream(url=stream_url)])
 
-    def _extract_featured(self, soup: BeautifulSoup) -> List[TitleItem]:
-        featured: List[TitleItem] = []
-        for a in soup.select(".featured a[href], .slider a[href], .carousel a[href], a.featured")[:60]:
-        for a in soup.select(".featured a[href], .slider a[href], .carousel a[href], a.featured"):
-            href = a.get("href")
-            if not href:
-                continue
-            title = (a.get("title") or text_or_none(a)).strip() if (a.get("title") or text_or_none(a)) else href
-            img = a.select_one("img")
-            poster_url = self._first_url([img.get("data-src") if img else None, img.get("src") if img else None])
-            item = TitleItem(id=self._slug(href), slug=self._slug(href), title=title)
-            if poster_url:
-                item.poster = Image(url=self._abs(poster_url))
-            featured.append(item)
-        # Deduplicate by slug
-        uniq = {}
-        for it in featured:
-            if it.slug not in uniq:
-                uniq[it.slug] = it
-            uniq[it.slug] = it
-        return list(uniq.values())[:20]
-
-    def _extract_sections(self, soup: BeautifulSoup) -> List[Section]:
-        sections: List[Section] = []
-        # Try containers with headings and grids
-        containers = soup.select("section, .section, .block, .home-section, .module")[:20]
-        containers = soup.select("section, .section, .block, .home-section, .module")
-        for cont in containers:
-            heading = text_or_none(cont.select_one("h2, h3, .section-title, .widget-title"))
-            if not heading:
-                continue
-            items = self._extract_grid_items(cont)
-            if items:
-                sections.append(Section(id=self._slug(heading), title=heading, items=items[:30]))
-        # Fallback: top-level grids
-        if not sections:
-            items = self._extract_grid_items(soup)
-            if items:
-                sections.append(Section(id="all", title="Conteúdo", items=items[:60]))
-        return sections
-
-    def _extract_grid_items(self, root: BeautifulSoup) -> List[TitleItem]:
-        items: List[TitleItem] = []
-        for a in root.select("a[href][title], .item a[href], .poster a[href], .thumb a[href], a.poster, a.item")[:300]:
-        for a in root.select("a[href][title], .item a[href], .poster a[href], .thumb a[href], a.poster, a.item"):
-            href = a.get("href")
-            if not href:
-                continue
-            title = a.get("title") or text_or_none(a) or href
-            img = a.select_one("img")
-            poster_url = self._first_url([
-                img.get("data-src") if img else None,
-                img.get("srcset") if img else None,
-                img.get("src") if img else None,
-            ])
-            item = TitleItem(id=self._slug(href), slug=self._slug(href), title=title)
-            if poster_url:
-                item.poster = Image(url=self._abs(self._pick_from_srcset(poster_url)))
-            items.append(item)
-        # Deduplicate by slug
-        uniq = {}
-        for it in items:
-            if it.slug not in uniq:
-                uniq[it.slug] = it
-            uniq[it.slug] = it
-        return list(uniq.values())
-
-    def _extract_episodes(self, soup: BeautifulSoup) -> List[Episode]:
-        episodes: List[Episode] = []
-        # Try common lists
-        for li in soup.select(".episodes li, .episode-list li, ul.episodes li, .ep_list li, a.episode"):
-            a = li.select_one("a") if li.name == "li" else li
-            if not a:
-                continue
-            title = text_or_none(a) or a.get("title") or "Episódio"
-            href = a.get("href") or ""
-            num = None
-            m = re.search(r"(?:Epis[oó]dio|Ep)\s*(\d+)", title, flags=re.I)
-            if m:
+        if any(tiers):
+            self._streams[(slug, episode_id)] = tiers
+        return tiers
+
+    async def _episode_stream(self, ep_url: str, priority: str) -> Optional[str]:
+        """First stream URL on an episode page, read only up to that URL."""
+        stream_url = self._episode_streams.get(ep_url)
+        if stream_url is not None:
+            return stream_url
+        task = self._scans.get(ep_url)
+        if task is None:
+            task = asyncio.ensure_future(self._scan_episode(ep_url, priority))
+            self._scans[ep_url] = task
+            task.add_done_callback(lambda t, url=ep_url: self._scan_done(url, t))
+        else:
+            self.http.promote(ep_url, priority)
+        return await asyncio.shield(task)
+
+    async def _scan_episode(self, ep_url: str, priority: str) -> Optional[str]:
+        stream_url = await self.http.scan(ep_url, extract.StreamUrlScanner().feed, priority=priority)
+        if stream_url:
+            self._episode_streams[ep_url] = stream_url
+        return stream_url
+
+    def _scan_done(self, ep_url: str, task: "asyncio.Task[Optional[str]]") -> None:
+        if self._scans.get(ep_url) is task:
+            del self._scans[ep_url]
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"Episode scan failed for {ep_url}: {task.exception()!r}")
+
+    async def resolve_batch(
+        self, titles: Iterable[str], streams: Iterable[Tuple[str, Optional[str]]]
+    ) -> AsyncIterator[BatchResult]:
+        """Title details and streams resolved concurrently, yielded as each one finishes.
+
+        Repeated entries are resolved once. Entries sharing an upstream page (a
+        title and its streams, several episodes of a series) share its fetch
+        and parse through the HTTP client and parse cache single-flights.
+        """
+        jobs: Dict[Tuple[str, str, Optional[str]], None] = {}
+        for slug in titles:
+            jobs[("title", slug, None)] = None
+        for slug, episode in streams:
+            jobs[("stream", slug, episode or None)] = None
+        sem = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+
+        async def run(kind: str, slug: str, episode: Optional[str]) -> BatchResult:
+            async with sem:
                 try:
-                    num = int(m.group(1))
+                    if kind == "title":
+                        data: Any = await self.fetch_title(slug)
+                    else:
+                        data = await self.resolve_stream(slug, episode)
+                except httpx.HTTPStatusError as exc:
+                    status = exc.response.status_code
+                    return BatchResult(kind=kind, slug=slug, episode=episode, status=status, error=f"upstream returned {status}")
+                except httpx.HTTPError as exc:
+                    logger.warning(f"batch {kind} {slug} failed: {exc!r}")
+                    return BatchResult(kind=kind, slug=slug, episode=episode, status=502, error="upstream unreachable")
                 except Exception:
-                    pass
-            episodes.append(Episode(id=self._slug(href) or title, title=title, number=num))
-        return episodes
+                    # One broken page must not take the rest of the batch down
+                    logger.exception(f"batch {kind} {slug} failed")
+                    return BatchResult(kind=kind, slug=slug, episode=episode, status=500, error="internal error")
+            return BatchResult(kind=kind, slug=slug, episode=episode, data=data)
 
-    def _slug(self, href: str) -> str:
+        tasks = [asyncio.ensure_future(run(*job)) for job in jobs]
         try:
-            slug = re.sub(r"https?://[^/]+", "", href)
-            slug = slug.strip("/")
-            return slug or "root"
-        except Exception:
-            return href
-
-    def _abs(self, url: Optional[str]) -> str:
-        if not url:
-            return ""
-        if url.startswith("http"):
-            return url
-        return self.http.absolute(self.base_url, url)
-
-    def _first_url(self, urls: List[Optional[str]]) -> Optional[str]:
-        for u in urls:
-            if u and isinstance(u, str):
-                return u
-        return None
-
-    def _pick_from_srcset(self, src: str) -> str:
-        # Pick first URL from srcset or return src itself
-        if "," in src:
-            return src.split(",")[0].split()[0]
-        return src
\ No newline at end of file
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Client gone mid-stream: drop whatever has not started yet
+            for task in tasks:
+                task.cancel()
+
+    # ----------------------------
+    # Parsing (results are cached by _cached_parse)
+    # ----------------------------
+
+    async def _cached_parse(
+        self, kind: str, resp: httpx.Response, build: Callable[[Any], T], fn: Callable[..., Any], *args: Any
+    ) -> T:
+        """Run extractor fn on the response in the parse pool and build models from its output."""
+        key = (kind, str(resp.url), hashlib.blake2b(resp.content, digest_size=16).digest())
+        if key in self._parsed:
+            logger.debug(f"Parsed cache hit for {kind} {resp.url}")
+            return self._parsed[key]
+        task = self._parsing.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._parse(key, resp.text, build, fn, args))
+            self._parsing[key] = task
+            task.add_done_callback(lambda t, key=key: self._parse_done(key, t))
+        return await asyncio.shield(task)
+
+    async def _parse(
+        self, key: ParseKey, html: str, build: Callable[[Any], T], fn: Callable[..., Any], args: Tuple[Any, ...]
+    ) -> T:
+        raw = await self._parser.run(fn, html, self.base_url, *args)
+        with VALIDATE_SECONDS.time(kind=key[0]):
+            result = build(raw)
+        self._parsed[key] = result
+        items = self._title_items_in(result)
+        self.index.add_many(items)
+        if self._prerender is not None:
+            posters = [str(it.poster.url) for it in items if it.poster is not None]
+            if posters:
+                self._prerender(posters)
+        return result
+
+    def _parse_done(self, key: ParseKey, task: "asyncio.Task[Any]") -> None:
+        if self._parsing.get(key) is task:
+            del self._parsing[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"Parse failed for {key[0]} {key[1]}: {task.exception()!r}")
+
+    @staticmethod
+    def _title_items_in(result: Any) -> List[TitleItem]:
+        if isinstance(result, HomeResponse):
+            return result.featured + [it for sec in result.sections for it in sec.items]
+        if isinstance(result, TitleDetails):
+            return [result.item]
+        if isinstance(result, list):
+            return [it for it in result if isinstance(it, TitleItem)]
+        return []
+
+
+def normalize_query(query: str) -> str:
+    """Casefolded, NFC, single-spaced form of a search query (the cache key)."""
+    return " ".join(unicodedata.normalize("NFC", query).casefold().split())
+
+
+def _title_items(raw: List[Dict[str, Any]]) -> List[TitleItem]:
+    # One validator call for the whole list instead of one per item
+    return _TITLE_ITEMS.validate_python(raw)
@@ -0,0 +1,215 @@
+from __future__ import annotations
+import asyncio
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlparse
+import httpx
+from cachetools import TTLCache
+from loguru import logger
+from ..config import settings
+from ..models import VideoStream
+from ..utils.http_pool import HttpPool, http_pool
+from ..utils.metrics import UPSTREAM_SECONDS
+from ..utils.rate_limit import charge
+from ..utils.security import is_public_http_url
+
+HLS_MIME_TYPE = "application/x-mpegURL"
+# A master playlist with dozens of variants is still a few KiB
+_MAX_PLAYLIST_BYTES = 256 * 1024
+_STREAM_INF = "#EXT-X-STREAM-INF:"
+_ATTR_RE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+# Resolution hints in file names such as duna-2-1080p.mp4
+_HEIGHT_HINT_RE = re.compile(r"(?<![0-9])(2160|1440|1080|720|540|480|360|240)p?(?![0-9])")
+
+
+class Probe(NamedTuple):
+    alive: bool
+    # Peak bits per second of the best variant, 0 when unknown
+    bandwidth: int = 0
+    height: int = 0
+    mime_type: Optional[str] = None
+
+    @property
+    def quality(self) -> Optional[str]:
+        return f"{self.height}p" if self.height else None
+
+
+_DEAD = Probe(False)
+
+
+def parse_playlist(text: str) -> Optional[Probe]:
+    """Probe of an HLS playlist body: best variant of a master playlist, bare liveness for a media playlist.
+
+    None when the body is not a playlist at all (an error page served with 200).
+    """
+    if not text.lstrip("\ufeff").startswith("#EXTM3U"):
+        return None
+    bandwidth = height = 0
+    for line in text.splitlines():
+        if not line.startswith(_STREAM_INF):
+            continue
+        attrs = dict(_ATTR_RE.findall(line[len(_STREAM_INF):]))
+        if attrs.get("BANDWIDTH", "").isdigit():
+            bandwidth = max(bandwidth, int(attrs["BANDWIDTH"]))
+        _, _, h = attrs.get("RESOLUTION", "").partition("x")
+        if h.isdigit():
+            height = max(height, int(h))
+    return Probe(True, bandwidth, height, HLS_MIME_TYPE)
+
+
+def _height_hint(url: str) -> int:
+    m = _HEIGHT_HINT_RE.search(urlparse(url).path.rsplit("/", 1)[-1])
+    return int(m.group(1)) if m else 0
+
+
+class StreamProber:
+    """Checks stream candidates before they reach the player, and ranks them.
+
+    Every candidate is probed at once with a short request: the playlist
+    itself for HLS (a master playlist gives the peak bandwidth and
+    resolution of its best variant), the first byte for anything else.
+    rank() waits at most `budget` seconds; probes still running then are
+    ranked as unknown and finish in the background, so their results are
+    there for the next caller. Results are kept for `ttl` seconds, dead
+    ones included. Probes go to the media hosts, not the site, so they do
+    not take upstream scheduler slots.
+    """
+
+    def __init__(
+        self,
+        pool: HttpPool = http_pool,
+        enabled: bool = settings.STREAM_PROBE_ENABLED,
+        budget: float = settings.STREAM_PROBE_BUDGET_MS / 1000,
+        ttl: float = settings.STREAM_PROBE_TTL_SECONDS,
+        max_candidates: int = settings.STREAM_PROBE_MAX_CANDIDATES,
+    ) -> None:
+        self.enabled = enabled
+        self.budget = budget
+        self.max_candidates = max_candidates
+        self._client = pool.client(
+            timeout=settings.STREAM_PROBE_TIMEOUT_SECONDS,
+            follow_redirects=True,
+            headers={"User-Agent": settings.USER_AGENT},
+        )
+        self._results: TTLCache[str, Probe] = TTLCache(maxsize=settings.PARSED_CACHE_MAXSIZE * 4, ttl=ttl)
+        self._probing: Dict[str, "asyncio.Task[Probe]"] = {}
+        self.stats: Dict[str, int] = {"probes": 0, "alive": 0, "dead": 0, "hits": 0, "late": 0, "skipped": 0}
+
+    async def shutdown(self) -> None:
+        for task in list(self._probing.values()):
+            task.cancel()
+        self._probing.clear()
+
+    async def rank(self, tiers: List[List[VideoStream]]) -> List[VideoStream]:
+        """Candidates best first, quality and mime_type filled in from their probes.
+
+        tiers go from the most specific source (the episode page) to the
+        least; a tier's live streams come before its unknown ones, each by
+        bitrate, and before the next tier. Dead streams are left out unless
+        nothing else is left.
+        """
+        candidates: List[Tuple[int, VideoStream]] = [
+            (tier, stream) for tier, streams in enumerate(tiers) for stream in streams
+        ][: max(1, self.max_candidates)]
+        if not self.enabled:
+            return [stream for _, stream in candidates]
+        probes = await self._probe_all([stream for _, stream in candidates])
+
+        # (tier, liveness: 0 live, 1 unknown, 2 dead, -bandwidth, -height, position)
+        keyed: List[Tuple[Tuple[int, int, int, int, int], VideoStream]] = []
+        for i, (tier, stream) in enumerate(candidates):
+            probe = probes.get(str(stream.url))
+            if probe is None:
+                keyed.append(((tier, 1, 0, 0, i), stream))
+            else:
+                keyed.append(((tier, 0 if probe.alive else 2, -probe.bandwidth, -probe.height, i), stream))
+        keyed.sort(key=lambda entry: entry[0])
+        ranked = [(key[1] < 2, self._described(stream, probes.get(str(stream.url)))) for key, stream in keyed]
+        usable = [stream for live, stream in ranked if live]
+        return usable or [stream for _, stream in ranked]
+
+    async def _probe_all(self, streams: List[VideoStream]) -> Dict[str, Probe]:
+        probes: Dict[str, Probe] = {}
+        pending: Dict[str, "asyncio.Task[Probe]"] = {}
+        for stream in streams:
+            url = str(stream.url)
+            if url in probes or url in pending:
+                continue
+            hit = self._results.get(url)
+            if hit is not None:
+                self.stats["hits"] += 1
+                probes[url] = hit
+            elif is_public_http_url(url):
+                pending[url] = self._start(url, stream.headers or {})
+            else:
+                self.stats["skipped"] += 1
+        if pending:
+            done, late = await asyncio.wait(set(pending.values()), timeout=self.budget)
+            self.stats["late"] += len(late)
+            for url, task in pending.items():
+                if task in done and not task.cancelled() and task.exception() is None:
+                    probes[url] = task.result()
+        return probes
+
+    def _start(self, url: str, headers: Dict[str, str]) -> "asyncio.Task[Probe]":
+        task = self._probing.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self._probe(url, headers))
+            self._probing[url] = task
+            task.add_done_callback(lambda t, url=url: self._probe_done(url, t))
+        return task
+
+    def _probe_done(self, url: str, task: "asyncio.Task[Probe]") -> None:
+        if self._probing.get(url) is task:
+            del self._probing[url]
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"Stream probe failed for {url}: {task.exception()!r}")
+
+    async def _probe(self, url: str, headers: Dict[str, str]) -> Probe:
+        hls = urlparse(url).path.endswith(".m3u8")
+        # A playlist is read whole (up to the cap); for media the status and headers are enough
+        wanted = _MAX_PLAYLIST_BYTES if hls else 1
+        self.stats["probes"] += 1
+        charge(settings.RATE_LIMIT_PROBE_COST)
+        try:
+            with UPSTREAM_SECONDS.time(source="probe"):
+                async with self._client.stream("GET", url, headers={**headers, "Range": f"bytes=0-{wanted - 1}"}) as resp:
+                    probe = await self._read(url, resp, hls)
+        except httpx.HTTPError as exc:
+            logger.debug(f"Stream probe of {url} failed: {exc!r}")
+            probe = _DEAD
+        self.stats["alive" if probe.alive else "dead"] += 1
+        self._results[url] = probe
+        return probe
+
+    @staticmethod
+    async def _read(url: str, resp: httpx.Response, hls: bool) -> Probe:
+        if resp.status_code not in (200, 206):
+            logger.debug(f"Stream probe of {url} returned {resp.status_code}")
+            return _DEAD
+        content_type = resp.headers.get("content-type", "").split(";")[0].strip().lower()
+        if hls or "mpegurl" in content_type:
+            chunks: List[bytes] = []
+            size = 0
+            async for chunk in resp.aiter_bytes():
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= _MAX_PLAYLIST_BYTES:
+                    break
+            probe = parse_playlist(b"".join(chunks).decode("utf-8", "replace"))
+            return probe if probe is not None else _DEAD
+        # Leaving the stream context with the body unread drops the connection
+        if content_type.startswith(("text/", "application/json")):
+            return _DEAD
+        return Probe(True, 0, _height_hint(url), content_type if content_type.startswith("video/") else None)
+
+    @staticmethod
+    def _described(stream: VideoStream, probe: Optional[Probe]) -> VideoStream:
+        if probe is None:
+            # Not probed (in time): the file name may still tell
+            probe = Probe(False, height=_height_hint(str(stream.url)))
+        quality = stream.quality or probe.quality
+        mime_type = stream.mime_type or probe.mime_type
+        if quality == stream.quality and mime_type == stream.mime_type:
+            return stream
+        return stream.model_copy(update={"quality": quality, "mime_type": mime_type})
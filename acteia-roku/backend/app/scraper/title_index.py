@@ -0,0 +1,290 @@
+from __future__ import annotations
+import asyncio
+import os
+import re
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import orjson
+from loguru import logger
+from ..config import settings
+from ..models import TitleItem
+
+_TOKEN_RE = re.compile(r"\w+")
+# Prefixes up to this length get dedicated slug sets; longer ones span few tokens
+_SHORT_PREFIX = 2
+
+# slug -> (title, folded title, year, type, poster url, rating)
+Entry = Tuple[str, str, Optional[int], Optional[str], Optional[str], Optional[float]]
+
+
+def fold(text: str) -> str:
+    """Accent-folded, casefolded tokens of text joined by single spaces."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(_TOKEN_RE.findall(stripped.casefold()))
+
+
+def _short_prefixes(tokens: Iterable[str]) -> Set[str]:
+    return {t[:n] for t in tokens for n in range(1, _SHORT_PREFIX + 1) if len(t) >= n}
+
+
+class TitleIndex:
+    """In-process inverted index over every title seen in parsed pages.
+
+    Titles are folded into tokens (see fold). Each token maps to the slugs
+    whose title contains it twice over: a list sorted shortest title first,
+    which lets a query stop after the best few matches however common its
+    words are, and a set for C-speed membership filtering. Prefixes of up to
+    _SHORT_PREFIX characters get their own sets, longer ones go through the
+    sorted vocabulary. A query matches when all its tokens but the last
+    appear in the title and the last one prefixes a title token, which
+    serves both search and typeahead.
+
+    Everything runs on the event loop; the optional snapshot file is
+    written from a thread.
+    """
+
+    def __init__(self, path: Optional[str] = settings.TITLE_INDEX_PATH, maxsize: int = settings.TITLE_INDEX_MAXSIZE) -> None:
+        self.path = path
+        self.maxsize = maxsize
+        # Insertion ordered: the first entry is the least recently seen one
+        self._entries: Dict[str, Entry] = {}
+        self._postings: Dict[str, List[str]] = {}
+        self._sets: Dict[str, Set[str]] = {}
+        self._short: Dict[str, Set[str]] = {}
+        self._vocab: List[str] = []
+        self._dirty = False
+        self._saver: Optional["asyncio.Task[None]"] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {"titles": len(self._entries), "tokens": len(self._vocab)}
+
+    async def startup(self) -> None:
+        if not self.path:
+            return
+        if os.path.exists(self.path):
+            started = time.perf_counter()
+            try:
+                # Nothing else touches the index before startup returns
+                await asyncio.to_thread(self._load, self.path)
+                logger.info(f"TitleIndex loaded {len(self)} titles in {time.perf_counter() - started:.2f}s")
+            except (OSError, ValueError) as exc:
+                logger.warning(f"TitleIndex snapshot unreadable, starting empty: {exc}")
+        if settings.TITLE_INDEX_SAVE_SECONDS > 0:
+            self._saver = asyncio.create_task(self._save_loop())
+
+    async def shutdown(self) -> None:
+        if self._saver is not None:
+            self._saver.cancel()
+            self._saver = None
+        await self.save()
+
+    # ----------------------------
+    # Updates
+    # ----------------------------
+
+    def add(self, item: TitleItem) -> None:
+        title = item.title.strip()
+        if not title or title == item.slug or title.startswith(("http://", "https://", "/")):
+            # Extractor fallback (no label on the page): keep whatever we knew
+            return
+        old = self._entries.get(item.slug)
+        folded = old[1] if old is not None and old[0] == title else fold(title)
+        relink = old is None or old[1] != folded
+        if old is not None and relink:
+            # Posting lists are ordered by the folded title, so unlink before it changes
+            self._unlink(item.slug)
+        # Re-insert so the entry moves to the most recently seen end
+        self._entries.pop(item.slug, None)
+        poster = str(item.poster.url) if item.poster is not None else None
+        self._entries[item.slug] = (
+            title,
+            folded,
+            item.year if item.year is not None else (old[2] if old else None),
+            item.type or (old[3] if old else None),
+            poster or (old[4] if old else None),
+            item.rating if item.rating is not None else (old[5] if old else None),
+        )
+        if relink:
+            self._link(item.slug)
+        self._dirty = True
+        while len(self._entries) > self.maxsize:
+            oldest = next(iter(self._entries))
+            self._unlink(oldest)
+            del self._entries[oldest]
+
+    def add_many(self, items: Iterable[TitleItem]) -> None:
+        for item in items:
+            self.add(item)
+
+    def _rank_key(self, slug: str) -> Tuple[int, str]:
+        folded = self._entries[slug][1]
+        return len(folded), folded
+
+    def _link(self, slug: str) -> None:
+        tokens = set(self._entries[slug][1].split())
+        for token in tokens:
+            slugs = self._postings.get(token)
+            if slugs is None:
+                self._postings[token] = [slug]
+                self._sets[token] = {slug}
+                insort(self._vocab, token)
+            else:
+                insort(slugs, slug, key=self._rank_key)
+                self._sets[token].add(slug)
+        for short in _short_prefixes(tokens):
+            self._short.setdefault(short, set()).add(slug)
+
+    def _unlink(self, slug: str) -> None:
+        key = self._rank_key(slug)
+        tokens = set(key[1].split())
+        for token in tokens:
+            slugs = self._postings.get(token)
+            if slugs is None:
+                continue
+            i = bisect_left(slugs, key, key=self._rank_key)
+            while i < len(slugs) and slugs[i] != slug:
+                i += 1
+            if i < len(slugs):
+                del slugs[i]
+            self._sets[token].discard(slug)
+            if not slugs:
+                del self._postings[token]
+                del self._sets[token]
+                del self._vocab[bisect_left(self._vocab, token)]
+        for short in _short_prefixes(tokens):
+            bucket = self._short.get(short)
+            if bucket is not None:
+                bucket.discard(slug)
+                if not bucket:
+                    del self._short[short]
+
+    # ----------------------------
+    # Queries
+    # ----------------------------
+
+    def search(self, query: str, limit: int = 20) -> List[TitleItem]:
+        folded = fold(query)
+        tokens = folded.split()
+        if not tokens or limit <= 0:
+            return []
+        *exact, prefix = tokens
+        lo = bisect_left(self._vocab, prefix)
+        hi = bisect_left(self._vocab, prefix + "\U0010ffff", lo)
+        if lo == hi or any(t not in self._postings for t in exact):
+            return []
+        prefix_tokens = self._vocab[lo:hi]
+
+        # Ranking below only reorders the head of the shortest-first candidate
+        # stream, so it never looks at more than `want` titles
+        want = max(limit * 4, 32)
+        if not exact:
+            candidates: List[str] = []
+            seen: Set[str] = set()
+            for token in prefix_tokens:
+                for slug in islice(self._postings[token], want):
+                    if slug not in seen:
+                        seen.add(slug)
+                        candidates.append(slug)
+                if len(candidates) >= want:
+                    break
+        else:
+            candidates = list(islice(self._matches(exact, prefix, prefix_tokens), want))
+
+        def rank(slug: str) -> Tuple[int, int, str]:
+            name = self._entries[slug][1]
+            return (0 if name == folded else 1 if name.startswith(folded) else 2, len(name), name)
+
+        return [self._item(slug) for slug in sorted(candidates, key=rank)[:limit]]
+
+    def _matches(self, exact: List[str], prefix: str, prefix_tokens: List[str]) -> Iterator[str]:
+        """Slugs matching every exact token and the prefix, shortest title first."""
+        exact = sorted(set(exact), key=lambda t: len(self._sets[t]))
+        driver: Iterable[str] = self._postings[exact[0]]
+        filters = [self._sets[t] for t in exact[1:]]
+        check_prefix: Optional[str] = None
+        if len(prefix_tokens) == 1:
+            token = prefix_tokens[0]
+            if len(self._sets[token]) < len(self._sets[exact[0]]):
+                driver, filters = self._postings[token], [self._sets[t] for t in exact]
+            elif token not in exact:
+                filters.append(self._sets[token])
+        elif len(prefix) <= _SHORT_PREFIX:
+            filters.append(self._short[prefix])
+        elif sum(len(self._sets[t]) for t in prefix_tokens) <= 4 * len(self._sets[exact[0]]):
+            filters.append(set().union(*(self._sets[t] for t in prefix_tokens)))
+        else:
+            # The union would cost more than testing the driver's titles directly
+            check_prefix = f" {prefix}"
+
+        stream: Iterable[str] = driver
+        for allowed in filters:
+            # filter() with a set's __contains__ never leaves C
+            stream = filter(allowed.__contains__, stream)
+        if check_prefix is not None:
+            stream = (slug for slug in stream if check_prefix in f" {self._entries[slug][1]}")
+        return iter(stream)
+
+    def _item(self, slug: str) -> TitleItem:
+        title, _, year, kind, poster, rating = self._entries[slug]
+        return TitleItem.model_validate({
+            "id": slug,
+            "slug": slug,
+            "title": title,
+            "year": year,
+            "type": kind,
+            "poster": {"url": poster} if poster else None,
+            "rating": rating,
+        })
+
+    # ----------------------------
+    # Snapshot
+    # ----------------------------
+
+    async def save(self) -> None:
+        if not self.path or not self._dirty:
+            return
+        rows = [[slug, e[0], e[2], e[3], e[4], e[5]] for slug, e in self._entries.items()]
+        self._dirty = False
+        try:
+            await asyncio.to_thread(self._write, self.path, rows)
+            logger.debug(f"TitleIndex saved {len(rows)} titles")
+        except OSError as exc:
+            self._dirty = True
+            logger.warning(f"TitleIndex save failed: {exc}")
+
+    async def _save_loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.TITLE_INDEX_SAVE_SECONDS)
+            await self.save()
+
+    @staticmethod
+    def _write(path: str, rows: List[List[Any]]) -> None:
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as fh:
+            fh.write(orjson.dumps(rows))
+        os.replace(tmp, path)
+
+    def _load(self, path: str) -> None:
+        with open(path, "rb") as fh:
+            rows = orjson.loads(fh.read())
+        for slug, title, year, kind, poster, rating in rows[-self.maxsize:]:
+            folded = fold(title)
+            self._entries[slug] = (title, folded, year, kind, poster, rating)
+            tokens = set(folded.split())
+            for token in tokens:
+                self._postings.setdefault(token, []).append(slug)
+            for short in _short_prefixes(tokens):
+                self._short.setdefault(short, set()).add(slug)
+        # One sort per list instead of an insort per title
+        for token, slugs in self._postings.items():
+            slugs.sort(key=self._rank_key)
+            self._sets[token] = set(slugs)
+        self._vocab = sorted(self._postings)
@@ -0,0 +1,130 @@
+from __future__ import annotations
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import NamedTuple, Optional
+from loguru import logger
+from ..config import settings
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    meta TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires_at);
+"""
+
+# Checking the total size on every write would add a table scan per insert
+_PRUNE_EVERY = 32
+
+
+class DiskEntry(NamedTuple):
+    value: bytes
+    meta: str
+    stored_at: float  # wall clock (time.time()), comparable across processes
+    expires_at: float
+
+
+class DiskCache:
+    """SQLite cache tier shared by every worker process on the host.
+
+    Entries carry their own expiry; once the file grows past max_bytes the
+    expired rows go first, then the ones closest to expiring.
+    """
+
+    def __init__(self, path: str, max_bytes: int) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+            logger.info(f"Disk cache opened at {self.path}")
+        return self._conn
+
+    def get(self, key: str) -> Optional[DiskEntry]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT value, meta, stored_at, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return DiskEntry(bytes(row[0]), row[1], row[2], row[3])
+
+    def set(self, key: str, value: bytes, ttl: float, meta: str = "") -> None:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, meta, value, size, stored_at, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, meta, value, len(value) + len(meta), now, now + ttl),
+            )
+            self._writes += 1
+            if self._writes % _PRUNE_EVERY == 0:
+                self._prune(conn, now)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._connect().execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def _prune(self, conn: sqlite3.Connection, now: float) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        conn.execute("DELETE FROM entries WHERE expires_at < ?", (now,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        excess = total - self.max_bytes
+        if excess <= 0:
+            return
+        # Drop the soonest-to-expire rows until the excess is covered (plus 10% headroom)
+        target = excess + self.max_bytes // 10
+        freed = 0
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY expires_at"):
+            victims.append((key,))
+            freed += size
+            if freed >= target:
+                break
+        conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+        logger.debug(f"Disk cache evicted {len(victims)} entries ({freed} bytes)")
+
+    async def aget(self, key: str) -> Optional[DiskEntry]:
+        try:
+            return await asyncio.to_thread(self.get, key)
+        except sqlite3.Error as exc:
+            logger.warning(f"Disk cache read failed for {key}: {exc}")
+            return None
+
+    async def aset(self, key: str, value: bytes, ttl: float, meta: str = "") -> None:
+        try:
+            await asyncio.to_thread(self.set, key, value, ttl, meta)
+        except sqlite3.Error as exc:
+            logger.warning(f"Disk cache write failed for {key}: {exc}")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# Optional second tier, enabled by DISK_CACHE_PATH
+disk_cache: Optional[DiskCache] = (
+    DiskCache(settings.DISK_CACHE_PATH, settings.DISK_CACHE_MAX_MB * 1024 * 1024)
+    if settings.DISK_CACHE_PATH
+    else None
+)
@@ -0,0 +1,270 @@
+from __future__ import annotations
+import asyncio
+import importlib.util
+import ipaddress
+import socket
+import ssl
+import typing
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
+import httpcore
+import httpx
+from cachetools import TTLCache
+from loguru import logger
+from ..config import settings
+
+
+def _is_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return True
+
+
+async def read_capped(resp: httpx.Response) -> Optional[bytes]:
+    """Body of a streamed response, or None once it exceeds MAX_RESPONSE_MB (0: no limit).
+
+    A declared Content-Length over the limit is refused before reading;
+    leaving the stream context with the body unread drops the connection.
+    """
+    limit = settings.MAX_RESPONSE_MB * 1024 * 1024
+    if limit <= 0:
+        return await resp.aread()
+    length = resp.headers.get("content-length", "")
+    if length.isdigit() and int(length) > limit:
+        return None
+    chunks: List[bytes] = []
+    size = 0
+    async for chunk in resp.aiter_bytes():
+        size += len(chunk)
+        if size > limit:
+            return None
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+class CachingResolver(httpcore.AsyncNetworkBackend):
+    """httpcore network backend that remembers DNS answers for `ttl` seconds.
+
+    httpcore resolves the host again for every new connection. Keep-alive
+    makes that rare, but a burst after an idle period (expired keep-alive,
+    an HTTP/2 GOAWAY) would otherwise wait on the resolver once per
+    connection. Concurrent lookups of one host share a single getaddrinfo.
+    """
+
+    def __init__(self, ttl: float, backend: Optional[httpcore.AsyncNetworkBackend] = None) -> None:
+        self._backend = backend or httpcore.AnyIOBackend()
+        self._cache: TTLCache[Tuple[str, int], List[str]] = TTLCache(maxsize=1024, ttl=ttl)
+        self._lookups: Dict[Tuple[str, int], "asyncio.Task[List[str]]"] = {}
+        self.stats: Dict[str, int] = {"dns_hits": 0, "dns_lookups": 0}
+
+    async def connect_tcp(
+        self,
+        host: str,
+        port: int,
+        timeout: Optional[float] = None,
+        local_address: Optional[str] = None,
+        socket_options: Optional[typing.Iterable[Any]] = None,
+    ) -> httpcore.AsyncNetworkStream:
+        if _is_ip(host):
+            return await self._backend.connect_tcp(host, port, timeout, local_address, socket_options)
+        error: Optional[Exception] = None
+        for address in await self._resolve(host, port):
+            try:
+                # TLS still verifies and sends SNI for the origin host, not this address
+                return await self._backend.connect_tcp(address, port, timeout, local_address, socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as exc:
+                error = exc
+        # Every address failed: the host may have moved, look it up again next time
+        self._cache.pop((host, port), None)
+        raise error or httpcore.ConnectError(f"no addresses for {host}")
+
+    async def connect_unix_socket(
+        self, path: str, timeout: Optional[float] = None, socket_options: Optional[typing.Iterable[Any]] = None
+    ) -> httpcore.AsyncNetworkStream:
+        return await self._backend.connect_unix_socket(path, timeout, socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+    async def _resolve(self, host: str, port: int) -> List[str]:
+        key = (host, port)
+        addresses = self._cache.get(key)
+        if addresses is not None:
+            self.stats["dns_hits"] += 1
+            return addresses
+        task = self._lookups.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._lookup(host, port))
+            self._lookups[key] = task
+            task.add_done_callback(lambda t, key=key: self._lookup_done(key, t))
+        return await asyncio.shield(task)
+
+    async def _lookup(self, host: str, port: int) -> List[str]:
+        self.stats["dns_lookups"] += 1
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except OSError as exc:
+            # Surfaces as httpx.ConnectError, like a failed lookup inside httpcore
+            raise httpcore.ConnectError(str(exc)) from exc
+        addresses = list(dict.fromkeys(str(info[4][0]) for info in infos))
+        self._cache[(host, port)] = addresses
+        return addresses
+
+    def _lookup_done(self, key: Tuple[str, int], task: "asyncio.Task[List[str]]") -> None:
+        if self._lookups.get(key) is task:
+            del self._lookups[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"DNS lookup failed for {key[0]}: {task.exception()!r}")
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body that hands its host slot back when closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]) -> None:
+        self._stream = stream
+        self._release: Optional[Callable[[], None]] = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._release is not None:
+                self._release()
+                self._release = None
+
+
+class _SharedTransport(httpx.AsyncBaseTransport):
+    """What each client sees of the pool: per-host request caps, and no way to close it.
+
+    A host slot is held until the response body is closed, which is when an
+    HTTP/1.1 connection goes back to the pool.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, per_host: int) -> None:
+        self._transport = transport
+        self._per_host = per_host
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if self._per_host <= 0:
+            return await self._transport.handle_async_request(request)
+        host = request.url.host
+        slots = self._hosts.get(host)
+        if slots is None:
+            slots = self._hosts[host] = asyncio.Semaphore(self._per_host)
+        await slots.acquire()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            slots.release()
+            raise
+        assert isinstance(response.stream, httpx.AsyncByteStream)
+        response.stream = _ReleasingStream(response.stream, slots.release)
+        return response
+
+    async def aclose(self) -> None:
+        # Clients come and go with their owners; the pool closes with the app
+        pass
+
+
+class HttpPool:
+    """Connection pool shared by every upstream client in the process.
+
+    AsyncHttpClient, RobotsCache and ImageProxy each get their own
+    httpx.AsyncClient (headers, timeouts and redirect policy stay theirs)
+    on top of one transport: HTTP/2 where the upstream negotiates it,
+    connection and keep-alive limits from settings, per-host request caps
+    and a DNS cache. Closing one of those clients leaves the pool open;
+    aclose() at app shutdown closes it.
+    """
+
+    def __init__(
+        self,
+        http2: bool = settings.HTTP2,
+        max_connections: int = settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive: int = settings.HTTP_MAX_KEEPALIVE,
+        keepalive_expiry: float = settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        per_host: int = settings.HTTP_MAX_PER_HOST,
+        dns_ttl: float = settings.DNS_CACHE_TTL_SECONDS,
+        proxy: Optional[str] = settings.UPSTREAM_PROXY,
+        verify: Union[bool, str, ssl.SSLContext] = True,
+    ) -> None:
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("HTTP2 is enabled but the h2 package is missing (pip install 'httpx[http2]'); using HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+        self._limits = httpx.Limits(
+            max_connections=max_connections or None,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._per_host = per_host
+        self._dns_ttl = dns_ttl
+        self._proxy = proxy
+        self._verify = verify
+        self._transport: Optional[httpx.AsyncHTTPTransport] = None
+        self._shared: Optional[_SharedTransport] = None
+        self.resolver: Optional[CachingResolver] = None
+
+    def client(self, **kwargs: Any) -> httpx.AsyncClient:
+        """A new AsyncClient on the shared pool (kwargs as for httpx.AsyncClient, minus transport)."""
+        return httpx.AsyncClient(transport=self._shared_transport(), **kwargs)
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        pool = self._pool()
+        connections = pool.connections if pool is not None else []
+        stats: Dict[str, Any] = {
+            "http2": self.http2,
+            "connections": len(connections),
+            "idle": sum(1 for c in connections if c.is_idle()),
+            "http2_connections": sum(1 for c in connections if "HTTP/2" in c.info()),
+        }
+        if self.resolver is not None:
+            stats.update(self.resolver.stats)
+        return stats
+
+    async def aclose(self) -> None:
+        if self._transport is not None:
+            await self._transport.aclose()
+            self._transport = None
+            self._shared = None
+            logger.info("HttpPool closed")
+
+    def _shared_transport(self) -> _SharedTransport:
+        if self._shared is None:
+            self._transport = httpx.AsyncHTTPTransport(
+                http2=self.http2, limits=self._limits, proxy=self._proxy, verify=self._verify
+            )
+            if self._dns_ttl > 0:
+                self.resolver = CachingResolver(self._dns_ttl)
+                self._install_resolver(self.resolver)
+            self._shared = _SharedTransport(self._transport, self._per_host)
+        return self._shared
+
+    def _install_resolver(self, resolver: CachingResolver) -> None:
+        # httpx 0.27 has no parameter for httpcore's network backend, so it is
+        # swapped on the pool httpx built. Both attributes are private (httpcore
+        # is pinned in requirements.txt for that reason): if an upgrade moves
+        # them, fail at startup rather than run without the DNS cache unnoticed.
+        pool = self._pool()
+        if not isinstance(pool, httpcore.AsyncConnectionPool) or not isinstance(
+            getattr(pool, "_network_backend", None), httpcore.AsyncNetworkBackend
+        ):
+            raise RuntimeError(
+                f"Cannot install the DNS cache on httpx {httpx.__version__} / httpcore {httpcore.__version__}; "
+                "check HttpPool._install_resolver or set DNS_CACHE_TTL_SECONDS=0"
+            )
+        pool._network_backend = resolver
+
+    def _pool(self) -> Optional[httpcore.AsyncConnectionPool]:
+        return self._transport._pool if self._transport is not None else None  # type: ignore[return-value]
+
+
+# Shared by every upstream client in this process
+http_pool = HttpPool()
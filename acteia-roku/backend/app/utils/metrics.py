@@ -0,0 +1,218 @@
+from __future__ import annotations
+import asyncio
+import bisect
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from .profiler import profiler
+
+# Seconds, from a memory cache hit to a slow upstream
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[str, ...]
+# (name suffix, labels, value) rows produced by a collector
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(labels[n] for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in sorted(values):
+            yield f"{self.name}{_labels(self.labelnames, key)} {value:g}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram; observe() is safe from the parse and image worker threads."""
+
+    def __init__(
+        self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._series: Dict[Labels, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(labels[n] for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][i] += 1
+            series[1][0] += value
+
+    def time(self, **labels: str) -> "_Timer":
+        """Context manager observing the seconds spent in its body."""
+        return _Timer(self, labels)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = [(key, list(counts), total[0]) for key, (counts, total) in self._series.items()]
+        for key, counts, total in sorted(series):
+            cumulative = 0
+            for bound, n in zip((*self.buckets, float("inf")), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                bucket = _labels(self.labelnames, key, f'le="{le}"')
+                yield f"{self.name}_bucket{bucket} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {total:.6f}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}"
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_labels", "_start")
+
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]) -> None:
+        self._histogram = histogram
+        self._labels = labels
+        self._start = 0.0
+
+    def __enter__(self) -> "_Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._histogram.observe(time.perf_counter() - self._start, **self._labels)
+
+
+class Registry:
+    """Metrics rendered in the Prometheus text format by GET /metrics.
+
+    Histograms and counters are updated where the work happens; collectors
+    are called at scrape time to export numbers kept elsewhere (the stats
+    dicts of each component) as untyped samples.
+    """
+
+    def __init__(self, prefix: str = "acteia") -> None:
+        self.prefix = prefix
+        self._metrics: List[Any] = []
+        self._collectors: List[Tuple[str, str, Callable[[], List[Sample]]]] = []
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(f"{self.prefix}_{name}", help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(
+        self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        metric = Histogram(f"{self.prefix}_{name}", help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, name: str, help: str, collect: Callable[[], List[Sample]]) -> None:
+        self._collectors.append((f"{self.prefix}_{name}", help, collect))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, help, collect in self._collectors:
+            by_name: Dict[str, List[str]] = {}
+            for suffix, labels, value in collect():
+                full = f"{name}_{suffix}"
+                by_name.setdefault(full, []).append(f"{full}{_labels(list(labels), list(labels.values()))} {value:g}")
+            for full, rows in by_name.items():
+                lines.append(f"# HELP {full} {help}")
+                lines.append(f"# TYPE {full} untyped")
+                lines.extend(rows)
+        return "\n".join(lines) + "\n"
+
+
+def flat_stats(stats: Dict[str, Any], labels: Optional[Dict[str, str]] = None) -> List[Sample]:
+    """Numeric entries of a component's stats dict as collector samples (bools as 0/1)."""
+    return [(key, labels or {}, float(value)) for key, value in stats.items() if isinstance(value, (int, float))]
+
+
+# Shared by every component in this process
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram(
+    "request_seconds", "API request latency by route template and status class", ("route", "status")
+)
+HTTP_GET_SECONDS = registry.histogram(
+    "http_get_seconds", "AsyncHttpClient.get latency by outcome (hit, stale, coalesced, miss, blocked)", ("outcome",)
+)
+UPSTREAM_QUEUE_SECONDS = registry.histogram(
+    "upstream_queue_seconds", "Time queued in the upstream scheduler by priority class", ("priority",)
+)
+UPSTREAM_SECONDS = registry.histogram(
+    "upstream_seconds", "Upstream request time once a slot is held (page, scan or image)", ("source",)
+)
+EXTRACT_SECONDS = registry.histogram("extract_seconds", "Extractor run time by function", ("extractor",))
+PARSE_WAIT_SECONDS = registry.histogram(
+    "parse_wait_seconds", "Time in the parse pool beyond the extractor itself (queueing, pickling)"
+)
+VALIDATE_SECONDS = registry.histogram("validate_seconds", "Model validation of extractor output by page kind", ("kind",))
+IMAGE_STAGE_SECONDS = registry.histogram(
+    "image_stage_seconds", "Image proxy render stages (decode, resize, encode) and the wait for a worker", ("stage",)
+)
+IMAGE_REQUESTS = registry.counter("image_requests_total", "Image proxy lookups by result (memory, disk, miss)", ("result",))
+
+
+class MetricsMiddleware:
+    """Observes REQUEST_SECONDS for every HTTP request and hands slow ones to the profiler.
+
+    Pure ASGI so streamed bodies (NDJSON batches) are timed to their last
+    chunk. Routes are labelled by their template ("/api/title/{slug:path}")
+    to keep the series count bounded.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.monotonic()
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.monotonic() - started
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            REQUEST_SECONDS.observe(elapsed, route=path, status=f"{status // 100}xx")
+            if profiler.enabled and elapsed * 1000 >= profiler.slow_ms:
+                await asyncio.to_thread(profiler.slow_request, f"{scope['method']} {path}", started, elapsed)
@@ -0,0 +1,148 @@
+from __future__ import annotations
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+from loguru import logger
+from ..config import settings
+
+# Leaf frames of threads that are only waiting (event loop select, idle pool workers)
+_IDLE_MODULES = ("threading.py", "selectors.py", "queue.py", "concurrent/futures/thread.py")
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+def _folded(thread_name: str, frame) -> str:
+    """One stack as "thread;outer (file:line);...;inner (file:line)" (the folded flame-graph format)."""
+    names: List[str] = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    names.append(thread_name)
+    names.reverse()
+    return ";".join(names)
+
+
+class SamplingProfiler:
+    """Wall-clock sampler for slow-request flame graphs.
+
+    While enabled, a daemon thread records the stack of every other thread
+    each interval into a short ring buffer. When a request takes longer
+    than slow_ms, the samples taken during it are written to the profile
+    directory in the folded format ("stack count" per line), which
+    flamegraph.pl and speedscope read as is. Samples cover the whole
+    process, so requests running at the same time share theirs.
+    """
+
+    def __init__(
+        self,
+        interval_ms: int = settings.PROFILER_INTERVAL_MS,
+        slow_ms: int = settings.PROFILER_SLOW_MS,
+        directory: str = settings.PROFILER_DIR,
+        keep: int = settings.PROFILER_KEEP,
+    ) -> None:
+        self.interval_ms = max(1, interval_ms)
+        self.slow_ms = slow_ms
+        self.directory = directory
+        self.keep = keep
+        # (monotonic time, folded stack); about a minute of samples at the default interval
+        self._samples: Deque[Tuple[float, str]] = deque(maxlen=6000)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.stats: Dict[str, int] = {"enabled": 0, "samples": 0, "dumps": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self._thread is not None
+
+    def enable(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        self.stats["enabled"] = 1
+        logger.info(f"Profiler sampling every {self.interval_ms} ms, dumping requests over {self.slow_ms} ms")
+
+    def disable(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=1)
+        self._thread = None
+        with self._lock:
+            self._samples.clear()
+        self.stats["enabled"] = 0
+        logger.info("Profiler stopped")
+
+    def slow_request(self, label: str, started: float, elapsed: float) -> Optional[str]:
+        """Dump the samples of a request that started at monotonic `started` and took `elapsed` seconds.
+
+        Returns the file name, or None when the request was fast or nothing
+        was sampled. Blocking file I/O: call it through asyncio.to_thread.
+        """
+        if self._thread is None or elapsed * 1000 < self.slow_ms:
+            return None
+        end = started + elapsed
+        counts: Dict[str, int] = {}
+        with self._lock:
+            for at, stack in self._samples:
+                if started <= at <= end:
+                    counts[stack] = counts.get(stack, 0) + 1
+        if not counts:
+            return None
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{int(elapsed * 1000)}ms-{_UNSAFE.sub('_', label).strip('_')[:60]}.folded"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, name), "w", encoding="utf-8") as fh:
+                fh.writelines(f"{stack} {n}\n" for stack, n in sorted(counts.items()))
+        except OSError as exc:
+            logger.warning(f"Could not write profile {name}: {exc}")
+            return None
+        self.stats["dumps"] += 1
+        logger.info(f"Slow request {label} ({elapsed * 1000:.0f} ms) profiled to {name}")
+        self._prune()
+        return name
+
+    def dumps(self) -> List[str]:
+        """Profile files on disk, newest first."""
+        try:
+            names = [n for n in os.listdir(self.directory) if n.endswith(".folded")]
+        except FileNotFoundError:
+            return []
+        return sorted(names, reverse=True)
+
+    def path(self, name: str) -> Optional[str]:
+        """Path of a dump listed by dumps(), None for anything else."""
+        return os.path.join(self.directory, name) if name in self.dumps() else None
+
+    def _prune(self) -> None:
+        for name in self.dumps()[self.keep:]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        interval = self.interval_ms / 1000
+        while not self._stop.wait(interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            now = time.monotonic()
+            taken: List[Tuple[float, str]] = []
+            for ident, frame in sys._current_frames().items():
+                if ident == own or frame.f_code.co_filename.endswith(_IDLE_MODULES):
+                    continue
+                taken.append((now, _folded(names.get(ident, str(ident)), frame)))
+            if taken:
+                with self._lock:
+                    self._samples.extend(taken)
+                self.stats["samples"] += len(taken)
+
+
+# Shared by the metrics middleware and the /debug/profiler endpoints
+profiler = SamplingProfiler()
@@ -0,0 +1,170 @@
+from __future__ import annotations
+import math
+import re
+import time
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+import orjson
+from cachetools import TTLCache
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from ..config import settings
+
+DEVICE_HEADER = b"x-device-id"
+_DEVICE_ID = re.compile(rb"[A-Za-z0-9._:-]{1,64}")
+
+
+class _Bill:
+    __slots__ = ("tokens",)
+
+    def __init__(self) -> None:
+        self.tokens = 0.0
+
+
+# Cost run up by the request being served; tasks it starts (fetches, parses) share it
+_bill: ContextVar[Optional[_Bill]] = ContextVar("rate_limit_bill", default=None)
+
+
+def charge(tokens: float) -> None:
+    """Add to the current request's cost; a no-op outside a request (refresher, prerender)."""
+    bill = _bill.get()
+    if bill is not None:
+        bill.tokens += tokens
+
+
+class TokenBuckets:
+    """Token buckets refilled at `rate` per second up to `burst`, one per key.
+
+    Both operations are O(1). A bucket left alone long enough to refill
+    is the same as no bucket, so entries expire after burst / rate
+    seconds idle (forgiving any debt left by then) and memory tracks the
+    clients active in that window. Balances can go negative: cost charged
+    after the fact (upstream work a request turned out to need) is owed
+    and paid off by waiting.
+    """
+
+    def __init__(self, rate: float, burst: float, maxsize: int = settings.RATE_LIMIT_MAX_CLIENTS) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._buckets: TTLCache[bytes, Tuple[float, float]] = TTLCache(maxsize=maxsize, ttl=burst / rate)
+
+    def _balance(self, key: bytes, now: float) -> float:
+        entry = self._buckets.get(key)
+        if entry is None:
+            return self.burst
+        tokens, stamp = entry
+        return min(self.burst, tokens + (now - stamp) * self.rate)
+
+    def wait(self, key: bytes, tokens: float, now: float) -> float:
+        """Seconds until key's bucket holds tokens, 0.0 if it does now."""
+        balance = self._balance(key, now)
+        return 0.0 if balance >= tokens else (tokens - balance) / self.rate
+
+    def take(self, key: bytes, tokens: float, now: float) -> None:
+        """Take tokens from key's bucket, into debt if need be."""
+        self._buckets[key] = (self._balance(key, now) - tokens, now)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class RateLimiter:
+    """Cost-based limits per device, and per client address for all its devices together.
+
+    A device is named by the X-Device-Id header (the Roku channel client
+    id), else its address. Each request must find request_cost tokens in
+    both buckets; whatever upstream work it triggered is charged (see
+    charge()) once it is done, so a cache hit costs request_cost and a
+    cold title page several times more. The address bucket is
+    `household` times larger so devices behind one NAT do not starve
+    each other.
+    """
+
+    def __init__(
+        self,
+        rate: float = settings.RATE_LIMIT_PER_SECOND,
+        burst: float = settings.RATE_LIMIT_BURST,
+        request_cost: float = settings.RATE_LIMIT_REQUEST_COST,
+        household: float = settings.RATE_LIMIT_HOUSEHOLD,
+        enabled: bool = settings.RATE_LIMIT_ENABLED,
+    ) -> None:
+        self.request_cost = request_cost
+        self.enabled = enabled
+        self.devices = TokenBuckets(rate, burst)
+        self.addresses = TokenBuckets(rate * household, burst * household)
+        self._stats: Dict[str, float] = {"allowed": 0, "limited": 0, "charged": 0.0}
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        return {**self._stats, "devices": len(self.devices), "addresses": len(self.addresses)}
+
+    def admit(self, device: bytes, address: bytes) -> float:
+        """0.0 if the request may go ahead (its base cost taken), else the seconds to wait."""
+        now = time.monotonic()
+        wait = self.addresses.wait(address, self.request_cost, now)
+        if device != address:
+            wait = max(wait, self.devices.wait(device, self.request_cost, now))
+        if wait:
+            self._stats["limited"] += 1
+            return wait
+        self._stats["allowed"] += 1
+        self.settle(device, address, self.request_cost, now)
+        return 0.0
+
+    def settle(self, device: bytes, address: bytes, tokens: float, now: Optional[float] = None) -> None:
+        """Take tokens from both buckets, e.g. the upstream cost a finished request ran up."""
+        if tokens <= 0:
+            return
+        now = time.monotonic() if now is None else now
+        self.addresses.take(address, tokens, now)
+        if device != address:
+            self.devices.take(device, tokens, now)
+        self._stats["charged"] += tokens
+
+
+def _keys(scope: Scope) -> Tuple[bytes, bytes]:
+    client = scope.get("client")
+    address = (client[0] if client else "unknown").encode()
+    for name, value in scope["headers"]:
+        if name == DEVICE_HEADER:
+            if _DEVICE_ID.fullmatch(value):
+                return b"d:" + value, address
+            break
+    return address, address
+
+
+class RateLimitMiddleware:
+    """Answers 429 (with Retry-After) to clients out of tokens and bills the rest for their upstream work."""
+
+    def __init__(self, app: ASGIApp, limiter: RateLimiter, exempt: Iterable[str] = ()) -> None:
+        self.app = app
+        self.limiter = limiter
+        self.exempt = frozenset(exempt)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.limiter.enabled or scope["path"] in self.exempt:
+            await self.app(scope, receive, send)
+            return
+        device, address = _keys(scope)
+        wait = self.limiter.admit(device, address)
+        if wait:
+            await _too_many(send, wait)
+            return
+        bill = _Bill()
+        token = _bill.set(bill)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _bill.reset(token)
+            self.limiter.settle(device, address, bill.tokens)
+
+
+async def _too_many(send: Send, wait: float) -> None:
+    body = orjson.dumps({"detail": "Rate limit exceeded"})
+    headers: List[Tuple[bytes, bytes]] = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+        (b"retry-after", str(max(1, math.ceil(wait))).encode()),
+    ]
+    start: Message = {"type": "http.response.start", "status": 429, "headers": headers}
+    await send(start)
+    await send({"type": "http.response.body", "body": body})
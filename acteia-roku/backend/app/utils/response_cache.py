@@ -0,0 +1,122 @@
+from __future__ import annotations
+import gzip
+import hashlib
+from typing import Any, Callable, Dict, Optional
+import orjson
+from cachetools import LRUCache
+from fastapi import Request, Response
+from ..config import settings
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Below this the encoding overhead outweighs the savings (same floor as GZipMiddleware)
+_MIN_COMPRESS_SIZE = 512
+
+
+class EncodedBody:
+    """A JSON body serialized once; compressed forms are made on first demand.
+
+    Each coding is its own representation with its own strong ETag: the
+    body digest, suffixed with the coding for compressed ones.
+    """
+
+    __slots__ = ("source", "identity", "digest", "_encoded")
+
+    def __init__(self, source: Any, identity: bytes) -> None:
+        # Held so `is` against the scraper's current object stays meaningful
+        self.source = source
+        self.identity = identity
+        self.digest = hashlib.blake2b(identity, digest_size=16).hexdigest()
+        self._encoded: Dict[str, bytes] = {}
+
+    def etag(self, coding: Optional[str] = None) -> str:
+        return f'"{self.digest}-{coding}"' if coding else f'"{self.digest}"'
+
+    def encoded(self, coding: str) -> bytes:
+        body = self._encoded.get(coding)
+        if body is None:
+            if coding == "br":
+                body = brotli.compress(self.identity, quality=settings.RESPONSE_BROTLI_QUALITY)
+            else:
+                body = gzip.compress(self.identity, compresslevel=settings.RESPONSE_GZIP_LEVEL, mtime=0)
+            self._encoded[coding] = body
+        return body
+
+
+def _accepted(header: str) -> Dict[str, float]:
+    codings: Dict[str, float] = {}
+    for part in header.split(","):
+        coding, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        codings[coding.strip().lower()] = q
+    return codings
+
+
+def _etag_matches(header: Optional[str], digest: str) -> bool:
+    """Whether If-None-Match names any coding of the body with this digest."""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison; the body is the same whichever
+    # coding the client cached, so it is told to keep that one
+    for tag in header.split(","):
+        opaque = tag.strip().removeprefix("W/").strip('"')
+        if opaque == digest or opaque.startswith(f"{digest}-"):
+            return True
+    return False
+
+
+class ResponseCache:
+    """Serialized and compressed bodies of hot JSON endpoints.
+
+    The scraper hands back the same model object for as long as the
+    upstream page is unchanged (see ActeiaScraper._cached_parse), so an
+    entry stays valid while its source is that very object. A hit skips
+    response validation, serialization and compression: matching
+    If-None-Match gets a 304, anyone else the stored bytes. The
+    Content-Encoding we set keeps GZipMiddleware from compressing again.
+    """
+
+    def __init__(self, maxsize: int = settings.RESPONSE_CACHE_MAXSIZE) -> None:
+        self._entries: LRUCache[str, EncodedBody] = LRUCache(maxsize=maxsize)
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "not_modified": 0}
+
+    def respond(self, request: Request, key: str, source: Any, dump: Callable[[Any], Any], store: bool = True) -> Response:
+        """Response for source (a model, or a list of them) cached under key; dump makes it JSON-ready.
+
+        With store=False a miss is answered the same way but not kept, for
+        variants too rare to be worth a slot.
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry.source is not source:
+            entry = EncodedBody(source, orjson.dumps(dump(source)))
+            if store:
+                self._entries[key] = entry
+            self.stats["misses"] += 1
+        else:
+            self.stats["hits"] += 1
+        coding: Optional[str] = None
+        if len(entry.identity) >= _MIN_COMPRESS_SIZE:
+            accepted = _accepted(request.headers.get("accept-encoding", ""))
+            for candidate in ("br", "gzip"):
+                if accepted.get(candidate, 0) > 0 and (candidate != "br" or brotli is not None):
+                    coding = candidate
+                    break
+        headers = {"ETag": entry.etag(coding), "Vary": "Accept-Encoding"}
+        if _etag_matches(request.headers.get("if-none-match"), entry.digest):
+            self.stats["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+        if coding is None:
+            return Response(content=entry.identity, media_type="application/json", headers=headers)
+        headers["Content-Encoding"] = coding
+        return Response(content=entry.encoded(coding), media_type="application/json", headers=headers)
@@ -0,0 +1,220 @@
+from __future__ import annotations
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+from loguru import logger
+from ..config import settings
+from .metrics import UPSTREAM_QUEUE_SECONDS
+
+# Priority classes, most urgent first (ties in the fair queue go to the earlier one)
+INTERACTIVE = "interactive"  # title details and stream resolution
+LISTING = "listing"  # home, sections, search
+PREFETCH = "prefetch"  # cache refresh, episode prefetch, poster prerender
+IMAGE = "image"  # image proxy downloads
+PRIORITIES = (INTERACTIVE, LISTING, PREFETCH, IMAGE)
+
+
+class QueueDeadlineExceeded(Exception):
+    """Queued work waited longer than its class deadline and was dropped."""
+
+
+class Ticket:
+    """One upstream slot at a given priority, held for the body of an async with.
+
+    The priority can be raised while the ticket is still queued (see
+    UpstreamScheduler.promote), for instance when an interactive request
+    joins a fetch a background refresh started.
+    """
+
+    __slots__ = ("_scheduler", "priority", "enqueued", "_future", "_timer", "_running")
+
+    def __init__(self, scheduler: UpstreamScheduler, priority: str) -> None:
+        if priority not in PRIORITIES:
+            raise ValueError(f"unknown priority: {priority}")
+        self._scheduler = scheduler
+        self.priority = priority
+        self.enqueued = 0.0
+        self._future: Optional["asyncio.Future[None]"] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running = False
+
+    async def __aenter__(self) -> Ticket:
+        await self._scheduler._acquire(self)
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        self._scheduler._release(self)
+
+    def promote(self, priority: str) -> None:
+        self._scheduler.promote(self, priority)
+
+
+class UpstreamScheduler:
+    """Upstream request slots shared by page fetches and image downloads.
+
+    At most `capacity` requests run at once, and each priority class has its
+    own cap below that. When a slot frees up, the queued class with the
+    lowest pass value goes next and its pass grows by 1/weight (stride
+    scheduling, a simple weighted fair queue): interactive work overtakes a
+    backlog of prefetches without starving it. Work in a class with a
+    deadline is dropped once it has queued for longer than that.
+    """
+
+    def __init__(
+        self,
+        capacity: int = settings.MAX_CONCURRENCY,
+        limits: Optional[Dict[str, int]] = None,
+        weights: Optional[Dict[str, int]] = None,
+        deadlines: Optional[Dict[str, float]] = None,
+    ) -> None:
+        self.capacity = max(1, capacity)
+        limits = settings.SCHEDULER_LIMITS if limits is None else limits
+        weights = settings.SCHEDULER_WEIGHTS if weights is None else weights
+        deadlines = settings.SCHEDULER_DEADLINES if deadlines is None else deadlines
+        self.limits = {p: max(1, min(limits.get(p, self.capacity), self.capacity)) for p in PRIORITIES}
+        self.weights = {p: max(1, weights.get(p, 1)) for p in PRIORITIES}
+        self.deadlines = {p: max(0.0, float(deadlines.get(p, 0))) for p in PRIORITIES}
+        self._queues: Dict[str, Deque[Ticket]] = {p: deque() for p in PRIORITIES}
+        self._running: Dict[str, int] = {p: 0 for p in PRIORITIES}
+        self._pass: Dict[str, float] = {p: 0.0 for p in PRIORITIES}
+        # Pass of the class served last: where a class returning from idle starts
+        self._vtime = 0.0
+        self._active = 0
+        self._counters: Dict[str, Dict[str, float]] = {
+            p: {"started": 0, "queued_total": 0, "dropped": 0, "promoted": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0}
+            for p in PRIORITIES
+        }
+
+    def slot(self, priority: str) -> Ticket:
+        """A ticket to use as `async with scheduler.slot(priority):` around one request."""
+        return Ticket(self, priority)
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        classes: Dict[str, Dict[str, Any]] = {}
+        for p in PRIORITIES:
+            c = self._counters[p]
+            classes[p] = {
+                "running": self._running[p],
+                "queued": len(self._queues[p]),
+                "started": int(c["started"]),
+                "queued_total": int(c["queued_total"]),
+                "dropped": int(c["dropped"]),
+                "promoted": int(c["promoted"]),
+                "wait_ms_avg": round(c["wait_ms_total"] / c["started"], 2) if c["started"] else 0.0,
+                "wait_ms_max": round(c["wait_ms_max"], 2),
+            }
+        return {"capacity": self.capacity, "running": self._active, "classes": classes}
+
+    def promote(self, ticket: Ticket, priority: str) -> None:
+        """Raise a queued ticket's priority; running or lower-priority requests are left alone."""
+        if ticket._running or ticket._future is None or ticket._future.done():
+            return
+        if PRIORITIES.index(priority) >= PRIORITIES.index(ticket.priority):
+            return
+        self._queues[ticket.priority].remove(ticket)
+        self._counters[priority]["promoted"] += 1
+        ticket.priority = priority
+        self._cancel_timer(ticket)
+        self._enqueue(ticket)
+        self._dispatch()
+
+    # ----------------------------
+    # Internals (driven by Ticket)
+    # ----------------------------
+
+    async def _acquire(self, ticket: Ticket) -> None:
+        ticket.enqueued = time.monotonic()
+        ticket._future = asyncio.get_running_loop().create_future()
+        self._enqueue(ticket)
+        self._dispatch()
+        if not ticket._future.done():
+            self._counters[ticket.priority]["queued_total"] += 1
+        try:
+            await ticket._future
+        except asyncio.CancelledError:
+            if ticket._running:
+                self._release(ticket)
+            elif ticket in self._queues[ticket.priority]:
+                self._queues[ticket.priority].remove(ticket)
+                self._cancel_timer(ticket)
+            raise
+
+    def _release(self, ticket: Ticket) -> None:
+        if not ticket._running:
+            return
+        ticket._running = False
+        self._active -= 1
+        self._running[ticket.priority] -= 1
+        self._dispatch()
+
+    def _enqueue(self, ticket: Ticket) -> None:
+        p = ticket.priority
+        queue = self._queues[p]
+        if not queue:
+            # A class coming back from idle does not get to cash in the turns it
+            # did not need while it was away
+            self._pass[p] = max(self._pass[p], self._vtime)
+        queue.append(ticket)
+        deadline = self.deadlines[p]
+        if deadline > 0:
+            remaining = deadline - (time.monotonic() - ticket.enqueued)
+            ticket._timer = asyncio.get_running_loop().call_later(max(0.0, remaining), self._expire, ticket)
+
+    def _dispatch(self) -> None:
+        while self._active < self.capacity:
+            best: Optional[str] = None
+            for p in PRIORITIES:
+                if self._queues[p] and self._running[p] < self.limits[p]:
+                    if best is None or self._pass[p] < self._pass[best]:
+                        best = p
+            if best is None:
+                return
+            ticket = self._queues[best].popleft()
+            if ticket._future is None or ticket._future.done():
+                # Cancelled while queued; its waiter has not run its cleanup yet
+                self._cancel_timer(ticket)
+                continue
+            self._vtime = self._pass[best]
+            self._pass[best] += 1 / self.weights[best]
+            self._start(ticket)
+
+    def _start(self, ticket: Ticket) -> None:
+        self._cancel_timer(ticket)
+        ticket._running = True
+        self._active += 1
+        self._running[ticket.priority] += 1
+        waited = (time.monotonic() - ticket.enqueued) * 1000
+        c = self._counters[ticket.priority]
+        c["started"] += 1
+        c["wait_ms_total"] += waited
+        c["wait_ms_max"] = max(c["wait_ms_max"], waited)
+        UPSTREAM_QUEUE_SECONDS.observe(waited / 1000, priority=ticket.priority)
+        assert ticket._future is not None
+        ticket._future.set_result(None)
+
+    def _expire(self, ticket: Ticket) -> None:
+        ticket._timer = None
+        queue = self._queues[ticket.priority]
+        if ticket._running or ticket not in queue:
+            return
+        queue.remove(ticket)
+        if ticket._future is None or ticket._future.done():
+            return
+        self._counters[ticket.priority]["dropped"] += 1
+        logger.debug(f"Dropped {ticket.priority} request after {self.deadlines[ticket.priority]:.0f}s in queue")
+        assert ticket._future is not None
+        ticket._future.set_exception(
+            QueueDeadlineExceeded(f"{ticket.priority} request queued past {self.deadlines[ticket.priority]:.0f}s")
+        )
+
+    @staticmethod
+    def _cancel_timer(ticket: Ticket) -> None:
+        if ticket._timer is not None:
+            ticket._timer.cancel()
+            ticket._timer = None
+
+
+# Shared by every upstream client in this process
+upstream_scheduler = UpstreamScheduler()
@@ -0,0 +1,117 @@
+"""Cold-start hit rate and RSS of the page cache for 1 vs 4 workers.
+
+Each worker is a separate process with its own AsyncHttpClient, as under
+`uvicorn --workers N`. Upstream is an in-process mock with fixed latency, so
+the numbers only reflect the cache tiers. Every configuration is run twice on
+the same disk file: "cold" is the first boot, "restart" a second boot that
+finds whatever the first one left behind.
+
+    cd backend && python benchmarks/bench_disk_cache.py
+"""
+from __future__ import annotations
+import asyncio
+import multiprocessing as mp
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+PAGES = 200
+PAGE_BYTES = 120_000
+REQUESTS_PER_WORKER = 400
+UPSTREAM_LATENCY = 0.01
+
+
+def _worker(index: int, disk_path: Optional[str], mem_maxsize: int, seed: int) -> Dict[str, float]:
+    import httpx
+    from loguru import logger
+    from app.config import settings
+
+    logger.remove()
+    settings.RESPECT_ROBOTS = False
+    settings.REFRESH_INTERVAL_SECONDS = 0
+    settings.CACHE_MAXSIZE = mem_maxsize
+    from app.scraper.http_client import AsyncHttpClient
+    from app.utils.disk_cache import DiskCache
+
+    body = (b"<html>" + b"x" * PAGE_BYTES + b"</html>")
+    upstream = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal upstream
+        upstream += 1
+        await asyncio.sleep(UPSTREAM_LATENCY)
+        return httpx.Response(200, headers={"content-type": "text/html"}, content=body + request.url.path.encode())
+
+    async def run() -> float:
+        disk = DiskCache(disk_path, 512 * 1024 * 1024) if disk_path else None
+        client = AsyncHttpClient(disk=disk)
+        await client.startup()
+        await client._client.aclose()
+        client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        rng = random.Random(seed * 100 + index)
+        # Zipf-like popularity: a few pages get most of the traffic
+        weights = [1.0 / (i + 1) for i in range(PAGES)]
+        urls = [f"http://upstream.test/page/{i}" for i in rng.choices(range(PAGES), weights, k=REQUESTS_PER_WORKER)]
+        start = time.perf_counter()
+        for url in urls:
+            await client.get(url)
+        elapsed = time.perf_counter() - start
+        await client.shutdown()
+        if disk is not None:
+            disk.close()
+        return elapsed
+
+    elapsed = asyncio.run(run())
+    return {
+        "upstream": upstream,
+        "requests": REQUESTS_PER_WORKER,
+        "elapsed": elapsed,
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def _boot(workers: int, disk_path: Optional[str], mem_maxsize: int, seed: int) -> Dict[str, float]:
+    with mp.get_context("spawn").Pool(workers) as pool:
+        results = pool.starmap(_worker, [(i, disk_path, mem_maxsize, seed) for i in range(workers)])
+    requests = sum(r["requests"] for r in results)
+    upstream = sum(r["upstream"] for r in results)
+    return {
+        "hit_rate": 1 - upstream / requests,
+        "upstream": upstream,
+        "wall_s": max(r["elapsed"] for r in results),
+        "rss_mb_per_worker": sum(r["rss_mb"] for r in results) / workers,
+        "rss_mb_total": sum(r["rss_mb"] for r in results),
+    }
+
+
+def main() -> None:
+    configs = [
+        ("memory only", False, 2048),
+        ("memory + disk", True, 2048),
+        ("small memory + disk", True, 32),
+    ]
+    rows: List[str] = []
+    for workers in (1, 4):
+        for name, use_disk, mem_maxsize in configs:
+            with tempfile.TemporaryDirectory() as tmp:
+                disk_path = os.path.join(tmp, "cache.sqlite3") if use_disk else None
+                for phase, seed in (("cold", 1), ("restart", 2)):
+                    r = _boot(workers, disk_path, mem_maxsize, seed)
+                    rows.append(
+                        f"{workers:>7} {name:<20} {phase:<8} {r['hit_rate']:>8.1%} {int(r['upstream']):>8} "
+                        f"{r['wall_s']:>7.2f} {r['rss_mb_per_worker']:>9.1f} {r['rss_mb_total']:>9.1f}"
+                    )
+                    print(rows[-1], flush=True)
+    print()
+    print(f"{'workers':>7} {'config':<20} {'phase':<8} {'hit rate':>8} {'upstream':>8} {'wall s':>7} {'RSS/wkr':>9} {'RSS sum':>9}")
+    print("\n".join(rows))
+
+
+if __name__ == "__main__":
+    main()
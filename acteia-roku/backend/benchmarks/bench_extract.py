@@ -0,0 +1,99 @@
+"""Extractor engines: output parity on the fixture corpus, then speed.
+
+Every parser runs on every page in benchmarks/fixtures/ under both engines,
+and the outputs must be identical (the script exits non-zero otherwise).
+Timings use the same pages plus an enlarged home page, closer in size to the
+real site.
+
+    cd backend && python benchmarks/bench_extract.py
+"""
+from __future__ import annotations
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.scraper import extract, extract_lxml
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+BASE_URL = "https://acteia.ca/br"
+ENGINES = {"bs4": extract, "lxml": extract_lxml}
+
+
+def load_fixtures() -> Dict[str, str]:
+    pages = {}
+    for name in sorted(os.listdir(FIXTURES)):
+        if name.endswith(".html"):
+            with open(os.path.join(FIXTURES, name), encoding="utf-8") as fh:
+                pages[name] = fh.read()
+    return pages
+
+
+def calls(engine) -> List[Tuple[str, Callable[[str], Any]]]:
+    return [
+        ("parse_home", lambda html: engine.parse_home(html, BASE_URL)),
+        ("parse_search", lambda html: engine.parse_search(html, BASE_URL)),
+        ("parse_title", lambda html: engine.parse_title(html, BASE_URL, "br/serie/slug")),
+        ("parse_stream_page", lambda html: engine.parse_stream_page(html, BASE_URL, None)),
+        ("parse_stream_page+ep", lambda html: engine.parse_stream_page(html, BASE_URL, "1x2")),
+        ("parse_episode_page", lambda html: engine.parse_episode_page(html, BASE_URL)),
+    ]
+
+
+def check_parity(pages: Dict[str, str]) -> int:
+    failures = 0
+    for name, html in pages.items():
+        for (fn_name, ref), (_, fast) in zip(calls(extract), calls(extract_lxml)):
+            expected, got = ref(html), fast(html)
+            if expected != got:
+                failures += 1
+                print(f"MISMATCH {name} {fn_name}\n  bs4:  {expected}\n  lxml: {got}")
+    return failures
+
+
+def enlarged_home(home: str, copies: int = 12) -> str:
+    # Repeat the main content with distinct slugs so de-duplication does not hide the work
+    start, end = home.index("<main"), home.index("</main>") + len("</main>")
+    main = home[start:end]
+    blocks = [main.replace("/br/", f"/br/c{i}/") for i in range(copies)]
+    return home[:start] + "".join(blocks) + home[end:]
+
+
+def bench(fn: Callable[[], Any], min_time: float = 0.5) -> float:
+    runs, start = 0, time.perf_counter()
+    while True:
+        fn()
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / runs * 1000
+
+
+def main() -> None:
+    pages = load_fixtures()
+    failures = check_parity(pages)
+    big = enlarged_home(pages["home.html"])
+    failures += check_parity({"home.html x12": big})
+    checks = len(pages) * len(calls(extract)) + len(calls(extract))
+    print(f"parity: {checks - failures}/{checks} identical")
+    if failures:
+        sys.exit(1)
+
+    cases = [
+        ("home.html", "parse_home", lambda e: e.parse_home(pages["home.html"], BASE_URL)),
+        ("home.html x12", "parse_home", lambda e: e.parse_home(big, BASE_URL)),
+        ("title_series.html", "parse_title", lambda e: e.parse_title(pages["title_series.html"], BASE_URL, "s")),
+        ("title_movie.html", "parse_stream_page", lambda e: e.parse_stream_page(pages["title_movie.html"], BASE_URL, None)),
+        ("search.html", "parse_search", lambda e: e.parse_search(pages["search.html"], BASE_URL)),
+    ]
+    print(f"\n{'page':<20} {'parser':<18} {'bs4 ms':>8} {'lxml ms':>8} {'speedup':>8}")
+    for page, fn_name, run in cases:
+        slow = bench(lambda: run(extract))
+        fast = bench(lambda: run(extract_lxml))
+        print(f"{page:<20} {fn_name:<18} {slow:>8.2f} {fast:>8.2f} {slow / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
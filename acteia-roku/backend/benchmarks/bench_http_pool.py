@@ -0,0 +1,228 @@
+"""Upstream connection setup: throwaway and default clients vs the shared HttpPool.
+
+A stand-in upstream runs in a child process: TLS on localhost with a
+self-signed certificate (made with the openssl CLI), HTTP/2 or HTTP/1.1
+by ALPN, ~20 KB HTML pages after a fixed service delay. Each client setup
+is driven by CONCURRENCY workers for DURATION seconds and reports
+requests/s, latency and how many connections the server saw.
+
+  - per-request client: a new AsyncClient per request (RobotsCache before)
+  - client defaults: one AsyncClient, httpx default limits (AsyncHttpClient before)
+  - pool HTTP/1.1 / pool HTTP/2: HttpPool as configured in app.utils.http_pool
+
+    cd backend && python benchmarks/bench_http_pool.py
+"""
+from __future__ import annotations
+import asyncio
+import multiprocessing
+import os
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import h11
+import h2.config
+import h2.connection
+import h2.events
+import httpx
+from loguru import logger
+
+CONCURRENCY = 16
+DURATION = 3.0
+SERVICE_DELAY = 0.005
+BODY = b"<html><body>" + b"<div class='item'><a href='/br/filme/x'>X</a></div>" * 400 + b"</body></html>"
+
+
+# ----------------------------
+# Stand-in upstream (child process)
+# ----------------------------
+
+async def _serve_h2(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    conn = h2.connection.H2Connection(config=h2.config.H2Configuration(client_side=False))
+    conn.initiate_connection()
+    writer.write(conn.data_to_send())
+    pending: Dict[int, bytes] = {}
+
+    def flush() -> None:
+        for stream_id in list(pending):
+            data = pending[stream_id]
+            window = min(conn.local_flow_control_window(stream_id), conn.max_outbound_frame_size)
+            while data and window > 0:
+                chunk, data = data[:window], data[window:]
+                conn.send_data(stream_id, chunk, end_stream=not data)
+                window = min(conn.local_flow_control_window(stream_id), conn.max_outbound_frame_size)
+            if data:
+                pending[stream_id] = data
+            else:
+                del pending[stream_id]
+        writer.write(conn.data_to_send())
+
+    async def respond(stream_id: int) -> None:
+        await asyncio.sleep(SERVICE_DELAY)
+        conn.send_headers(stream_id, [(":status", "200"), ("content-type", "text/html"), ("content-length", str(len(BODY)))])
+        pending[stream_id] = BODY
+        flush()
+
+    while True:
+        data = await reader.read(65536)
+        if not data:
+            break
+        for event in conn.receive_data(data):
+            if isinstance(event, h2.events.RequestReceived):
+                asyncio.ensure_future(respond(event.stream_id))
+            elif isinstance(event, (h2.events.WindowUpdated, h2.events.RemoteSettingsChanged)):
+                flush()
+            elif isinstance(event, h2.events.ConnectionTerminated):
+                writer.close()
+                return
+        writer.write(conn.data_to_send())
+    writer.close()
+
+
+async def _serve_h11(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    conn = h11.Connection(h11.SERVER)
+    while True:
+        event = conn.next_event()
+        if event is h11.NEED_DATA:
+            data = await reader.read(65536)
+            conn.receive_data(data)
+            if not data:
+                break
+            continue
+        if isinstance(event, h11.Request):
+            continue
+        if isinstance(event, h11.EndOfMessage):
+            await asyncio.sleep(SERVICE_DELAY)
+            headers = [("content-type", "text/html"), ("content-length", str(len(BODY)))]
+            writer.write(conn.send(h11.Response(status_code=200, headers=headers)))
+            writer.write(conn.send(h11.Data(data=BODY)))
+            writer.write(conn.send(h11.EndOfMessage()))
+            await writer.drain()
+            if conn.our_state is h11.MUST_CLOSE:
+                break
+            conn.start_next_cycle()
+            continue
+        if isinstance(event, h11.ConnectionClosed):
+            break
+    writer.close()
+
+
+def _server(cert: str, key: str, ports: "multiprocessing.Queue[int]", counter: "multiprocessing.Value") -> None:
+    ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    ctx.load_cert_chain(cert, key)
+    ctx.set_alpn_protocols(["h2", "http/1.1"])
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        with counter.get_lock():
+            counter.value += 1
+        ssl_object = writer.get_extra_info("ssl_object")
+        try:
+            if ssl_object is not None and ssl_object.selected_alpn_protocol() == "h2":
+                await _serve_h2(reader, writer)
+            else:
+                await _serve_h11(reader, writer)
+        except (ConnectionError, ssl.SSLError, h11.RemoteProtocolError):
+            writer.close()
+
+    async def main() -> None:
+        server = await asyncio.start_server(handle, "127.0.0.1", 0, ssl=ctx, backlog=512)
+        ports.put(server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
+
+
+def make_cert(tmp: str) -> Tuple[str, str]:
+    cert, key = os.path.join(tmp, "cert.pem"), os.path.join(tmp, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-keyout", key, "-out", cert,
+         "-days", "1", "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost"],
+        check=True, capture_output=True,
+    )
+    return cert, key
+
+
+# ----------------------------
+# Load
+# ----------------------------
+
+async def drive(get: Callable[[], Awaitable[int]]) -> Tuple[int, List[float], int]:
+    latencies: List[float] = []
+    errors = 0
+    stop = time.perf_counter() + DURATION
+
+    async def worker() -> None:
+        nonlocal errors
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            try:
+                status = await get()
+            except httpx.HTTPError:
+                status = 0
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    return len(latencies), sorted(latencies), errors
+
+
+async def main() -> None:
+    logger.remove()
+    from app.utils.http_pool import HttpPool
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cert, key = make_cert(tmp)
+        ports: "multiprocessing.Queue[int]" = multiprocessing.Queue()
+        counter = multiprocessing.Value("i", 0)
+        server = multiprocessing.Process(target=_server, args=(cert, key, ports, counter), daemon=True)
+        server.start()
+        url = f"https://localhost:{ports.get(timeout=10)}/br/serie/x"
+        verify = ssl.create_default_context(cafile=cert)
+
+        async def per_request() -> int:
+            async with httpx.AsyncClient(verify=verify) as client:
+                return (await client.get(url)).status_code
+
+        default_client = httpx.AsyncClient(verify=verify)
+        pool_h1 = HttpPool(http2=False, verify=verify)
+        pool_h2 = HttpPool(http2=True, verify=verify)
+        client_h1 = pool_h1.client()
+        client_h2 = pool_h2.client()
+
+        setups: List[Tuple[str, Callable[[], Awaitable[int]], Optional[HttpPool]]] = [
+            ("per-request client", per_request, None),
+            ("client defaults", lambda: _status(default_client.get(url)), None),
+            ("pool HTTP/1.1", lambda: _status(client_h1.get(url)), pool_h1),
+            ("pool HTTP/2", lambda: _status(client_h2.get(url)), pool_h2),
+        ]
+        print(f"{CONCURRENCY} workers x {DURATION:.0f}s, {len(BODY) // 1024} KB pages, {SERVICE_DELAY * 1000:.0f} ms service delay")
+        print(f"{'setup':<20} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'conns':>6} {'errors':>6}")
+        for name, get, pool in setups:
+            before = counter.value
+            done, latencies, errors = await drive(get)
+            p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0.0
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000 if latencies else 0.0
+            print(f"{name:<20} {done / DURATION:>8.0f} {p50:>8.1f} {p99:>8.1f} {counter.value - before:>6} {errors:>6}")
+            if pool is not None and pool.resolver is not None:
+                print(f"{'':<20} dns lookups {pool.resolver.stats['dns_lookups']}, cache hits {pool.resolver.stats['dns_hits']}")
+
+        await default_client.aclose()
+        await pool_h1.aclose()
+        await pool_h2.aclose()
+        server.terminate()
+
+
+async def _status(request: Awaitable[httpx.Response]) -> int:
+    return (await request).status_code
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
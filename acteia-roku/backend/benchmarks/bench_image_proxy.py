@@ -0,0 +1,103 @@
+"""Poster throughput of the image proxy, old pipeline vs ImageProxy.
+
+A "grid" is 30 distinct posters requested concurrently, like the first
+screen of a Roku row list. Every poster is a cache miss, so this measures
+fetch + decode + resize + encode. Upstream is an httpx mock serving
+1000x1500 JPEGs. The mock skips TCP/TLS, so the reused pool's savings on
+handshakes do not show up here.
+
+    cd backend && python benchmarks/bench_image_proxy.py
+"""
+from __future__ import annotations
+import asyncio
+import os
+import sys
+import time
+from io import BytesIO
+from typing import Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx
+from loguru import logger
+from PIL import Image as PILImage
+
+GRIDS = 6
+GRID_SIZE = 30
+WIDTH = 240
+QUALITY = 78
+
+
+def _poster_bytes() -> bytes:
+    img = PILImage.new("RGB", (1000, 1500))
+    # Some structure so the encoder has real work to do
+    for y in range(0, 1500, 50):
+        for x in range(0, 1000, 50):
+            img.paste(((x * 7) % 256, (y * 3) % 256, (x + y) % 256), (x, y, x + 50, y + 50))
+    out = BytesIO()
+    img.save(out, format="JPEG", quality=90)
+    return out.getvalue()
+
+
+POSTER = _poster_bytes()
+
+
+def _handler(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, headers={"content-type": "image/jpeg"}, content=POSTER)
+
+
+_transport = httpx.MockTransport(_handler)
+
+
+async def old_fetch_and_resize_image(url: str, width: Optional[int], quality: int) -> bytes:
+    # Baseline pipeline: new client per image, full decode and resize on the event loop
+    async with httpx.AsyncClient(timeout=10.0, follow_redirects=True, transport=_transport) as client:
+        resp = await client.get(url)
+        data = resp.content
+    img = PILImage.open(BytesIO(data)).convert("RGB")
+    if width and width > 0 and img.width > width:
+        img = img.resize((width, int(img.height * width / img.width)))
+    out = BytesIO()
+    img.save(out, format="JPEG", quality=quality)
+    return out.getvalue()
+
+
+async def _probe_loop_lag(stop: asyncio.Event) -> float:
+    worst = 0.0
+    while not stop.is_set():
+        t = time.perf_counter()
+        await asyncio.sleep(0.005)
+        worst = max(worst, time.perf_counter() - t - 0.005)
+    return worst
+
+
+async def _run(name: str, fetch) -> None:
+    stop = asyncio.Event()
+    lag = asyncio.create_task(_probe_loop_lag(stop))
+    start = time.perf_counter()
+    for g in range(GRIDS):
+        await asyncio.gather(*[fetch(f"http://img.test/{name}/{g}/{i}.jpg") for i in range(GRID_SIZE)])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    worst_lag = await lag
+    total = GRIDS * GRID_SIZE
+    print(f"{name:<12} {total / elapsed:>8.1f} posters/s   worst event-loop stall {worst_lag * 1000:>7.1f} ms")
+
+
+async def main() -> None:
+    logger.remove()
+    from app.image_proxy import ImageProxy
+
+    proxy = ImageProxy()
+    await proxy.startup()
+    await proxy._client.aclose()
+    proxy._client = httpx.AsyncClient(transport=_transport, follow_redirects=True)
+
+    await _run("old", lambda url: old_fetch_and_resize_image(url, WIDTH, QUALITY))
+    await _run("ImageProxy", lambda url: proxy.fetch_and_resize_image(url, WIDTH, QUALITY))
+    await _run("+webp", lambda url: proxy.fetch_and_resize_image(url, WIDTH, QUALITY, webp=True))
+    await proxy.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
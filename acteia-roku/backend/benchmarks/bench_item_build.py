@@ -0,0 +1,79 @@
+"""Title items per second, from a saved home page to response-ready models.
+
+  - extract: lxml parse_home on the fixture home page, and on one whose
+    main block repeats 12 times with the same slugs (cards linked from
+    poster and caption, titles listed in several sections) where items are
+    de-duplicated before their records are built
+  - validate: HomeResponse.model_validate of the extracted records, the one
+    validation an upstream page goes through (cached by body hash)
+  - search items: validated one model_validate call per item (before) vs
+    one TypeAdapter call for the list (now), on search results x20
+
+    cd backend && python benchmarks/bench_item_build.py
+"""
+from __future__ import annotations
+import os
+import sys
+import time
+from typing import Any, Callable, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from loguru import logger
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+BASE_URL = "https://acteia.ca/br"
+
+
+def rate(fn: Callable[[], Any], items: int, min_time: float = 0.5) -> Tuple[float, float]:
+    """(items per second, microseconds per call)"""
+    runs, start = 0, time.perf_counter()
+    while True:
+        fn()
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return items * runs / elapsed, elapsed / runs * 1e6
+
+
+def count(home: Any) -> int:
+    if isinstance(home, dict):
+        return len(home["featured"]) + sum(len(s["items"]) for s in home["sections"])
+    return len(home.featured) + sum(len(s.items) for s in home.sections)
+
+
+def main() -> None:
+    logger.remove()
+    from app.models import HomeResponse, TitleItem
+    from app.scraper import extract_lxml
+    from app.scraper.site_acteia import _title_items
+
+    with open(os.path.join(FIXTURES, "home.html"), encoding="utf-8") as fh:
+        home = fh.read()
+    start, end = home.index("<main"), home.index("</main>") + len("</main>")
+    repeated = home[:start] + home[start:end] * 12 + home[end:]
+
+    print(f"{'stage':<28} {'items':>6} {'items/s':>10} {'us/call':>9}")
+    for name, page in (("extract home.html", home), ("extract repeated x12", repeated)):
+        raw = extract_lxml.parse_home(page, BASE_URL)
+        n = count(raw)
+        per_s, us = rate(lambda: extract_lxml.parse_home(page, BASE_URL), n)
+        print(f"{name:<28} {n:>6} {per_s:>10.0f} {us:>9.0f}")
+
+    raw = extract_lxml.parse_home(home, BASE_URL)
+    n = count(raw)
+    per_s, us = rate(lambda: HomeResponse.model_validate(raw), n)
+    print(f"{'validate HomeResponse':<28} {n:>6} {per_s:>10.0f} {us:>9.0f}")
+
+    with open(os.path.join(FIXTURES, "search.html"), encoding="utf-8") as fh:
+        results = extract_lxml.parse_search(fh.read(), BASE_URL) * 20
+    for name, fn in (
+        ("search items, one by one", lambda: [TitleItem.model_validate(it) for it in results]),
+        ("search items, list adapter", lambda: _title_items(results)),
+    ):
+        per_s, us = rate(fn, len(results))
+        print(f"{name:<28} {len(results):>6} {per_s:>10.0f} {us:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
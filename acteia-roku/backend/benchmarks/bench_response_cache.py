@@ -0,0 +1,100 @@
+"""Warm /api/home: response_model + ORJSON + GZipMiddleware vs ResponseCache.
+
+Both routes return the same parsed HomeResponse (the fixture home page with
+its items repeated to real-site size) from an app with the same GZip
+middleware as app.main. Requests go through Starlette's TestClient, so the
+numbers include its overhead; the "work" column times only the per-request
+body work in isolation (validate + serialize + gzip vs a cache lookup).
+
+    cd backend && python benchmarks/bench_response_cache.py
+"""
+from __future__ import annotations
+import gzip
+import os
+import sys
+import time
+from typing import Callable, Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import orjson
+from fastapi import FastAPI, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from fastapi.testclient import TestClient
+from loguru import logger
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+BASE_URL = "https://acteia.ca/br"
+ROUNDS = 2000
+
+
+def per_call_us(fn: Callable[[], object], rounds: int = ROUNDS) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def main() -> None:
+    logger.remove()
+    from app.models import HomeResponse
+    from app.scraper import extract_lxml
+    from app.utils.response_cache import ResponseCache
+
+    with open(os.path.join(FIXTURES, "home.html"), encoding="utf-8") as fh:
+        raw = extract_lxml.parse_home(fh.read(), BASE_URL)
+    for section in raw["sections"]:
+        section["items"] = (section["items"] * 40)[:40]
+    home = HomeResponse.model_validate(raw)
+    cache = ResponseCache()
+
+    app = FastAPI(default_response_class=ORJSONResponse)
+    app.add_middleware(GZipMiddleware, minimum_size=512)
+
+    @app.get("/before", response_model=HomeResponse)
+    async def before():
+        return home
+
+    @app.get("/after", response_model=HomeResponse)
+    async def after(request: Request):
+        return cache.respond(request, "home", home, lambda h: h.model_dump(mode="json"))
+
+    client = TestClient(app)
+    size = len(client.get("/before").content)
+    etag = client.get("/after").headers["etag"]
+    print(f"home body {size / 1024:.0f} KB, {sum(len(s.items) for s in home.sections)} section items")
+
+    def old_work() -> bytes:
+        # What FastAPI does with a response_model: dump, validate, serialize
+        validated = HomeResponse.model_validate(home.model_dump())
+        return gzip.compress(orjson.dumps(validated.model_dump(mode="json")), 9)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", b"gzip")], "method": "GET", "path": "/"}
+    request = Request(scope)
+    cases: Dict[str, Dict[str, Callable[[], object]]] = {
+        "before (gzip)": {
+            "work": old_work,
+            "request": lambda: client.get("/before", headers={"accept-encoding": "gzip"}),
+        },
+        "cached gzip": {
+            "work": lambda: cache.respond(request, "home", home, lambda h: h),
+            "request": lambda: client.get("/after", headers={"accept-encoding": "gzip"}),
+        },
+        "cached br": {
+            "request": lambda: client.get("/after", headers={"accept-encoding": "br"}),
+        },
+        "cached 304": {
+            "request": lambda: client.get("/after", headers={"if-none-match": etag}),
+        },
+    }
+    print(f"\n{'case':<16} {'work us':>9} {'request us':>11}")
+    for name, fns in cases.items():
+        work = f"{per_call_us(fns['work']):>9.0f}" if "work" in fns else f"{'':>9}"
+        print(f"{name:<16} {work} {per_call_us(fns['request'], ROUNDS // 4):>11.0f}")
+    print(f"\n{cache.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Episode-page stream resolution: buffered get + parse vs streaming scan.
+
+The mocked upstream serves a ~3 MB episode page (heavy inline scripts) in
+64 KB chunks at a fixed bandwidth. The stream URL sits either near the top
+or at the bottom of the page. Reports time to the stream URL and the peak
+Python memory allocated while resolving it. The player URL is inside a
+script, which parse_episode_page cannot see (get_text skips scripts).
+
+    cd backend && python benchmarks/bench_stream_scan.py
+"""
+from __future__ import annotations
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx
+from loguru import logger
+
+CHUNK = 64 * 1024
+BANDWIDTH = 50 * 1024 * 1024  # bytes/s
+URL = "https://cdn.example/hls/s01e01/master.m3u8"
+SCRIPT = "<script>var cfg = " + "{'k': 'vvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvv'}, " * 50000 + ";</script>"
+
+
+def page(where: str) -> bytes:
+    player = f'<div class="player"><script>jwplayer().setup({{file: "{URL}"}});</script></div>'
+    body = player + SCRIPT if where == "top" else SCRIPT + player
+    return f"<html><head><title>Ep 1</title></head><body>{body}</body></html>".encode()
+
+
+class Throttled(httpx.AsyncByteStream):
+    def __init__(self, body: bytes) -> None:
+        self._body = body
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        for i in range(0, len(self._body), CHUNK):
+            await asyncio.sleep(CHUNK / BANDWIDTH)
+            yield self._body[i:i + CHUNK]
+
+
+def transport(body: bytes) -> httpx.MockTransport:
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, headers={"content-type": "text/html; charset=utf-8"}, stream=Throttled(body))
+    return httpx.MockTransport(handler)
+
+
+async def measure(run: Callable[[], Awaitable[Optional[str]]]) -> Tuple[float, float, Optional[str]]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    found = await run()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed * 1000, peak / 1024 / 1024, found
+
+
+async def main() -> None:
+    logger.remove()
+    from app.config import settings
+
+    settings.RESPECT_ROBOTS = False
+    settings.REFRESH_INTERVAL_SECONDS = 0
+    from app.scraper import extract
+    from app.scraper.http_client import AsyncHttpClient
+
+    print(f"{'stream url':<10} {'mode':<14} {'ms':>8} {'peak MB':>8}  found")
+    for where in ("top", "bottom"):
+        body = page(where)
+        rows: List[Tuple[str, float, float, Optional[str]]] = []
+        for mode in ("get + parse", "scan"):
+            client = AsyncHttpClient(disk=None)
+            await client.startup()
+            await client._client.aclose()
+            client._client = httpx.AsyncClient(transport=transport(body))
+            url = f"https://acteia.ca/br/episodio/{where}-{mode[0]}/"
+
+            async def buffered() -> Optional[str]:
+                resp = await client.get(url)
+                streams = extract.parse_episode_page(resp.text, str(settings.BASE_URL))
+                return streams[0]["url"] if streams else None
+
+            async def scanned() -> Optional[str]:
+                return await client.scan(url, extract.StreamUrlScanner().feed)
+
+            ms, peak, found = await measure(buffered if mode == "get + parse" else scanned)
+            rows.append((mode, ms, peak, found))
+            await client.shutdown()
+        for mode, ms, peak, found in rows:
+            print(f"{where:<10} {mode:<14} {ms:>8.1f} {peak:>8.1f}  {found}")
+        print(f"{'':<10} page size {len(body) / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,134 @@
+"""TitleIndex at catalog scale: build time, memory, query latency, snapshot.
+
+Generates 100k synthetic titles (Zipf-distributed words, Portuguese stop
+words and accents) and measures:
+  - time to index them and the memory the index holds afterwards
+  - search/typeahead latency per query shape (p50/p99, microseconds,
+    including building the returned TitleItems, ~10 us each)
+  - snapshot save and load time
+
+    cd backend && python benchmarks/bench_title_index.py [titles]
+"""
+from __future__ import annotations
+import asyncio
+import gc
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from loguru import logger
+
+STOP_WORDS = ["o", "a", "de", "do", "da", "the", "of", "e", "em", "no", "na", "and", "um", "uma"]
+SYLLABLES = ["ba", "ca", "ção", "de", "é", "fi", "go", "lâ", "ma", "ne", "ô", "pa", "ri", "sa", "tu", "vi", "xa", "zé", "lu", "mo"]
+
+
+def make_words(n: int, rng: random.Random) -> List[str]:
+    words = set()
+    while len(words) < n:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def make_titles(n: int, rng: random.Random) -> Tuple[List[Dict[str, object]], List[str]]:
+    words = make_words(20000, rng)
+    cum_weights = list(itertools.accumulate(1 / (i + 1) for i in range(len(words))))
+    titles = []
+    for i in range(n):
+        parts = rng.choices(words, cum_weights=cum_weights, k=rng.randint(1, 4))
+        if rng.random() < 0.5:
+            parts.insert(rng.randint(0, len(parts)), rng.choice(STOP_WORDS))
+        title = " ".join(parts).title()
+        if rng.random() < 0.2:
+            title += f" {rng.randint(1, 5)}"
+        kind = "filme" if i % 3 else "serie"
+        titles.append({
+            "id": f"br/{kind}/t{i}",
+            "slug": f"br/{kind}/t{i}",
+            "title": title,
+            "year": rng.randint(1970, 2025),
+            "poster": {"url": f"https://acteia.ca/br/wp-content/uploads/{i % 97}/t{i}-300x450.jpg"},
+        })
+    return titles, words
+
+
+def timings(fn: Callable[[str], object], queries: List[str]) -> Dict[str, float]:
+    samples = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(q)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        "p50": samples[len(samples) // 2] * 1e6,
+        "p99": samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e6,
+        "max": samples[-1] * 1e6,
+    }
+
+
+async def main() -> None:
+    logger.remove()
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    from app.models import TitleItem
+    from app.scraper.title_index import TitleIndex
+
+    rng = random.Random(7)
+    raw, words = make_titles(n, rng)
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    items = [TitleItem.model_validate(r) for r in raw]
+    del raw
+
+    index = TitleIndex(path=None, maxsize=n)
+    start = time.perf_counter()
+    index.add_many(items)
+    build = time.perf_counter() - start
+    # Dropping the items leaves what the index alone keeps alive (titles and
+    # slugs included); build time above is inflated by tracemalloc
+    del items
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    print(f"titles {len(index)}  tokens {index.stats['tokens']}")
+    print(f"build {build:.2f}s ({build / n * 1e6:.1f} us/title)  index memory ~{held / 1024 / 1024:.1f} MB")
+
+    popular, rare = words[:50], words[-2000:]
+    shapes = {
+        "1 char prefix": [rng.choice("abcdfglmnprstvxz") for _ in range(1000)],
+        "3 char prefix": [rng.choice(words)[:3] for _ in range(1000)],
+        "popular word": [rng.choice(popular) for _ in range(1000)],
+        "rare word": [rng.choice(rare) for _ in range(1000)],
+        "2 words + prefix": [f"{rng.choice(popular)} {rng.choice(words)[:2]}" for _ in range(1000)],
+        "stop word + word": [f"{rng.choice(STOP_WORDS)} {rng.choice(popular)}" for _ in range(1000)],
+        "miss": [f"qqq{i}" for i in range(1000)],
+    }
+    print(f"\n{'query':<18} {'limit':>5} {'p50 us':>8} {'p99 us':>8} {'max us':>8}")
+    for limit in (10, 50):
+        for name, queries in shapes.items():
+            t = timings(lambda q: index.search(q, limit), queries)
+            print(f"{name:<18} {limit:>5} {t['p50']:>8.0f} {t['p99']:>8.0f} {t['max']:>8.0f}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index.path = os.path.join(tmp, "titles.json")
+        index._dirty = True
+        start = time.perf_counter()
+        await index.save()
+        save = time.perf_counter() - start
+        size = os.path.getsize(index.path)
+        reloaded = TitleIndex(path=index.path, maxsize=n)
+        start = time.perf_counter()
+        await reloaded.startup()
+        load = time.perf_counter() - start
+        await reloaded.shutdown()
+    print(f"\nsnapshot {size / 1024 / 1024:.1f} MB  save {save:.2f}s  load {load:.2f}s  ({len(reloaded)} titles)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
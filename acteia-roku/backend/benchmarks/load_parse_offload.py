@@ -0,0 +1,136 @@
+"""Event-loop responsiveness while large title pages are being parsed.
+
+Drives the FastAPI app in-process (ASGI transport) against a mocked upstream.
+Cold /api/title requests for big pages run in concurrent waves. Meanwhile,
+/healthz and an already cached /api/home are polled every few milliseconds.
+This is repeated for each ParsePool executor kind.
+
+    cd backend && python benchmarks/load_parse_offload.py
+"""
+from __future__ import annotations
+import asyncio
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx
+from loguru import logger
+
+CONCURRENT_TITLES = 8
+WAVES = 4
+UPSTREAM_LATENCY = 0.02
+PROBE_INTERVAL = 0.005
+
+
+def big_title_page(n: int) -> bytes:
+    episodes = "".join(
+        f'<li><a href="/br/serie/s{n}/ep-{i}" title="Episódio {i}">Episódio {i}</a></li>' for i in range(1, 1500)
+    )
+    filler = "".join(f"<p>Paragrafo {i} sobre a serie numero {n}, lancada em 2019.</p>" for i in range(3000))
+    related = "".join(
+        f'<div class="item"><a href="/br/filme/r{i}" title="Relacionado {i}"><img src="/img/r{i}.jpg"></a></div>'
+        for i in range(400)
+    )
+    return (
+        f'<html><body><h1>Serie {n}</h1><div class="synopsis">Sinopse da serie {n}</div>'
+        f'<div class="poster"><img src="/img/s{n}.jpg"></div><ul class="episodes">{episodes}</ul>'
+        f"{filler}{related}</body></html>"
+    ).encode()
+
+
+HOME = (
+    '<html><body><section><h2>Filmes</h2>'
+    + "".join(f'<div class="item"><a href="/br/filme/f{i}" title="Filme {i}"><img src="/img/f{i}.jpg"></a></div>' for i in range(30))
+    + "</section></body></html>"
+).encode()
+
+
+async def upstream(request: httpx.Request) -> httpx.Response:
+    await asyncio.sleep(UPSTREAM_LATENCY)
+    path = request.url.path.rstrip("/")
+    body = HOME if path == "/br" else big_title_page(hash(path) % 1000)
+    return httpx.Response(200, headers={"content-type": "text/html; charset=utf-8"}, content=body)
+
+
+def pct(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+
+async def run_mode(app, kind: str) -> Dict[str, float]:
+    from app.scraper.parse_pool import ParsePool
+
+    app.state.scraper._parser = ParsePool(kind, workers=2)
+    app.state.scraper._parsed.clear()
+    await app.router.startup()
+    await app.state.http_client._client.aclose()
+    app.state.http_client._client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+    app.state.http_client._cache.clear()
+
+    probes: Dict[str, List[float]] = {"/healthz": [], "/api/home": []}
+    title_times: List[float] = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60) as client:
+        await client.get("/api/home")
+        # Spin up pool workers outside the measurement
+        await client.get("/api/title/br/warmup")
+        stop = asyncio.Event()
+
+        async def probe(path: str) -> None:
+            while not stop.is_set():
+                t = time.perf_counter()
+                r = await client.get(path)
+                r.raise_for_status()
+                probes[path].append(time.perf_counter() - t)
+                await asyncio.sleep(PROBE_INTERVAL)
+
+        async def title(slug: str) -> None:
+            t = time.perf_counter()
+            r = await client.get(f"/api/title/{slug}")
+            r.raise_for_status()
+            title_times.append(time.perf_counter() - t)
+
+        probers = [asyncio.create_task(probe(p)) for p in probes]
+        start = time.perf_counter()
+        for wave in range(WAVES):
+            await asyncio.gather(*[title(f"br/serie/{kind}-{wave}-{i}") for i in range(CONCURRENT_TITLES)])
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await asyncio.gather(*probers)
+    await app.router.shutdown()
+
+    return {
+        "titles_per_s": len(title_times) / elapsed,
+        "title_p50": pct(title_times, 0.5),
+        "healthz_p50": pct(probes["/healthz"], 0.5),
+        "healthz_p99": pct(probes["/healthz"], 0.99),
+        "healthz_max": max(probes["/healthz"]) * 1000,
+        "home_p50": pct(probes["/api/home"], 0.5),
+        "home_p99": pct(probes["/api/home"], 0.99),
+    }
+
+
+async def main() -> None:
+    logger.remove()
+    from app.config import settings
+
+    settings.RESPECT_ROBOTS = False
+    settings.REFRESH_INTERVAL_SECONDS = 0
+    settings.IMAGE_PRERENDER_CONCURRENCY = 0
+    from app.main import app
+
+    app.state.limiter.enabled = False
+    print(f"{'executor':<8} {'titles/s':>8} {'title p50':>9} {'healthz p50':>11} {'p99':>7} {'max':>7} {'home p50':>8} {'p99':>7}  (ms)")
+    for kind in ("inline", "thread", "process"):
+        r = await run_mode(app, kind)
+        print(
+            f"{kind:<8} {r['titles_per_s']:>8.1f} {r['title_p50']:>9.0f} {r['healthz_p50']:>11.1f} "
+            f"{r['healthz_p99']:>7.1f} {r['healthz_max']:>7.1f} {r['home_p50']:>8.1f} {r['home_p99']:>7.1f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
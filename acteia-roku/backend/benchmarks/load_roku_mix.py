@@ -0,0 +1,469 @@
+"""Roku traffic mixes against the real app and a local upstream stand-in.
+
+Two child processes run under uvicorn:
+
+  - a fake upstream serving the fixture pages (title, episode and search
+    pages as recorded; the home page built from the fixture's section
+    markup at real-site size, SECTIONS x ITEMS titles), robots.txt and
+    generated JPEG posters, each after a configurable latency plus jitter,
+    counting every request it answers by kind
+  - app.main with BASE_URL pointing at the stand-in and rate limits off,
+    started fresh (cold caches) for each scenario
+
+DEVICES concurrent simulated Roku devices then play one scenario each,
+ROUNDS times:
+
+  - home_burst: compact home, its next page, compact sections
+  - grid_images: compact home, then every poster of it, 6 at a time
+  - title_stream: title details, then the stream (a random episode for series)
+  - search_typing: typeahead on each keystroke of a title, then the search
+
+Per scenario: requests/s, p50/p95/p99/max latency (overall and per
+endpoint), status counts, upstream requests by kind and the app's peak
+RSS. Results are written as JSON; pass an earlier file to --compare to
+print the change.
+
+    cd backend && python benchmarks/load_roku_mix.py
+    cd backend && python benchmarks/load_roku_mix.py --devices 16 --compare benchmarks/results/<earlier>.json
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter as Tally
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND)
+
+import httpx
+
+FIXTURES = os.path.join(BACKEND, "benchmarks", "fixtures")
+# Served for every .m3u8 the fixtures link to, so stream probes see a real master playlist
+MASTER_PLAYLIST = (
+    b"#EXTM3U\n"
+    b"#EXT-X-STREAM-INF:BANDWIDTH=1200000,RESOLUTION=854x480\n480p.m3u8\n"
+    b"#EXT-X-STREAM-INF:BANDWIDTH=5000000,RESOLUTION=1920x1080\n1080p.m3u8\n"
+)
+RESULTS = os.path.join(BACKEND, "benchmarks", "results")
+IMAGE_FANOUT = 6
+WORDS = (
+    "Duna", "Noite", "Cidade", "Sombra", "Mar", "Fogo", "Reino", "Lobo", "Estrela", "Vento",
+    "Segredo", "Rio", "Ouro", "Jardim", "Tempo", "Guerra", "Lua", "Casa", "Caminho", "Silencio",
+)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def localhost_address() -> str:
+    # The app reaches the stand-in as "localhost" (image URLs must not be IP literals),
+    # so listen where the resolver sends it first
+    return socket.getaddrinfo("localhost", None, type=socket.SOCK_STREAM)[0][4][0]
+
+
+# ----------------------------
+# Upstream stand-in (child process)
+# ----------------------------
+
+class FakeUpstream:
+    """ASGI app answering like the upstream site, after latency + uniform(0, jitter) seconds."""
+
+    def __init__(self, origin: str, opts: Dict[str, Any]) -> None:
+        self.origin = origin
+        self.latency = opts["latency_ms"] / 1000
+        self.jitter = opts["jitter_ms"] / 1000
+        self.image_latency = opts["image_latency_ms"] / 1000
+        self.rng = random.Random(opts["seed"])
+        self.counts: Tally = Tally()
+        self.pages = {name: self._fixture(name) for name in ("title_movie", "title_series", "episode", "search")}
+        self.pages["home"] = self._home(opts["sections"], opts["items"])
+        self.image = self._image()
+
+    def _fixture(self, name: str) -> bytes:
+        with open(os.path.join(FIXTURES, f"{name}.html"), encoding="utf-8") as fh:
+            text = fh.read()
+        for host, prefix in (("cdn.acteia.ca", "/cdn"), ("cdn2.acteia.ca", "/cdn2"), ("acteia.ca", "")):
+            text = text.replace(f"https://{host}", self.origin + prefix)
+        return text.encode()
+
+    def _home(self, sections: int, items: int) -> bytes:
+        page = self._fixture("home").decode()
+        start, end = page.index('<main id="content">'), page.index("</main>")
+        kinds = ("filme", "serie", "anime")
+        blocks = []
+        for s in range(sections):
+            cards = []
+            for i in range(items):
+                n = s * items + i
+                slug = f"{WORDS[n % len(WORDS)].lower()}-{WORDS[(n * 7 + 3) % len(WORDS)].lower()}-{n}"
+                title = f"{WORDS[n % len(WORDS)]} {WORDS[(n * 7 + 3) % len(WORDS)]} {n}"
+                href = f"{self.origin}/br/{kinds[n % len(kinds)]}/{slug}/"
+                cards.append(
+                    f'<article class="item movies"><div class="poster"><a href="{href}">'
+                    f'<img src="{self.origin}/br/wp-content/uploads/bench/{slug}-300x450.jpg" alt="{title}"></a></div>'
+                    f'<div class="data"><h3><a href="{href}">{title}</a></h3><span>2024</span></div></article>'
+                )
+            blocks.append(
+                f'<section class="home-section" id="secao-{s}"><header><h2 class="section-title">Seção {s + 1}</h2></header>'
+                f'<div class="items">{"".join(cards)}</div></section>'
+            )
+        return (page[:start] + '<main id="content">' + "".join(blocks) + page[end:]).encode()
+
+    @staticmethod
+    def _image() -> bytes:
+        from PIL import Image
+
+        out = io.BytesIO()
+        Image.effect_noise((600, 900), 48).convert("RGB").save(out, format="JPEG", quality=85)
+        return out.getvalue()
+
+    def route(self, path: str, query: str) -> Tuple[str, int, str, bytes]:
+        """(kind, status, content type, body) for one request."""
+        html = "text/html; charset=utf-8"
+        if path == "/robots.txt":
+            return "robots", 200, "text/plain", b"User-agent: *\nDisallow: /br/wp-admin/\n"
+        if path.endswith(".m3u8"):
+            return "playlist", 200, "application/vnd.apple.mpegurl", MASTER_PLAYLIST
+        if path.endswith(".mp4"):
+            return "media", 200, "video/mp4", b"\x00\x00\x00\x18ftypmp42"
+        if path.startswith(("/br/wp-content/", "/cdn")):
+            return "image", 200, "image/jpeg", self.image
+        if path.rstrip("/") == "/br":
+            if "s" in parse_qs(query):
+                return "search", 200, html, self.pages["search"]
+            return "home", 200, html, self.pages["home"]
+        if path.startswith("/br/search/"):
+            return "search", 200, html, self.pages["search"]
+        if path.startswith("/br/filme/"):
+            return "title", 200, html, self.pages["title_movie"]
+        if path.startswith(("/br/serie/", "/br/anime/")):
+            return "title", 200, html, self.pages["title_series"]
+        if path.startswith("/br/episodio/"):
+            return "episode", 200, html, self.pages["episode"]
+        return "other", 404, html, b"<html><body>Not found</body></html>"
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            return
+        if scope["path"] == "/__stats":
+            status, ctype, body = 200, "application/json", json.dumps(self.counts).encode()
+        else:
+            kind, status, ctype, body = self.route(scope["path"], scope["query_string"].decode())
+            self.counts[kind] += 1
+            base = self.image_latency if kind == "image" else self.latency
+            await asyncio.sleep(base + self.rng.uniform(0, self.jitter))
+        headers = [(b"content-type", ctype.encode()), (b"content-length", str(len(body)).encode())]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+def serve_upstream(host: str, port: int, opts: Dict[str, Any]) -> None:
+    import uvicorn
+
+    app = FakeUpstream(f"http://localhost:{port}", opts)
+    uvicorn.run(app, host=host, port=port, log_level="warning", access_log=False, lifespan="off")
+
+
+def serve_app(port: int, env: Dict[str, str]) -> None:
+    os.environ.update(env)
+    from loguru import logger
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    import uvicorn
+    from app.main import app
+
+    app.state.limiter.enabled = False
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+
+
+async def wait_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{url} did not come up")
+            await asyncio.sleep(0.1)
+
+
+def peak_rss_mb(pid: int) -> Optional[float]:
+    # Linux only; VmHWM is the high-water mark of the resident set
+    try:
+        with open(f"/proc/{pid}/status") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+# ----------------------------
+# Simulated devices
+# ----------------------------
+
+class Recorder:
+    def __init__(self) -> None:
+        self.samples: List[Tuple[str, float, str]] = []
+
+    async def get(self, client: httpx.AsyncClient, op: str, url: str, **params: Any) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            resp = await client.get(url, params=params or None)
+            await resp.aread()
+            status = str(resp.status_code)
+        except httpx.HTTPError as exc:
+            resp, status = None, type(exc).__name__
+        self.samples.append((op, time.perf_counter() - start, status))
+        return resp if resp is not None and resp.status_code == 200 else None
+
+
+def rows_of(resp: Optional[httpx.Response]) -> List[Dict[str, Any]]:
+    return resp.json().get("rows", []) if resp is not None else []
+
+
+async def home_burst(client: httpx.AsyncClient, rec: Recorder, rng: random.Random, rounds: int) -> None:
+    for _ in range(rounds):
+        home = await rec.get(client, "home", "/api/home", format="compact")
+        if home is not None and "next" in home.json():
+            await rec.get(client, "home", "/api/home", format="compact", cursor=home.json()["next"])
+        await rec.get(client, "sections", "/api/sections", format="compact")
+
+
+async def grid_images(client: httpx.AsyncClient, rec: Recorder, rng: random.Random, rounds: int) -> None:
+    posters = [p for row in rows_of(await rec.get(client, "home", "/api/home", format="compact")) for p in row["p"] if p]
+    gate = asyncio.Semaphore(IMAGE_FANOUT)
+
+    async def poster(path: str) -> None:
+        async with gate:
+            await rec.get(client, "image", path)
+
+    for _ in range(rounds):
+        await asyncio.gather(*(poster(p) for p in posters))
+
+
+async def title_stream(client: httpx.AsyncClient, rec: Recorder, rng: random.Random, rounds: int) -> None:
+    slugs = [s for row in rows_of(await rec.get(client, "sections", "/api/sections", format="compact")) for s in row["s"]]
+    for _ in range(rounds):
+        if not slugs:
+            return
+        slug = rng.choice(slugs)
+        details = await rec.get(client, "title", f"/api/title/{slug}")
+        episodes = details.json().get("episodes", []) if details is not None else []
+        if episodes:
+            await rec.get(client, "stream", f"/api/stream/{slug}", episode=rng.choice(episodes)["id"])
+        else:
+            await rec.get(client, "stream", f"/api/stream/{slug}")
+
+
+async def search_typing(client: httpx.AsyncClient, rec: Recorder, rng: random.Random, rounds: int) -> None:
+    names = [n for row in rows_of(await rec.get(client, "home", "/api/home", format="compact")) for n in row["n"]]
+    for _ in range(rounds):
+        if not names:
+            return
+        name = rng.choice(names)
+        for i in range(2, len(name) + 1):
+            await rec.get(client, "typeahead", "/api/typeahead", q=name[:i], limit=10)
+        await rec.get(client, "search", "/api/search", q=name, format="compact")
+
+
+SCENARIOS: Dict[str, Callable[[httpx.AsyncClient, Recorder, random.Random, int], Awaitable[None]]] = {
+    "home_burst": home_burst,
+    "grid_images": grid_images,
+    "title_stream": title_stream,
+    "search_typing": search_typing,
+}
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    if not values:
+        return {}
+
+    def pct(p: float) -> float:
+        return round(values[min(len(values) - 1, int(len(values) * p))] * 1000, 2)
+
+    return {"p50": pct(0.5), "p95": pct(0.95), "p99": pct(0.99), "max": round(values[-1] * 1000, 2)}
+
+
+async def upstream_counts(upstream: str) -> Dict[str, int]:
+    async with httpx.AsyncClient() as client:
+        return (await client.get(f"{upstream}/__stats")).json()
+
+
+async def run_scenario(name: str, args: argparse.Namespace, upstream: str, workdir: str) -> Dict[str, Any]:
+    port = free_port()
+    env = {
+        "BASE_URL": f"{upstream}/br",
+        "RESPECT_ROBOTS": "true",
+        "DISK_CACHE_PATH": os.path.join(workdir, f"{name}.db"),
+        "PROFILER_ENABLED": "false",
+    }
+    app_proc = multiprocessing.get_context("spawn").Process(target=serve_app, args=(port, env), daemon=True)
+    app_proc.start()
+    base = f"http://127.0.0.1:{port}"
+    try:
+        await wait_ready(f"{base}/healthz")
+        before = await upstream_counts(upstream)
+        rec = Recorder()
+        limits = httpx.Limits(max_connections=args.devices * IMAGE_FANOUT, max_keepalive_connections=args.devices * IMAGE_FANOUT)
+        # Roku's roUrlTransfer asks for gzip only
+        async with httpx.AsyncClient(
+            base_url=base, limits=limits, timeout=60, headers={"accept-encoding": "gzip"}
+        ) as client:
+            start = time.perf_counter()
+            await asyncio.gather(
+                *(
+                    SCENARIOS[name](client, rec, random.Random(args.seed * 1000 + device), args.rounds)
+                    for device in range(args.devices)
+                )
+            )
+            elapsed = time.perf_counter() - start
+            app_stats = (await client.get("/stats")).json()
+        after = await upstream_counts(upstream)
+        rss = peak_rss_mb(app_proc.pid)
+    finally:
+        app_proc.terminate()
+        app_proc.join(10)
+
+    ops: Dict[str, List[float]] = {}
+    for op, seconds, _ in rec.samples:
+        ops.setdefault(op, []).append(seconds)
+    statuses = Tally(status for _, _, status in rec.samples)
+    return {
+        "requests": len(rec.samples),
+        "errors": sum(n for status, n in statuses.items() if status not in ("200", "304")),
+        "status": dict(sorted(statuses.items())),
+        "seconds": round(elapsed, 3),
+        "rps": round(len(rec.samples) / elapsed, 1),
+        "latency_ms": percentiles([s for _, s, _ in rec.samples]),
+        "ops": {op: {"count": len(v), **percentiles(v)} for op, v in sorted(ops.items())},
+        "upstream": {kind: n - before.get(kind, 0) for kind, n in sorted(after.items()) if n - before.get(kind, 0)},
+        "peak_rss_mb": rss,
+        "app_stats": app_stats,
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND, capture_output=True, text=True, timeout=5)
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+def print_results(results: Dict[str, Any]) -> None:
+    print(f"{'scenario':<14} {'reqs':>6} {'err':>4} {'req/s':>7} {'p50':>7} {'p95':>7} {'p99':>7} {'max':>7} {'upstream':>9} {'rss MB':>7}")
+    for name, r in results["scenarios"].items():
+        lat = r["latency_ms"]
+        print(
+            f"{name:<14} {r['requests']:>6} {r['errors']:>4} {r['rps']:>7.1f} {lat.get('p50', 0):>7.1f} "
+            f"{lat.get('p95', 0):>7.1f} {lat.get('p99', 0):>7.1f} {lat.get('max', 0):>7.1f} "
+            f"{sum(r['upstream'].values()):>9} {r['peak_rss_mb'] or 0:>7.1f}"
+        )
+        for op, o in r["ops"].items():
+            print(f"  {op:<12} {o['count']:>6} {'':>4} {'':>7} {o['p50']:>7.1f} {o['p95']:>7.1f} {o['p99']:>7.1f} {o['max']:>7.1f}")
+
+
+def print_comparison(old: Dict[str, Any], new: Dict[str, Any]) -> None:
+    print(f"\nvs {old['meta'].get('git') or '?'} ({old['meta']['started']})")
+    print(f"{'scenario':<14} {'req/s':>16} {'p95 ms':>16} {'upstream':>12} {'rss MB':>16}")
+
+    def change(a: Optional[float], b: Optional[float]) -> str:
+        return "-" if a is None or b is None else f"{a:.1f} -> {b:.1f}"
+
+    for name, r in new["scenarios"].items():
+        o = old["scenarios"].get(name)
+        if o is None:
+            continue
+        print(
+            f"{name:<14} {change(o['rps'], r['rps']):>16} "
+            f"{change(o['latency_ms'].get('p95'), r['latency_ms'].get('p95')):>16} "
+            f"{sum(o['upstream'].values()):>5} -> {sum(r['upstream'].values()):<4} "
+            f"{change(o['peak_rss_mb'], r['peak_rss_mb']):>16}"
+        )
+
+
+async def main(args: argparse.Namespace) -> None:
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"unknown scenarios: {', '.join(unknown)} (choose from {', '.join(SCENARIOS)})")
+    opts = {k: getattr(args, k) for k in ("latency_ms", "jitter_ms", "image_latency_ms", "sections", "items", "seed")}
+    up_port = free_port()
+    upstream_proc = multiprocessing.get_context("spawn").Process(
+        target=serve_upstream, args=(localhost_address(), up_port, opts), daemon=True
+    )
+    upstream_proc.start()
+    upstream = f"http://localhost:{up_port}"
+    results: Dict[str, Any] = {
+        "meta": {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "devices": args.devices,
+            "rounds": args.rounds,
+            **opts,
+        },
+        "scenarios": {},
+    }
+    try:
+        await wait_ready(f"{upstream}/__stats")
+        with tempfile.TemporaryDirectory() as workdir:
+            for name in names:
+                results["scenarios"][name] = await run_scenario(name, args, upstream, workdir)
+    finally:
+        upstream_proc.terminate()
+        upstream_proc.join(10)
+
+    print_results(results)
+    out = args.out or os.path.join(RESULTS, f"load_{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as fh:
+        json.dump(results, fh, indent=2, ensure_ascii=False)
+    print(f"\nwrote {out}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            print_comparison(json.load(fh), results)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated, run in this order")
+    parser.add_argument("--devices", type=int, default=8, help="concurrent simulated devices")
+    parser.add_argument("--rounds", type=int, default=5, help="times each device plays the scenario")
+    parser.add_argument("--latency-ms", type=float, default=40, help="upstream page latency")
+    parser.add_argument("--image-latency-ms", type=float, default=60, help="upstream image latency")
+    parser.add_argument("--jitter-ms", type=float, default=20, help="added uniform(0, jitter) to every upstream response")
+    parser.add_argument("--sections", type=int, default=8, help="home page sections")
+    parser.add_argument("--items", type=int, default=24, help="titles per home section")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="results file (default benchmarks/results/load_<time>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,75 @@
+import asyncio
+from typing import List, Optional
+from app.scraper.catalog import Catalog, CatalogWriter
+from app.scraper.crawler import CatalogCrawler
+
+
+class _Crawler(CatalogCrawler):
+    """Crawls that return `result` (or raise it) without going upstream."""
+
+    def __init__(self, result: object, retry: float) -> None:
+        super().__init__(Catalog(None), directory="unused", retry=retry)
+        self.result = result
+        self.attempts: List[float] = []
+
+    async def crawl(self) -> Optional[str]:
+        self.attempts.append(asyncio.get_running_loop().time())
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result  # type: ignore[return-value]
+
+
+def _run_for(crawler: _Crawler, seconds: float, interval: float) -> int:
+    snapshots = 0
+
+    async def on_snapshot() -> None:
+        nonlocal snapshots
+        snapshots += 1
+
+    async def main() -> None:
+        crawler.start(on_snapshot, interval)
+        await asyncio.sleep(seconds)
+        await crawler.shutdown()
+
+    asyncio.run(main())
+    return snapshots
+
+
+def test_failed_crawls_back_off():
+    crawler = _Crawler(None, retry=0.05)
+    assert _run_for(crawler, 0.5, interval=3600) == 0
+    # Attempts at 0, 0.05, 0.15, 0.35 (then 0.75): not one per loop turn
+    assert 3 <= len(crawler.attempts) <= 5
+    gaps = [b - a for a, b in zip(crawler.attempts, crawler.attempts[1:])]
+    assert gaps == sorted(gaps)
+    assert crawler.stats["failures"] == len(crawler.attempts)
+
+
+def test_crashing_crawls_back_off():
+    crawler = _Crawler(RuntimeError("boom"), retry=0.05)
+    _run_for(crawler, 0.5, interval=3600)
+    assert 3 <= len(crawler.attempts) <= 5
+
+
+def test_backoff_is_capped_by_interval():
+    crawler = _Crawler(None, retry=10)
+    _run_for(crawler, 0.35, interval=0.1)
+    assert 3 <= len(crawler.attempts) <= 5
+
+
+def test_next_crawl_timed_from_last_attempt():
+    # The snapshot never loads (catalog.created stays None), which must not mean "crawl again now"
+    crawler = _Crawler("v1", retry=0.01)
+    assert _run_for(crawler, 0.3, interval=3600) == 1
+    assert len(crawler.attempts) == 1
+
+
+def test_versions_committed_in_the_same_second_do_not_collide(tmp_path):
+    first, second = CatalogWriter(str(tmp_path), "base"), CatalogWriter(str(tmp_path), "base")
+    first.add("k", b"1")
+    second.add("k", b"2")
+    a = first.commit(keep=3)
+    b = second.commit(keep=3)
+    assert a != b
+    assert (tmp_path / a / "records.bin").read_bytes() == b"1"
+    assert (tmp_path / "CURRENT").read_text() == b
@@ -0,0 +1,124 @@
+import asyncio
+import time
+from typing import List, Optional
+import httpx
+from app.config import settings
+from app.scraper.http_client import AsyncHttpClient
+from app.scraper.robots import RobotsRules
+from app.utils.disk_cache import DiskCache
+from app.utils.scheduler import INTERACTIVE, UpstreamScheduler
+
+URL = "https://example.test/page"
+
+
+def _client(handler, capacity: int = 4, disk: Optional[DiskCache] = None) -> AsyncHttpClient:
+    client = AsyncHttpClient(disk=disk, scheduler=UpstreamScheduler(capacity=capacity, deadlines={}))
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+def test_get_after_last_waiter_cancelled_starts_a_new_fetch(monkeypatch):
+    monkeypatch.setattr(settings, "RESPECT_ROBOTS", False)
+
+    async def main() -> None:
+        calls: List[int] = []
+        started = asyncio.Event()
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            calls.append(1)
+            if len(calls) == 1:
+                started.set()
+                await asyncio.Event().wait()
+            return httpx.Response(200, headers={"content-type": "text/html"}, content=b"ok")
+
+        client = _client(handler)
+        first = asyncio.ensure_future(client.get(URL))
+        await started.wait()
+        # The fetch is cancelled along with its only waiter; a caller arriving
+        # before that cancellation lands must not join it
+        first.cancel()
+        second = asyncio.ensure_future(client.get(URL))
+        await asyncio.gather(first, return_exceptions=True)
+        resp = await second
+        assert resp.status_code == 200 and resp.content == b"ok"
+        assert len(calls) == 2
+        await client._client.aclose()
+
+    asyncio.run(main())
+
+
+def test_refresh_skips_pages_robots_disallows(monkeypatch):
+    monkeypatch.setattr(settings, "RESPECT_ROBOTS", True)
+    monkeypatch.setattr(settings, "BASE_URL", "https://example.test/")
+
+    async def main() -> None:
+        calls: List[str] = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            calls.append(str(request.url))
+            return httpx.Response(200, headers={"content-type": "text/html"}, content=b"ok")
+
+        client = _client(handler)
+        client.robots._hosts["https://example.test"] = (
+            RobotsRules.parse("User-agent: *\nDisallow: /private"),
+            time.monotonic() + 60,
+        )
+        client._demand.update(["https://example.test/private/a", URL])
+        # The base URL is only kept warm once somebody asks for it
+        assert await client._refresh_targets() == [URL]
+
+        client.refresh("https://example.test/private/b")
+        await asyncio.gather(*client._background)
+        assert calls == []
+        await client._client.aclose()
+
+    asyncio.run(main())
+
+
+def _found(text: str, final: bool) -> Optional[str]:
+    return text if final else None
+
+
+def test_scan_queued_behind_a_fetch_keeps_its_own_ticket_and_joins_it(monkeypatch):
+    monkeypatch.setattr(settings, "RESPECT_ROBOTS", False)
+
+    async def main() -> None:
+        calls: List[str] = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            calls.append(str(request.url))
+            return httpx.Response(200, headers={"content-type": "text/html"}, content=b"body")
+
+        client = _client(handler, capacity=1)
+        holder = client._scheduler.slot(INTERACTIVE)
+        await holder.__aenter__()
+        scan = asyncio.ensure_future(client.scan(URL, _found))
+        await asyncio.sleep(0)
+        get = asyncio.ensure_future(client.get(URL))
+        while URL not in client._tickets:
+            await asyncio.sleep(0)
+        assert client._scan_tickets[URL] is not client._tickets[URL]
+        await holder.__aexit__(None, None, None)
+        assert await scan == "body"
+        assert (await get).content == b"body"
+        assert calls == [URL]
+        assert client.stats["scans"] == 0
+        await client._client.aclose()
+
+    asyncio.run(main())
+
+
+def test_scan_serves_a_body_cached_on_disk(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "RESPECT_ROBOTS", False)
+
+    async def main() -> None:
+        async def handler(request: httpx.Request) -> httpx.Response:
+            raise AssertionError("scan went upstream")
+
+        client = _client(handler, disk=DiskCache(str(tmp_path / "cache.db"), 1 << 20))
+        await client._disk_set(URL, (200, {"content-type": "text/html"}, b"stored"))
+        assert await client.scan(URL, _found) == "stored"
+        assert client.stats["disk_hits"] == 1
+        await client._client.aclose()
+
+    asyncio.run(main())
@@ -0,0 +1,61 @@
+import asyncio
+from io import BytesIO
+from typing import List
+import httpx
+import pytest
+from fastapi import HTTPException
+from PIL import Image as PILImage
+from app.config import settings
+from app.image_proxy import ImageProxy
+from app.utils.scheduler import UpstreamScheduler
+
+URL = "https://images.example.test/poster.jpg"
+
+
+def _jpeg() -> bytes:
+    out = BytesIO()
+    PILImage.new("RGB", (600, 900), (200, 40, 40)).save(out, format="JPEG")
+    return out.getvalue()
+
+
+def _proxy(handler) -> ImageProxy:
+    proxy = ImageProxy(scheduler=UpstreamScheduler(capacity=4, deadlines={}))
+    proxy._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return proxy
+
+
+def test_concurrent_misses_share_one_download():
+    async def main() -> None:
+        calls: List[str] = []
+        body = _jpeg()
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            calls.append(str(request.url))
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, headers={"content-type": "image/jpeg"}, content=body)
+
+        proxy = _proxy(handler)
+        results = await asyncio.gather(*(proxy.fetch_and_resize_image(URL, 300, 80) for _ in range(5)))
+        assert calls == [URL]
+        assert len({r.etag for r in results}) == 1
+        assert proxy.stats["coalesced"] == 4
+        await proxy.shutdown()
+
+    asyncio.run(main())
+
+
+def test_oversized_image_is_not_buffered(monkeypatch):
+    monkeypatch.setattr(settings, "MAX_RESPONSE_MB", 1)
+
+    async def main() -> None:
+        async def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, headers={"content-type": "image/jpeg"}, content=b"\0" * (2 * 1024 * 1024))
+
+        proxy = _proxy(handler)
+        with pytest.raises(HTTPException) as exc:
+            await proxy.fetch_and_resize_image(URL, 300, 80)
+        assert exc.value.status_code == 502
+        assert proxy.stats["too_large"] == 1
+        await proxy.shutdown()
+
+    asyncio.run(main())
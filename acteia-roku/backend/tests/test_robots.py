@@ -0,0 +1,15 @@
+from app.scraper.robots import RobotsRules, _normalize
+
+
+def test_pattern_rule_length_is_measured_after_normalizing():
+    # %7e normalizes to ~, so the wildcard rule is 7 characters long, not 9,
+    # and the 8-character Allow is the longer match
+    rules = RobotsRules.parse("User-agent: *\nDisallow: /%7euser*\nAllow: /~user/p")
+    assert not rules.allowed(_normalize("/~user/x"))
+    assert rules.allowed(_normalize("/~user/pub"))
+
+
+def test_longer_plain_rule_beats_shorter_pattern():
+    rules = RobotsRules.parse("User-agent: *\nAllow: /a*\nDisallow: /a/private")
+    assert rules.allowed("/a/b")
+    assert not rules.allowed("/a/private/x")
@@ -0,0 +1,42 @@
+import asyncio
+from app.utils.scheduler import INTERACTIVE, PREFETCH, UpstreamScheduler
+
+
+def test_release_while_queued_ticket_is_cancelled():
+    async def main() -> None:
+        scheduler = UpstreamScheduler(capacity=1, deadlines={})
+        holder = scheduler.slot(INTERACTIVE)
+        await holder.__aenter__()
+        queued = scheduler.slot(INTERACTIVE)
+        waiter = asyncio.ensure_future(queued.__aenter__())
+        await asyncio.sleep(0)
+        # The waiter's future is cancelled, but its task has not run its cleanup
+        # yet when the holder releases and the scheduler dispatches
+        waiter.cancel()
+        await holder.__aexit__(None, None, None)
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert waiter.cancelled()
+        assert scheduler.stats["running"] == 0
+        async with scheduler.slot(INTERACTIVE):
+            assert scheduler.stats["running"] == 1
+
+    asyncio.run(main())
+
+
+def test_expire_skips_cancelled_ticket():
+    async def main() -> None:
+        scheduler = UpstreamScheduler(capacity=1, deadlines={PREFETCH: 60})
+        holder = scheduler.slot(INTERACTIVE)
+        await holder.__aenter__()
+        queued = scheduler.slot(PREFETCH)
+        waiter = asyncio.ensure_future(queued.__aenter__())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        # The deadline timer fires before the cancelled waiter cleans up
+        scheduler._expire(queued)
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert waiter.cancelled()
+        await holder.__aexit__(None, None, None)
+        assert scheduler.stats["running"] == 0
+
+    asyncio.run(main())